@@ -0,0 +1,528 @@
+#! python
+# coding:utf-8
+"""
+メッシュ頂点とカーブの一括読み書きを行うバックエンド
+
+core からの頂点とカーブ形状の読み書きはすべてここを経由する
+MeshBackend を実装した偽のバックエンドを set_backend で差し替えれば Maya 無しでも動かせる
+"""
+
+import numpy as np
+
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+
+from . import topology
+from . import nncurve_undo
+from .binding import parse_component
+
+
+class MeshBackend(object):
+    """
+    メッシュ頂点の一括読み書きインターフェース
+    座標はすべてワールド空間の (n, 3) 配列で扱う
+    """
+
+    def get_points(self, mesh, indices=None):
+        """indices の頂点座標を返す. indices が None なら全頂点"""
+        raise NotImplementedError
+
+    def set_points(self, mesh, indices, positions):
+        """indices の頂点を positions に移動する"""
+        raise NotImplementedError
+
+    def get_topology_checksum(self, mesh):
+        """頂点数/エッジ数/フェース数とフェース構成のハッシュから作るチェックサム文字列"""
+        raise NotImplementedError
+
+    def get_edge_vertices(self, mesh):
+        """全エッジの両端の頂点インデックスを (エッジ数, 2) の配列で返す"""
+        raise NotImplementedError
+
+    def get_triangles(self, mesh):
+        """フェースを三角形分割した頂点インデックスを (三角形数, 3) の配列で返す"""
+        raise NotImplementedError
+
+    def get_curve_data(self, curve):
+        """カーブの (CV (ワールド空間) の配列, ノット (Maya 形式) の配列, 次数) を返す"""
+        raise NotImplementedError
+
+    def get_curves_data(self, curves):
+        """カーブ毎の get_curve_data のリストを返す. 同じカーブが複数回あってもそれぞれに対応する値を返す"""
+        raise NotImplementedError
+
+    def set_curve_cvs(self, curve, cvs):
+        """カーブの CV をワールド空間の座標 cvs に移動する (CV 数は変えない)"""
+        raise NotImplementedError
+
+    def get_curve_states(self, curves, attr_name):
+        """
+        カーブ毎の (visibility, 文字列アトリビュート attr_name の値) のリストを返す
+        ノードもアトリビュートも無ければ値は None
+        """
+        raise NotImplementedError
+
+    def get_curve_attributes(self, curves, strings=(), arrays=()):
+        """
+        カーブ毎の {アトリビュート名: 値} のリストを返す
+        strings は文字列, arrays は doubleArray (numpy 配列で返す) のアトリビュート名. 無いアトリビュートの値は None
+        """
+        raise NotImplementedError
+
+    def set_curve_attributes(self, curve, strings=None, arrays=None, values=None):
+        """
+        カーブに文字列 (strings) と doubleArray (arrays) のアトリビュートを無ければ追加して書き込み,
+        既存の数値アトリビュート (values. 名前 -> 数値か数値のタプル) を書き込む
+        文字列アトリビュートはチャンネルボックスに表示する
+        """
+        raise NotImplementedError
+
+    def get_curve_cvs_at_frames(self, curve, frames):
+        """フレーム毎のカーブの CV (ワールド空間) を (フレーム数, CV 数, 3) の配列で返す"""
+        raise NotImplementedError
+
+    def key_points(self, mesh, indices, frames, positions):
+        """
+        頂点 indices のフレーム毎のワールド座標 positions (フレーム数, 頂点数, 3) をキーフレームにする
+        戻り値はキーの追加を取り消す undo() とやり直す redo() を持つオブジェクト
+        """
+        raise NotImplementedError
+
+    def commit(self, record):
+        """
+        redo() と undo() を持つレコードを実行する
+        アンドゥに対応しないバックエンドはそのまま redo() する
+        """
+        record.redo()
+
+
+class MayaMeshBackend(MeshBackend):
+    """
+    MFnMesh で頂点座標を一括で読み書きするバックエンド
+    API 経由の書き込みはアンドゥキューに積まれないので commit で nncurve_undo のコマンドとして記録する
+    """
+
+    def _shape_path(self, node):
+        selection = om.MSelectionList()
+        selection.add(node)
+        dag_path = selection.getDagPath(0)
+        dag_path.extendToShape()
+
+        return dag_path
+
+    def _fn_mesh(self, mesh):
+        return om.MFnMesh(self._shape_path(mesh))
+
+    def get_points(self, mesh, indices=None):
+        points = self._fn_mesh(mesh).getPoints(om.MSpace.kWorld)
+
+        # getPoints 自体は一回の API 呼び出しで, 時間がかかるのは MPoint 毎の Python への変換なので
+        # indices があればその頂点だけを変換する
+        if indices is not None:
+            points = [points[i] for i in np.asarray(indices, dtype=int).tolist()]
+
+        return np.array([(p.x, p.y, p.z) for p in points], dtype=float).reshape(-1, 3)
+
+    def set_points(self, mesh, indices, positions):
+        fn_mesh = self._fn_mesh(mesh)
+        points = fn_mesh.getPoints(om.MSpace.kWorld)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+
+        # 全頂点の MPointArray のうち書き込む頂点だけを置き換えて setPoints 一回で書き込む
+        # (全頂点を numpy 配列と相互に変換しない)
+        for index, position in zip(np.asarray(indices, dtype=int).tolist(), positions.tolist()):
+            points[index] = om.MPoint(position)
+
+        fn_mesh.setPoints(points, om.MSpace.kWorld)
+
+    def get_topology_checksum(self, mesh):
+        fn_mesh = self._fn_mesh(mesh)
+        face_counts, face_vertices = fn_mesh.getVertices()
+        counts = [fn_mesh.numVertices, fn_mesh.numEdges, fn_mesh.numPolygons]
+
+        return topology.make_checksum(counts, [np.array(face_counts), np.array(face_vertices)])
+
+    def get_edge_vertices(self, mesh):
+        fn_mesh = self._fn_mesh(mesh)
+        edge_vertices = np.empty((fn_mesh.numEdges, 2), dtype=int)
+        it_edge = om.MItMeshEdge(fn_mesh.dagPath())
+
+        while not it_edge.isDone():
+            edge_vertices[it_edge.index()] = (it_edge.vertexId(0), it_edge.vertexId(1))
+            it_edge.next()
+
+        return edge_vertices
+
+    def get_triangles(self, mesh):
+        _, triangle_vertices = self._fn_mesh(mesh).getTriangles()
+
+        return np.array(triangle_vertices, dtype=int).reshape(-1, 3)
+
+    def get_curve_data(self, curve):
+        fn_curve = om.MFnNurbsCurve(self._shape_path(curve))
+        cvs = np.array([(p.x, p.y, p.z) for p in fn_curve.cvPositions(om.MSpace.kWorld)])
+        knots = np.array(fn_curve.knots())
+
+        return cvs, knots, fn_curve.degree
+
+    def get_curves_data(self, curves):
+        # 一つの MSelectionList にまとめると同じカーブが一つにまとめられて入力と対応しなくなるので, カーブ毎に引く
+        return [self.get_curve_data(curve) for curve in curves]
+
+    def set_curve_cvs(self, curve, cvs):
+        fn_curve = om.MFnNurbsCurve(self._shape_path(curve))
+        fn_curve.setCVPositions(om.MPointArray(np.asarray(cvs, dtype=float).tolist()), om.MSpace.kWorld)
+        fn_curve.updateCurve()
+
+    def get_curve_states(self, curves, attr_name):
+        states = []
+
+        for curve in curves:
+            selection = om.MSelectionList()
+
+            try:
+                selection.add(curve)
+            except RuntimeError:
+                states.append((False, None))
+                continue
+
+            fn_node = om.MFnDependencyNode(selection.getDependNode(0))
+            visible = fn_node.hasAttribute("visibility") and fn_node.findPlug("visibility", False).asBool()
+
+            if fn_node.hasAttribute(attr_name):
+                states.append((visible, fn_node.findPlug(attr_name, False).asString()))
+            else:
+                states.append((visible, None))
+
+        return states
+
+    def get_curve_attributes(self, curves, strings=(), arrays=()):
+        values = []
+
+        for curve in curves:
+            selection = om.MSelectionList()
+            selection.add(curve)
+            fn_node = om.MFnDependencyNode(selection.getDependNode(0))
+            curve_values = {}
+
+            for name in strings:
+                curve_values[name] = fn_node.findPlug(name, False).asString() if fn_node.hasAttribute(name) else None
+
+            for name in arrays:
+                if not fn_node.hasAttribute(name):
+                    curve_values[name] = None
+                    continue
+
+                data = fn_node.findPlug(name, False).asMObject()
+                curve_values[name] = np.array(om.MFnDoubleArrayData(data).array()) if not data.isNull() else np.zeros(0)
+
+            values.append(curve_values)
+
+        return values
+
+    def set_curve_attributes(self, curve, strings=None, arrays=None, values=None):
+        dag_path = self._shape_path(curve)
+        fn_node = om.MFnDependencyNode(dag_path.transform())
+        fn_shape = om.MFnDependencyNode(dag_path.node())
+        strings = strings or {}
+        arrays = arrays or {}
+        modifier = om.MDGModifier()
+
+        for names, data_type in ((strings, om.MFnData.kString), (arrays, om.MFnData.kDoubleArray)):
+            for name in names:
+                if not fn_node.hasAttribute(name):
+                    modifier.addAttribute(fn_node.object(), om.MFnTypedAttribute().create(name, name, data_type))
+
+        modifier.doIt()
+
+        for name, value in strings.items():
+            plug = fn_node.findPlug(name, False)
+            plug.isChannelBox = True
+            modifier.newPlugValueString(plug, value)
+
+        for name, value in arrays.items():
+            data = om.MFnDoubleArrayData().create(om.MDoubleArray(np.asarray(value, dtype=float).tolist()))
+            modifier.newPlugValue(fn_node.findPlug(name, False), data)
+
+        # lineWidth などシェイプのアトリビュートはシェイプに書く
+        for name, value in (values or {}).items():
+            plug = (fn_node if fn_node.hasAttribute(name) else fn_shape).findPlug(name, False)
+
+            if plug.isCompound:
+                for i, child_value in enumerate(value):
+                    modifier.newPlugValueDouble(plug.child(i), float(child_value))
+            else:
+                modifier.newPlugValueDouble(plug, float(value))
+
+        modifier.doIt()
+
+    def get_curve_cvs_at_frames(self, curve, frames):
+        dag_path = self._shape_path(curve)
+        plug = om.MFnDependencyNode(dag_path.node()).findPlug("worldSpace", False)
+        plug = plug.elementByLogicalIndex(dag_path.instanceNumber())
+        unit = om.MTime.uiUnit()
+        cvs = []
+
+        # 時間を変えずにフレーム毎のコンテキストで worldSpace を評価する
+        for frame in frames:
+            with om.MDGContextGuard(om.MDGContext(om.MTime(float(frame), unit))):
+                data = plug.asMObject()
+
+            cvs.append([(p.x, p.y, p.z) for p in om.MFnNurbsCurve(data).cvPositions()])
+
+        return np.array(cvs, dtype=float)
+
+    def key_points(self, mesh, indices, frames, positions):
+        dag_path = self._shape_path(mesh)
+        fn_mesh = om.MFnMesh(dag_path)
+        indices = np.asarray(indices, dtype=int)
+
+        inverse = list(dag_path.inclusiveMatrixInverse())
+        current = np.array([(p.x, p.y, p.z) for p in fn_mesh.getPoints(om.MSpace.kObject)])[indices]
+
+        pnts_plug = fn_mesh.findPlug("pnts", False)
+        elements = [pnts_plug.elementByLogicalIndex(index) for index in indices.tolist()]
+        tweaks = np.array([[element.child(axis).asDouble() for axis in range(3)] for element in elements])
+        values = pnts_key_values(positions, inverse, current, tweaks)
+
+        unit = om.MTime.uiUnit()
+        times = om.MTimeArray([om.MTime(float(frame), unit) for frame in frames])
+        modifier = om.MDGModifier()
+        change = oma.MAnimCurveChange()
+
+        for column, element in enumerate(elements):
+            for axis in range(3):
+                plug = element.child(axis)
+                source = plug.source()
+                fn_anim = oma.MFnAnimCurve()
+
+                if not source.isNull and source.node().hasFn(om.MFn.kAnimCurve):
+                    fn_anim.setObject(source.node())
+                else:
+                    fn_anim.create(plug, oma.MFnAnimCurve.kAnimCurveTL, modifier)
+
+                fn_anim.addKeys(times, om.MDoubleArray(values[:, column, axis].tolist()), keepExistingKeys=True,
+                                change=change)
+
+        modifier.doIt()
+
+        return _AnimChange(modifier, change)
+
+    def commit(self, record):
+        nncurve_undo.commit(record)
+
+
+def pnts_key_values(positions, inverse_matrix, current, tweaks):
+    """
+    フレーム毎のワールド座標を pnts (頂点の調整値) のキーの値にする
+    ワールド座標をオブジェクト空間にして, 今の頂点位置からの差を今の調整値に足す
+
+    positions (フレーム数, 頂点数, 3) のワールド座標
+    inverse_matrix メッシュのワールド逆行列 (Maya の行ベクトル形式の 16 要素)
+    current 今の頂点位置 (調整値込みのオブジェクト空間の (頂点数, 3))
+    tweaks 今の pnts の値 ((頂点数, 3))
+    戻り値は (フレーム数, 頂点数, 3) のキーの値
+    """
+    inverse = np.asarray(inverse_matrix, dtype=float).reshape(4, 4)
+    local = np.asarray(positions, dtype=float) @ inverse[:3, :3] + inverse[3, :3]
+
+    return local - np.asarray(current, dtype=float).reshape(-1, 3) + np.asarray(tweaks, dtype=float).reshape(-1, 3)
+
+
+class _AnimChange(object):
+    """key_points で作ったアニメーションカーブと追加したキーのアンドゥ"""
+
+    def __init__(self, modifier, change):
+        self.modifier = modifier
+        self.change = change
+
+    def redo(self):
+        self.modifier.doIt()
+        self.change.redoIt()
+
+    def undo(self):
+        self.change.undoIt()
+        self.modifier.undoIt()
+
+
+_backend = None
+
+
+def get_backend():
+    """現在のバックエンドを返す. 未設定なら Maya のバックエンドを生成する"""
+    global _backend
+
+    if _backend is None:
+        _backend = MayaMeshBackend()
+
+    return _backend
+
+
+def set_backend(backend):
+    """バックエンドを差し替える. None を渡すと Maya のバックエンドに戻る"""
+    global _backend
+    _backend = backend
+
+
+class PointsRecord(object):
+    """
+    頂点の書き込み前後の座標をメッシュ毎の配列で持つアンドゥ用のレコード
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.entries = []
+
+    def add(self, mesh, indices, before, after):
+        self.entries.append((mesh, indices, before, after))
+
+    def redo(self):
+        for mesh, indices, _, after in self.entries:
+            self.backend.set_points(mesh, indices, after)
+
+    def undo(self):
+        for mesh, indices, before, _ in reversed(self.entries):
+            self.backend.set_points(mesh, indices, before)
+
+
+class CurvesRecord(object):
+    """
+    カーブの CV の書き込み前後の座標をカーブ毎の配列で持つアンドゥ用のレコード
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.entries = []
+
+    def add(self, curve, before, after):
+        self.entries.append((curve, before, after))
+
+    def redo(self):
+        for curve, _, after in self.entries:
+            self.backend.set_curve_cvs(curve, after)
+
+    def undo(self):
+        for curve, before, _ in reversed(self.entries):
+            self.backend.set_curve_cvs(curve, before)
+
+
+class KeysRecord(object):
+    """
+    頂点のフレーム毎の座標をキーフレームにするアンドゥ用のレコード
+    最初の redo でキーを作り, 以後はバックエンドが返した変更を取り消し/やり直しする
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.entries = []
+        self.changes = None
+
+    def add(self, mesh, indices, frames, positions):
+        self.entries.append((mesh, indices, frames, positions))
+
+    def redo(self):
+        if self.changes is None:
+            self.changes = [self.backend.key_points(*entry) for entry in self.entries]
+            return
+
+        for change in self.changes:
+            change.redo()
+
+    def undo(self):
+        for change in reversed(self.changes):
+            change.undo()
+
+
+class AttributesRecord(object):
+    """
+    作ったばかりのカーブにまとめてアトリビュートを書き込むアンドゥ用のレコード
+    カーブの作成自体はコマンドとしてアンドゥキューに積まれているので, undo ではカーブごと消えるのに任せる
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.entries = []
+
+    def add(self, curve, strings=None, arrays=None, values=None):
+        self.entries.append((curve, strings, arrays, values))
+
+    def redo(self):
+        for entry in self.entries:
+            self.backend.set_curve_attributes(*entry)
+
+    def undo(self):
+        pass
+
+
+class PointWriter(object):
+    """
+    頂点の移動をメッシュ毎にまとめておき flush でメッシュ毎に一回で書き込む
+    同じ頂点が複数回追加された場合は後から追加した座標が優先される
+    一回の flush は書き込み前後の座標配列を持つ一つのアンドゥ単位になる
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.moves = {}
+        self.callbacks = []
+
+    def add(self, vertices, positions):
+        """
+        頂点コンポーネント名のリストと移動先座標を追加する
+        """
+        for vtx, position in zip(vertices, positions):
+            mesh, index = parse_component(vtx)
+            self.moves.setdefault(mesh, {})[index] = position
+
+    def add_indices(self, mesh, indices, positions):
+        """
+        メッシュ名と頂点インデックスの配列で移動先座標を追加する
+        """
+        mesh_moves = self.moves.setdefault(mesh, {})
+
+        for index, position in zip(indices, positions):
+            mesh_moves[int(index)] = position
+
+    def after_flush(self, callback):
+        """
+        次の flush で書き込んだ後に callback(written) を呼ぶ
+        written(mesh, indices) は書き込んだ頂点を読み直した座標 (Maya が float32 で保持している値) を返す
+        """
+        self.callbacks.append(callback)
+
+    def flush(self):
+        """
+        溜めた移動をメッシュ毎に一括で書き込む
+        """
+        if not self.moves:
+            return
+
+        backend = self.backend or get_backend()
+        record = PointsRecord(backend)
+
+        for mesh, mesh_moves in self.moves.items():
+            indices = np.fromiter(mesh_moves.keys(), dtype=int, count=len(mesh_moves))
+            positions = np.array([mesh_moves[i] for i in indices], dtype=float)
+            record.add(mesh, indices, backend.get_points(mesh, indices), positions)
+
+        callbacks = self.callbacks
+        self.moves = {}
+        self.callbacks = []
+        backend.commit(record)
+
+        if not callbacks:
+            return
+
+        # 読み直しはメッシュ毎に一回だけ行い, 頂点インデックスの昇順で引けるようにする
+        readback = {}
+
+        for mesh, indices, _, _ in record.entries:
+            order = np.argsort(indices)
+            readback[mesh] = (indices[order], backend.get_points(mesh, indices[order]))
+
+        def written(mesh, indices):
+            sorted_indices, points = readback[mesh]
+            return points[np.searchsorted(sorted_indices, indices)]
+
+        for callback in callbacks:
+            callback(written)
@@ -0,0 +1,163 @@
+#! python
+# coding:utf-8
+"""
+アニメーションするカーブに合わせたエッジ列の Fit のフレーム範囲ベイク
+
+トポロジーとエッジ列の並びはベイクの最初に一度だけ求め,
+カーブの CV を全フレーム分まとめて読んでから (フレーム数, 頂点数, 3) の配列で移動先を一括計算する
+結果はメッシュの頂点のキーフレームとして一回のアンドゥ単位で書き込むか, .npz のポイントキャッシュに保存する
+
+    result = bake.bakeCurves(None, 1, 500)
+    bake.keyBake(result)
+    bake.saveCache(result, "fit_cache.npz")
+"""
+
+import numpy as np
+
+from . import core
+from . import backend
+from . import binding
+from . import curvemath as cm
+from . import instrument
+
+
+class Bake(object):
+    """
+    ベイク結果
+
+    frames ベイクしたフレームの配列
+    meshes メッシュ名 -> (頂点インデックスの配列, (フレーム数, 頂点数, 3) のワールド座標の配列)
+    checksums メッシュ名 -> ベイクした時のトポロジーチェックサム
+    """
+
+    def __init__(self, frames, meshes=None, checksums=None):
+        self.frames = np.asarray(frames, dtype=float)
+        self.meshes = meshes or {}
+        self.checksums = checksums or {}
+
+    @property
+    def nbytes(self):
+        return sum(indices.nbytes + positions.nbytes for indices, positions in self.meshes.values())
+
+
+def frameRange(start, end, step=1.0):
+    """start から end まで (end を含む) の step 毎のフレームの配列"""
+    return np.arange(start, end + step * 0.5, step, dtype=float)
+
+
+def bakeCurves(curves=None, start=1, end=1, step=1.0, keep_ratio_mode=True):
+    """
+    curves に拘束されたエッジ列の start から end までのフレーム毎の Fit 結果を求める
+    curves 対象のカーブ. None ならシーン内のこのツールのカーブすべて (非表示のカーブは処理しない)
+    シーンの頂点は動かさない. 書き込みは keyBake か saveCache で行う
+    同じ頂点が複数のカーブに拘束されている場合は後のカーブの結果が優先される
+    戻り値は Bake
+    """
+    frames = frameRange(start, end, step)
+    mesh_backend = backend.get_backend()
+    moves = {}
+
+    with instrument.operation("bake"), core.topology_cache.batch():
+        for curve, visible, edges_str in core.getCurveStates(curves):
+            if not visible:
+                continue
+
+            with instrument.curve(curve):
+                with instrument.phase("conversion"):
+                    edges = binding.decode(edges_str)
+
+                # トポロジー, 頂点の並び, 保存済みの比率はここで一度だけ読む
+                job = core._gatherFit(curve, edges, keep_ratio_mode, force=True)
+
+                with instrument.phase("read"):
+                    cvs_frames = mesh_backend.get_curve_cvs_at_frames(curve, frames)
+
+                with instrument.phase("sampling"):
+                    flipped, positions = cm.solve_fit_frames(
+                        cvs_frames, job.knots, job.degree, job.points, keep_ratio_mode,
+                        core.arc_length_cache.samples_per_span, job.ratios, job.closed)
+
+            indices = job.indices[::-1] if flipped else job.indices
+            moves.setdefault(job.mesh, []).append((indices, positions))
+
+        result = Bake(frames)
+
+        for mesh, entries in moves.items():
+            indices = np.concatenate([entry[0] for entry in entries])
+            positions = np.concatenate([entry[1] for entry in entries], axis=1)
+
+            # 重複した頂点は後から追加した方を残す
+            _, last = np.unique(indices[::-1], return_index=True)
+            keep = len(indices) - 1 - last
+
+            result.meshes[mesh] = (indices[keep], positions[:, keep])
+            result.checksums[mesh] = core.topology_cache.get(mesh, mesh_backend).checksum
+
+    return result
+
+
+def keyBake(result):
+    """
+    ベイク結果をメッシュの頂点のキーフレームにする
+    全メッシュ分を一回のアンドゥ可能な書き込みで行う
+    """
+    mesh_backend = backend.get_backend()
+    record = backend.KeysRecord(mesh_backend)
+
+    for mesh, (indices, positions) in result.meshes.items():
+        record.add(mesh, indices, result.frames, positions)
+
+    with instrument.operation("bake"), instrument.phase("writeback"):
+        mesh_backend.commit(record)
+
+
+def saveCache(result, path):
+    """
+    ベイク結果を .npz のポイントキャッシュとして一度に書き出す
+    """
+    meshes = sorted(result.meshes)
+    arrays = {
+        "frames": result.frames,
+        "meshes": np.array(meshes),
+        "checksums": np.array([result.checksums.get(mesh) or "" for mesh in meshes]),
+    }
+
+    for i, mesh in enumerate(meshes):
+        arrays["indices_%d" % i], arrays["positions_%d" % i] = result.meshes[mesh]
+
+    np.savez(path, **arrays)
+
+
+def loadCache(path):
+    """
+    saveCache で書き出したポイントキャッシュを読み込んで Bake を返す
+    """
+    with np.load(path) as data:
+        result = Bake(data["frames"])
+
+        for i, (mesh, checksum) in enumerate(zip(data["meshes"].tolist(), data["checksums"].tolist())):
+            result.meshes[mesh] = (data["indices_%d" % i], data["positions_%d" % i])
+            result.checksums[mesh] = checksum or None
+
+    return result
+
+
+def applyFrame(result, frame):
+    """
+    ベイク結果の frame に最も近いフレームの座標を頂点に書き込む
+    ベイクした時とトポロジーが変わっているメッシュがあれば何も書き込まずに ValueError
+    """
+    mesh_backend = backend.get_backend()
+    index = int(np.argmin(np.abs(result.frames - frame)))
+    writer = backend.PointWriter()
+
+    with core.topology_cache.batch():
+        for mesh, (indices, positions) in result.meshes.items():
+            checksum = result.checksums.get(mesh)
+
+            if checksum and checksum != core.topology_cache.get(mesh, mesh_backend).checksum:
+                raise ValueError("topology changed since bake: %s" % mesh)
+
+            writer.add_indices(mesh, indices, positions[index])
+
+    writer.flush()
@@ -0,0 +1,264 @@
+#! python
+# coding:utf-8
+"""
+mayapy で複数のシーンファイルのカーブを UI 無しで一括処理するコマンドラインツール
+
+    mayapy -m nncurve.batch [options] PATH [PATH ...]
+
+PATH にはシーンファイル (.ma/.mb) かディレクトリ (以下の .ma/.mb をすべて対象にする) を指定する
+ファイル毎に mayapy のワーカープロセスを起動し --workers 個まで並列に処理する
+ファイル毎の処理時間と失敗を --report の JSON に書き出す
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+scene_extensions = (".ma", ".mb")
+
+operation_names = ("fit", "rebuild", "smooth")
+
+
+def findScenes(paths):
+    """
+    ファイルとディレクトリのリストからシーンファイルのリストを作る
+    """
+    scenes = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(scene_extensions):
+                        scenes.append(os.path.join(root, name))
+
+        else:
+            scenes.append(path)
+
+    return scenes
+
+
+def outputPath(scene, output_dir):
+    """
+    保存先のパス. output_dir が None なら上書き保存
+    """
+    if output_dir is None:
+        return scene
+
+    return os.path.join(output_dir, os.path.basename(scene))
+
+
+def processScene(scene, operations, output=None, keep_ratio_mode=True, n=4, force=False, chunk_size=None,
+                 projection=0.0, symmetry=False):
+    """
+    現在の Maya セッションでシーンを開いて operations を順に実行し output に保存する
+    operations は "fit", "rebuild", "smooth" のリスト
+    chunk_size 一度に計算して書き込むカーブの本数. None なら core.batch_chunk_size
+    projection Fit 後に頂点を元の面に戻す割合, symmetry 反対側に鏡映して書き込むかどうか (core.fitCurves)
+    戻り値は処理結果の辞書
+    """
+    import maya.cmds as cmds
+
+    from . import core
+
+    result = {"path": scene, "output": output or scene, "operations": []}
+
+    start = time.time()
+    cmds.file(scene, open=True, force=True)
+    result["open_seconds"] = time.time() - start
+
+    for operation in operations:
+        start = time.time()
+        entry = {"name": operation}
+
+        if operation == "fit":
+            fitted_count, skipped_count = core.fitCurves(None, keep_ratio_mode, force, chunk_size=chunk_size,
+                                                         projection=projection, symmetry=symmetry)
+            entry["fitted"] = fitted_count
+            entry["skipped"] = skipped_count
+
+        elif operation == "rebuild":
+            entry["curves"] = len(core.rebuildCurves(None, n, chunk_size=chunk_size))
+
+        elif operation == "smooth":
+            entry["curves"] = len(core.smoothCurves(None, chunk_size=chunk_size))
+
+        else:
+            raise ValueError("unknown operation: %s" % operation)
+
+        entry["seconds"] = time.time() - start
+        result["operations"].append(entry)
+
+    start = time.time()
+    file_type = "mayaBinary" if (output or scene).lower().endswith(".mb") else "mayaAscii"
+    cmds.file(rename=output or scene)
+    cmds.file(save=True, type=file_type, force=True)
+    result["save_seconds"] = time.time() - start
+
+    return result
+
+
+def runWorker(args):
+    """
+    ワーカープロセスとして 1 ファイルを処理し, 結果を args.result に JSON で書き出す
+    """
+    import maya.standalone
+    maya.standalone.initialize(name="python")
+
+    start = time.time()
+
+    try:
+        result = processScene(args.worker, args.op, args.output, not args.even, args.resolution, args.force,
+                              args.chunk_size, args.projection, args.symmetry)
+        result["status"] = "ok"
+
+    except Exception:
+        result = {"path": args.worker, "status": "failed", "error": traceback.format_exc()}
+
+    result["seconds"] = time.time() - start
+
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+    maya.standalone.uninitialize()
+
+    return 0 if result["status"] == "ok" else 1
+
+
+def workerCommand(scene, result_path, args):
+    """
+    1 ファイル分のワーカープロセスのコマンドライン
+    """
+    # -m で実行された場合 __name__ は "__main__" になるのでモジュール名は __spec__ から取る
+    module_name = __spec__.name if __spec__ is not None else __name__
+    command = [args.mayapy, "-m", module_name, "--worker", scene, "--result", result_path,
+               "--resolution", str(args.resolution), "--output", outputPath(scene, args.output_dir)]
+
+    for operation in args.op:
+        command += ["--op", operation]
+
+    if args.even:
+        command.append("--even")
+
+    if args.force:
+        command.append("--force")
+
+    if args.chunk_size:
+        command += ["--chunk-size", str(args.chunk_size)]
+
+    if args.projection:
+        command += ["--projection", str(args.projection)]
+
+    if args.symmetry:
+        command.append("--symmetry")
+
+    return command
+
+
+def dispatch(scene, args):
+    """
+    ワーカープロセスを起動して 1 ファイルを処理し, 結果の辞書を返す
+    """
+    handle, result_path = tempfile.mkstemp(suffix=".json")
+    os.close(handle)
+    start = time.time()
+
+    try:
+        process = subprocess.run(workerCommand(scene, result_path, args),
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+        try:
+            with open(result_path) as f:
+                result = json.load(f)
+
+        except ValueError:
+            result = {"path": scene, "status": "failed", "error": "worker exited with code %d" % process.returncode}
+
+        if result["status"] != "ok":
+            result["log"] = process.stdout
+
+    finally:
+        os.remove(result_path)
+
+    result["wall_seconds"] = time.time() - start
+
+    return result
+
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(prog="nncurve.batch", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="scene files or directories")
+    parser.add_argument("--op", action="append", choices=operation_names,
+                        help="operation to run, can be given multiple times (default: fit)")
+    parser.add_argument("--even", action="store_true", help="fit with even spacing instead of keep ratio")
+    parser.add_argument("--force", action="store_true", help="refit curves that have not changed")
+    parser.add_argument("--resolution", type=int, default=4, help="spans for rebuild (default: 4)")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="curves computed and written per chunk (default: core.batch_chunk_size)")
+    parser.add_argument("--projection", type=float, default=0.0,
+                        help="after fitting, move vertices this fraction back onto the original surface (0-1)")
+    parser.add_argument("--symmetry", action="store_true",
+                        help="mirror fitted vertices across core.mirror_axis (world X) and skip curves on the mirrored side")
+    parser.add_argument("--output-dir", default=None, help="save results here instead of overwriting")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="number of parallel mayapy processes")
+    parser.add_argument("--report", default=None, help="write per-file timing and failures to this JSON file")
+    parser.add_argument("--mayapy", default=sys.executable, help="mayapy executable for workers")
+
+    # ワーカープロセス用
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+    args.op = args.op or ["fit"]
+
+    return args
+
+
+def main(argv=None):
+    args = parseArgs(sys.argv[1:] if argv is None else argv)
+
+    if args.worker:
+        return runWorker(args)
+
+    scenes = findScenes(args.paths)
+
+    if args.output_dir and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    start = time.time()
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(lambda scene: dispatch(scene, args), scenes))
+
+    failed = [result for result in results if result["status"] != "ok"]
+    report = {
+        "workers": args.workers,
+        "operations": args.op,
+        "total_seconds": time.time() - start,
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "files": results,
+    }
+
+    for result in results:
+        print("%-8s %8.2fs  %s" % (result["status"], result["wall_seconds"], result["path"]))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
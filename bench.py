@@ -0,0 +1,719 @@
+#! python
+# coding:utf-8
+"""
+Maya 無しで nncurve のホットパスを計測するベンチマーク
+
+    python bench.py [--quick] [--json report.json]
+
+maya.cmds / maya.mel / maya.api.OpenMaya / nnutil の偽モジュールを sys.modules に登録してからパッケージを読み込む
+偽の maya.cmds と nnutil はすべての呼び出しを数え, メッシュとカーブは手続き的に生成してメモリ上に持つ
+頂点数 10 - 100k の一本のエッジ列と, カーブ数 1 - 1000 本のシーンで各フェーズの時間とコマンド呼び出し数を計測する
+
+このファイルはパッケージの外から直接実行する (python -m では偽モジュールより先に maya の読み込みが走るため)
+"""
+
+import argparse
+import collections
+import importlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+
+component_pattern = re.compile(r"^(.+)\.(\w+)\[(\d+)\]$")
+
+
+def parse(component):
+    node, kind, index = component_pattern.match(component).groups()
+    return node, kind, int(index)
+
+
+class FakeScene(object):
+    """
+    偽の maya.cmds が操作するシーン
+    meshes  メッシュ名 -> {"points": (n, 3) float32, "edges": (e, 2), "faces": フェース数, "triangles": (t, 3)}
+    curves  カーブ名 -> {"cvs": (n, 3), "knots": Maya 形式のノット, "degree": 次数}
+    attrs   ノード名 -> {アトリビュート名: 値}
+    sets    セット名 -> メンバーのリスト
+    keys    メッシュ名 -> {頂点インデックス: (フレーム数, 3) のキーの値}
+    warnings cmds.warning で出した警告
+    """
+
+    def __init__(self):
+        self.meshes = {}
+        self.curves = {}
+        self.attrs = {}
+        self.sets = {}
+        self.keys = {}
+        self.warnings = []
+        self.selection = []
+        self.counter = collections.Counter()
+
+    def unique_name(self, base):
+        base = base.rstrip("0123456789")
+        number = self.counter[base] + 1
+
+        while base + str(number) in self.attrs:
+            number += 1
+
+        self.counter[base] = number
+
+        return base + str(number)
+
+    def add_strip_mesh(self, name, rows, cols):
+        """
+        rows 行 cols 列の格子メッシュを作る
+        エッジは 行方向 (r 行目の c 番目が r*(cols-1)+c) のあとに列方向を並べる
+        """
+        r, c = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+        # Maya と同じく頂点座標は float32 で持つ
+        points = np.stack([c * 0.1, r * 1.0, np.sin(c * 0.3) * 0.2], axis=-1).reshape(-1, 3).astype(np.float32)
+
+        ids = np.arange(rows * cols).reshape(rows, cols)
+        row_edges = np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1)
+        col_edges = np.stack([ids[:-1, :].ravel(), ids[1:, :].ravel()], axis=1)
+        a, b, c, d = ids[:-1, :-1].ravel(), ids[:-1, 1:].ravel(), ids[1:, 1:].ravel(), ids[1:, :-1].ravel()
+
+        self.meshes[name] = {
+            "points": points,
+            "edges": np.concatenate([row_edges, col_edges]).astype(int),
+            "faces": max(rows - 1, 0) * max(cols - 1, 0),
+            "triangles": np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)]),
+            "cols": cols,
+        }
+        self.attrs[name] = {}
+
+        return name
+
+    def row_edges(self, mesh, row):
+        """row 行目の行方向エッジのコンポーネント名"""
+        cols = self.meshes[mesh]["cols"]
+        first = row * (cols - 1)
+
+        return ["%s.e[%d]" % (mesh, i) for i in range(first, first + cols - 1)]
+
+    def add_curve(self, name, cvs, knots, degree):
+        self.curves[name] = {"cvs": np.asarray(cvs, dtype=float), "knots": np.asarray(knots, dtype=float), "degree": degree}
+        self.attrs.setdefault(name, {})
+
+        return name
+
+    def remove(self, name):
+        """ノードを消す (コマンドとして数えない後始末用)"""
+        self.attrs.pop(name, None)
+        self.curves.pop(name, None)
+
+        for members in self.sets.values():
+            if name in members:
+                members.remove(name)
+
+    def add_guide_curve(self, name, mesh, row, spans=4):
+        """row 行目から少しずらした 3 次カーブを作る"""
+        cols = self.meshes[mesh]["cols"]
+        x = np.linspace(0.0, (cols - 1) * 0.1, spans + 3)
+        cvs = np.stack([x, np.full_like(x, row + 0.25), np.cos(x) * 0.3], axis=1)
+        knots = np.concatenate([[0.0] * 2, np.arange(spans + 1), [spans] * 2]) / float(spans)
+
+        return self.add_curve(name, cvs, knots, 3)
+
+
+class FakeCmds(object):
+    """
+    nncurve が使う maya.cmds の範囲だけを FakeScene の上で実装した偽モジュール
+    """
+
+    def __init__(self, scene, curvemath):
+        self.scene = scene
+        self.cm = curvemath
+
+    # ノードとアトリビュート
+
+    def ls(self, *patterns, **kwargs):
+        if kwargs.get("selection") or kwargs.get("sl"):
+            return list(self.scene.selection)
+
+        nodes = sorted(self.scene.attrs)
+
+        if not patterns:
+            return nodes
+
+        # "*.attr" はアトリビュートを持つノード
+        attrs = [pattern.split(".", 1)[1] for pattern in patterns if "." in pattern]
+        prefixes = [pattern.rstrip("*") for pattern in patterns if "." not in pattern]
+
+        return [node for node in nodes
+                if any(node.startswith(prefix) for prefix in prefixes)
+                or any(attr in self.scene.attrs[node] for attr in attrs)]
+
+    def objExists(self, node):
+        return node in self.scene.attrs or node in self.scene.sets
+
+    def sets(self, *members, **kwargs):
+        """objectSet の作成 (name=, empty=), 追加 (add=), クリア (clear=), メンバーの問い合わせ (q=True)"""
+        if kwargs.get("q") or kwargs.get("query"):
+            return list(self.scene.sets[members[0]])
+
+        if "clear" in kwargs:
+            self.scene.sets[kwargs["clear"]] = []
+            return None
+
+        if "add" in kwargs:
+            current = self.scene.sets[kwargs["add"]]
+
+            for member in members[0] if isinstance(members[0], list) else members:
+                if member not in current:
+                    current.append(member)
+
+            return None
+
+        name = kwargs["name"]
+        self.scene.sets[name] = []
+
+        return name
+
+    def attributeQuery(self, name, node=None, exists=False, **kwargs):
+        return name in self.scene.attrs.get(node, {})
+
+    def addAttr(self, node, ln=None, **kwargs):
+        self.scene.attrs[node][ln] = None
+
+    def getAttr(self, plug, **kwargs):
+        node, name = plug.split(".", 1)
+
+        if name == "visibility":
+            return self.scene.attrs[node].get(name, True)
+
+        return self.scene.attrs[node][name]
+
+    def setAttr(self, plug, *values, **kwargs):
+        node, name = plug.split(".", 1)
+
+        if values:
+            self.scene.attrs[node][name] = values[0] if len(values) == 1 else values
+
+    def undoInfo(self, *args, **kwargs):
+        pass
+
+    def warning(self, message):
+        self.scene.warnings.append(message)
+
+    def select(self, *args, **kwargs):
+        selection = []
+
+        for arg in args:
+            selection += arg if isinstance(arg, list) else [arg]
+
+        self.scene.selection = selection
+
+    def rename(self, node, new_name, **kwargs):
+        # Maya と同じく名前が空いていればそのまま使う
+        if new_name in self.scene.attrs:
+            new_name = self.scene.unique_name(new_name)
+
+        self.scene.attrs[new_name] = self.scene.attrs.pop(node)
+
+        if node in self.scene.curves:
+            self.scene.curves[new_name] = self.scene.curves.pop(node)
+
+        for members in self.scene.sets.values():
+            if node in members:
+                members[members.index(node)] = new_name
+
+        return new_name
+
+    def delete(self, *nodes, **kwargs):
+        for node in nodes:
+            for name in node if isinstance(node, list) else [node]:
+                self.scene.remove(name)
+
+    def duplicate(self, node, **kwargs):
+        node = node[0] if isinstance(node, list) else node
+        name = self.scene.unique_name(node)
+        source = self.scene.curves[node]
+        self.scene.add_curve(name, source["cvs"].copy(), source["knots"].copy(), source["degree"])
+
+        return [name]
+
+    def DeleteHistory(self, *args, **kwargs):
+        pass
+
+    # コンポーネント
+
+    def filterExpand(self, components, **kwargs):
+        return list(components)
+
+    def polyListComponentConversion(self, components, **kwargs):
+        vertices = set()
+
+        for component in components:
+            mesh, _, index = parse(component)
+            vertices.update("%s.vtx[%d]" % (mesh, v) for v in self.scene.meshes[mesh]["edges"][index])
+
+        return sorted(vertices)
+
+    # カーブ
+
+    def polyToCurve(self, **kwargs):
+        """選択エッジ列の頂点を通る 1 次カーブを作る"""
+        mesh = parse(self.scene.selection[0])[0]
+        edges = [parse(edge)[2] for edge in self.scene.selection]
+        ordered = FakeNnutil(self.scene).order(mesh, edges)
+        points = self.scene.meshes[mesh]["points"][ordered]
+        name = self.scene.unique_name("polyToCurve")
+
+        self.scene.add_curve(name, points, np.arange(len(points), dtype=float), 1)
+
+        return [name, name + "_polyToCurve"]
+
+    def rebuildCurve(self, curve, s=4, d=3, **kwargs):
+        """弧長で均等に取った点を CV にした s スパン d 次のカーブに置き換える"""
+        curve = curve[0] if isinstance(curve, list) else curve
+        data = self.scene.curves[curve]
+        table = self.cm.ArcLengthTable(data["cvs"], data["knots"], data["degree"])
+        cvs = table.points_at(np.linspace(0.0, 1.0, s + d))
+        knots = np.concatenate([[0.0] * (d - 1), np.arange(s + 1), [s] * (d - 1)]) / float(s)
+        self.scene.add_curve(curve, cvs, knots, d)
+
+    def smoothCurve(self, target, **kwargs):
+        curve = target.split(".")[0]
+        cvs = self.scene.curves[curve]["cvs"]
+        cvs[1:-1] = (cvs[:-2] + cvs[1:-1] * 2 + cvs[2:]) / 4.0
+
+    def pointOnCurve(self, curve, pr=0.0, p=False, **kwargs):
+        curve = curve[0] if isinstance(curve, list) else curve
+        data = self.scene.curves[curve]
+        lo, hi = self.cm.domain(data["knots"], data["degree"])
+
+        return self.cm.evaluate(data["cvs"], data["knots"], data["degree"], [lo + (hi - lo) * pr])[0].tolist()
+
+    def curve(self, *args, **kwargs):
+        """cmds.curve(p=, k=, d=, per=, name=) と replace=True による置き換え"""
+        points = np.asarray(kwargs["p"], dtype=float)
+        knots = np.asarray(kwargs["k"], dtype=float)
+        degree = kwargs.get("d", 3)
+        requested = kwargs.get("name") or kwargs.get("n")
+
+        if kwargs.get("replace") or kwargs.get("r"):
+            name = args[0]
+        elif requested and requested not in self.scene.attrs:
+            name = requested
+        else:
+            name = self.scene.unique_name(requested or "curve")
+
+        self.scene.add_curve(name, points, knots, degree)
+
+        return name
+
+
+class FakeNnutil(object):
+    """
+    nnutil.core のうち nncurve が使う関数をコンポーネント名ベースで実装した偽モジュール
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def order(self, mesh, edge_indices):
+        adjacency = collections.defaultdict(list)
+
+        for a, b in self.scene.meshes[mesh]["edges"][edge_indices].tolist():
+            adjacency[a].append(b)
+            adjacency[b].append(a)
+
+        ends = sorted(v for v, n in adjacency.items() if len(n) == 1)
+        ordered = [ends[0]]
+
+        while len(ordered) < len(adjacency):
+            following = [v for v in adjacency[ordered[-1]] if len(ordered) < 2 or v != ordered[-2]]
+            ordered.append(following[0])
+
+        return ordered
+
+    def get_end_vtx_e(self, edges):
+        mesh = parse(edges[0])[0]
+        ordered = self.order(mesh, [parse(edge)[2] for edge in edges])
+
+        return ["%s.vtx[%d]" % (mesh, ordered[0]), "%s.vtx[%d]" % (mesh, ordered[-1])]
+
+    def sortVtx(self, edges, vertices):
+        mesh = parse(edges[0])[0]
+
+        return ["%s.vtx[%d]" % (mesh, v) for v in self.order(mesh, [parse(edge)[2] for edge in edges])]
+
+    def isStart(self, vtx, curve):
+        mesh, _, index = parse(vtx)
+        point = self.scene.meshes[mesh]["points"][index]
+        cvs = self.scene.curves[curve[0] if isinstance(curve, list) else curve]["cvs"]
+
+        return np.linalg.norm(point - cvs[0]) <= np.linalg.norm(point - cvs[-1])
+
+    def vtxListPath(self, vertices, n=None):
+        points = np.array([self.scene.meshes[parse(v)[0]]["points"][parse(v)[2]] for v in vertices])
+        lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+
+        return float(lengths.sum() if n is None else lengths[:n].sum())
+
+    def get_object(self, component):
+        return component.split(".")[0]
+
+    def get_selection(self):
+        return list(self.scene.selection)
+
+    def get_all_polylines(self, edges):
+        return [edges]
+
+
+class FakeBackend(object):
+    """
+    FakeScene を読み書きする backend.MeshBackend の実装
+    """
+
+    def __init__(self, scene, topology):
+        self.scene = scene
+        self.topology = topology
+        self.calls = collections.Counter()
+
+    def get_points(self, mesh, indices=None):
+        self.calls["get_points"] += 1
+        points = self.scene.meshes[mesh]["points"]
+
+        return (points if indices is None else points[np.asarray(indices, dtype=int)]).astype(float)
+
+    def set_points(self, mesh, indices, positions):
+        self.calls["set_points"] += 1
+        self.scene.meshes[mesh]["points"][np.asarray(indices, dtype=int)] = positions
+
+    def get_topology_checksum(self, mesh):
+        self.calls["get_topology_checksum"] += 1
+        data = self.scene.meshes[mesh]
+        counts = [len(data["points"]), len(data["edges"]), data["faces"]]
+
+        return self.topology.make_checksum(counts, [data["edges"]])
+
+    def get_edge_vertices(self, mesh):
+        self.calls["get_edge_vertices"] += 1
+        return self.scene.meshes[mesh]["edges"]
+
+    def get_triangles(self, mesh):
+        self.calls["get_triangles"] += 1
+        return self.scene.meshes[mesh]["triangles"]
+
+    def get_curve_data(self, curve):
+        self.calls["get_curve_data"] += 1
+        data = self.scene.curves[curve]
+
+        return data["cvs"].copy(), data["knots"].copy(), data["degree"]
+
+    def get_curves_data(self, curves):
+        self.calls["get_curves_data"] += 1
+        data = [self.scene.curves[curve] for curve in curves]
+
+        return [(curve_data["cvs"].copy(), curve_data["knots"].copy(), curve_data["degree"]) for curve_data in data]
+
+    def set_curve_cvs(self, curve, cvs):
+        self.calls["set_curve_cvs"] += 1
+        self.scene.curves[curve]["cvs"][:] = cvs
+
+    def get_curve_states(self, curves, attr_name):
+        self.calls["get_curve_states"] += 1
+        states = []
+
+        for curve in curves:
+            attrs = self.scene.attrs.get(curve, {})
+            states.append((attrs.get("visibility", True), attrs.get(attr_name)))
+
+        return states
+
+    def get_curve_attributes(self, curves, strings=(), arrays=()):
+        self.calls["get_curve_attributes"] += 1
+        values = []
+
+        for curve in curves:
+            attrs = self.scene.attrs.get(curve, {})
+            curve_values = dict((name, attrs.get(name)) for name in strings)
+            curve_values.update((name, None if attrs.get(name) is None else np.asarray(attrs[name], dtype=float))
+                                for name in arrays)
+            values.append(curve_values)
+
+        return values
+
+    def set_curve_attributes(self, curve, strings=None, arrays=None, values=None):
+        self.calls["set_curve_attributes"] += 1
+        attrs = self.scene.attrs[curve]
+        attrs.update(strings or {})
+        attrs.update((name, np.asarray(value, dtype=float).tolist()) for name, value in (arrays or {}).items())
+        attrs.update(values or {})
+
+    def get_curve_cvs_at_frames(self, curve, frames):
+        """カーブが y 方向に揺れるアニメーション"""
+        self.calls["get_curve_cvs_at_frames"] += 1
+        cvs = self.scene.curves[curve]["cvs"]
+        offsets = np.sin(np.asarray(frames, dtype=float) * 0.1)[:, None] * np.linspace(0.0, 0.5, len(cvs))[None, :]
+        frames_cvs = np.repeat(cvs[None], len(frames), axis=0)
+        frames_cvs[:, :, 1] += offsets
+
+        return frames_cvs
+
+    def key_points(self, mesh, indices, frames, positions):
+        self.calls["key_points"] += 1
+        keys = self.scene.keys.setdefault(mesh, {})
+        before = dict(keys)
+
+        class Change(object):
+            def redo(self):
+                keys.update(zip(np.asarray(indices).tolist(), np.swapaxes(positions, 0, 1)))
+
+            def undo(self):
+                keys.clear()
+                keys.update(before)
+
+        change = Change()
+        change.redo()
+
+        return change
+
+    def commit(self, record):
+        self.calls["commit"] += 1
+        record.redo()
+
+
+class Recorder(object):
+    """
+    属性として取り出した関数の呼び出しを名前毎に数えるラッパー
+    """
+
+    def __init__(self, target, counts, prefix=""):
+        self._target = target
+        self._counts = counts
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        function = getattr(self._target, name)
+        counts = self._counts
+        key = self._prefix + name
+
+        def recorded(*args, **kwargs):
+            counts[key] += 1
+            return function(*args, **kwargs)
+
+        return recorded
+
+
+class Harness(object):
+    """
+    偽モジュールを組み込んでパッケージを読み込み, シーンとカウンターを管理する
+    """
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.scene = FakeScene()
+        self.cmds = Recorder(None, self.counts)
+        self.nu = Recorder(None, self.counts, "nu.")
+        self.install()
+
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        sys.path.insert(0, os.path.dirname(package_dir))
+        self.package = importlib.import_module(os.path.basename(package_dir))
+        self.core = self.package.core
+        self.instrument = self.package.instrument
+        self.reset()
+
+    def install(self):
+        maya = types.ModuleType("maya")
+        mel = types.ModuleType("maya.mel")
+        api = types.ModuleType("maya.api")
+        om = types.ModuleType("maya.api.OpenMaya")
+        om.MPxCommand = object
+        oma = types.ModuleType("maya.api.OpenMayaAnim")
+
+        maya.cmds = self.cmds
+        maya.mel = mel
+        maya.api = api
+        api.OpenMaya = om
+        api.OpenMayaAnim = oma
+
+        nnutil = types.ModuleType("nnutil")
+        display = types.ModuleType("nnutil.display")
+        display.message = lambda message: None
+        nnutil.core = self.nu
+        nnutil.display = display
+
+        sys.modules.update({
+            "maya": maya, "maya.cmds": self.cmds, "maya.mel": mel, "maya.api": api, "maya.api.OpenMaya": om,
+            "maya.api.OpenMayaAnim": oma,
+            "nnutil": nnutil, "nnutil.core": self.nu, "nnutil.display": display,
+        })
+
+    def reset(self):
+        """シーンとキャッシュを空にする"""
+        self.scene = FakeScene()
+        self.cmds._target = FakeCmds(self.scene, self.package.curvemath)
+        self.nu._target = FakeNnutil(self.scene)
+        self.backend = FakeBackend(self.scene, self.package.topology)
+        self.package.backend.set_backend(self.backend)
+        self.core.topology_cache.clear()
+        self.core.arc_length_cache.clear()
+
+    def measure(self, function):
+        """function を実行し (秒, コマンド呼び出し数, バックエンド呼び出し数, 内訳) を返す"""
+        self.counts.clear()
+        self.backend.calls.clear()
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+
+        return seconds, sum(self.counts.values()), sum(self.backend.calls.values()), dict(self.counts)
+
+
+def chainScenario(harness, vertex_count, legacy_limit):
+    """一本のエッジ列 (vertex_count 頂点) に対する各フェーズ"""
+    harness.reset()
+    scene = harness.scene
+    core = harness.core
+    mesh = scene.add_strip_mesh("pStrip", 2, vertex_count)
+    edges = scene.row_edges(mesh, 0)
+    curve = scene.add_guide_curve("NNAEOC_Curve1", mesh, 0)
+    core.addAttributes(curve, edges)
+
+    def makeCurve(native):
+        # 作ったカーブが後の Fit All の対象にならないようにすぐ消す
+        scene.remove(core.makeCurve(edges, native=native)[0])
+
+    phases = [
+        ("make_curve", lambda: makeCurve(True)),
+        ("make_curve_legacy", lambda: makeCurve(False)),
+        ("fit_keep_ratio", lambda: core.alignEdgesOnCurve(edges, curve, True)),
+        ("fit_even", lambda: core.alignEdgesOnCurve(edges, curve, False)),
+        ("fit_all", lambda: core.fitCurves(None, True, force=True)),
+        ("fit_all_unchanged", lambda: core.fitCurves(None, True, force=False)),
+    ]
+
+    if vertex_count <= legacy_limit:
+        phases.append(("fit_legacy", lambda: core.alignEdgesOnCurve(edges, curve, True, native=False)))
+
+    return [("chain", vertex_count, 1, vertex_count) + (name,) + harness.measure(function) for name, function in phases]
+
+
+def curvesScenario(harness, curve_count, cols=50):
+    """curve_count 本のカーブ (各 cols 頂点) を持つシーンに対する各フェーズ"""
+    harness.reset()
+    scene = harness.scene
+    core = harness.core
+    bake = importlib.import_module(harness.package.__name__ + ".bake")
+    exchange = importlib.import_module(harness.package.__name__ + ".exchange")
+    mesh = scene.add_strip_mesh("pStrip", curve_count + 1, cols)
+    rows = [scene.row_edges(mesh, row) for row in range(curve_count)]
+
+    # 行 r と行 curve_count - r が y = 0 で鏡映の関係になるように置く
+    scene.meshes[mesh]["points"][:, 1] -= curve_count * 0.5
+
+    def makeAll():
+        for row, edges in enumerate(rows):
+            curve = core.makeCurve(edges)[0]
+            harness.cmds.rename(curve, core.curve_prefix, ignoreShape=True)
+
+    def offsetCurves():
+        for curve in scene.curves.values():
+            curve["cvs"][:, 1] += 0.25
+
+    def fitSymmetric():
+        axis, core.mirror_axis = core.mirror_axis, 1
+
+        try:
+            return core.fitCurves(None, True, force=True, symmetry=True)
+        finally:
+            core.mirror_axis = axis
+
+    def exportImport():
+        """書き出して読み込む. 読み込んだカーブは既存のカーブとは別名で増える"""
+        handle, path = tempfile.mkstemp(suffix=".npz")
+        os.close(handle)
+
+        try:
+            exchange.exportCurves(path)
+            exchange.importCurves(path)
+        finally:
+            os.remove(path)
+
+    phases = [
+        ("make_curves", makeAll),
+        ("fit_all", lambda: (offsetCurves(), core.fitCurves(None, True, force=True))),
+        ("fit_all_unchanged", lambda: core.fitCurves(None, True, force=False)),
+        ("fit_all_chunk8", lambda: (offsetCurves(), core.fitCurves(None, True, force=True, chunk_size=8))),
+        ("fit_all_projected", lambda: (offsetCurves(), core.fitCurves(None, True, force=True, projection=1.0))),
+        ("fit_all_symmetry", lambda: (offsetCurves(), fitSymmetric())),
+        ("smooth_all", lambda: core.smoothCurves(None)),
+        ("smooth_all_legacy", lambda: core.smoothCurves(None, native=False)),
+        ("rebuild_all", lambda: core.rebuildCurves(None, 4)),
+        ("rebuild_all_legacy", lambda: core.rebuildCurves(None, 4, native=False)),
+        ("bake_500", lambda: bake.keyBake(bake.bakeCurves(None, 1, 500))),
+        ("export_import", exportImport),
+    ]
+
+    vertex_count = curve_count * cols
+
+    return [("curves", curve_count, curve_count, vertex_count) + (name,) + harness.measure(function)
+            for name, function in phases]
+
+
+def formatTable(rows):
+    header = "%-8s %7s %-18s %10s %9s %9s %10s" % ("scenario", "size", "phase", "ms", "cmds", "backend", "cmds/vtx")
+    lines = [header, "-" * len(header)]
+
+    for scenario, size, curves, vertices, phase, seconds, calls, backend_calls, _ in rows:
+        lines.append("%-8s %7d %-18s %10.2f %9d %9d %10.3f" % (
+            scenario, size, phase, seconds * 1000.0, calls, backend_calls, calls / float(vertices)))
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="nncurve benchmark with a recording maya.cmds stand-in")
+    parser.add_argument("--quick", action="store_true", help="limit to 10k vertices and 100 curves")
+    parser.add_argument("--legacy-limit", type=int, default=10000, help="largest chain for the legacy fit path")
+    parser.add_argument("--json", default=None, help="write the results to this JSON file")
+    parser.add_argument("--profile", action="store_true", help="also print the per-phase report from nncurve.instrument")
+    args = parser.parse_args(argv)
+
+    vertex_counts = [10, 100, 1000, 10000, 100000]
+    curve_counts = [1, 10, 100, 1000]
+
+    if args.quick:
+        vertex_counts = [v for v in vertex_counts if v <= 10000]
+        curve_counts = [c for c in curve_counts if c <= 100]
+
+    harness = Harness()
+    rows = []
+
+    if args.profile:
+        harness.instrument.enable()
+
+    for vertex_count in vertex_counts:
+        rows += chainScenario(harness, vertex_count, args.legacy_limit)
+
+    for curve_count in curve_counts:
+        rows += curvesScenario(harness, curve_count)
+
+    print(formatTable(rows))
+
+    if args.profile:
+        print("")
+        print(harness.instrument.format_table(max_curves=5))
+
+    if args.json:
+        keys = ("scenario", "size", "curves", "vertices", "phase", "seconds", "calls", "backend_calls", "call_counts")
+
+        with open(args.json, "w") as f:
+            json.dump([dict(zip(keys, row)) for row in rows], f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#! python
+# coding:utf-8
+"""
+カーブに保存するエッジ列 (dst_edges) の文字列形式
+
+旧形式: "pSphere1.e[12],pSphere1.e[13],..." (コンポーネント名のカンマ区切り)
+形式 2: "#2;pSphere1;e=12-40,55;v=11-41,56;t=<トポロジーチェックサム>"
+    e  エッジ列の順に並べたエッジインデックス (連番は範囲で圧縮)
+    v  端点から順に並べた頂点インデックス (省略可)
+    t  v を作った時点のトポロジーチェックサム (省略可)
+
+Maya のノード名には '#' ';' '=' が使えないので先頭の '#' で形式を判別できる
+"""
+
+import re
+
+import numpy as np
+
+
+# 旧形式の区切り文字
+component_separator = ','
+
+# 形式 2 の先頭とフィールド区切り
+format_prefix = "#"
+field_separator = ';'
+current_version = 2
+
+# "pSphere1.vtx[12]" のようなコンポーネント名からノード名とインデックスを取り出す
+component_pattern = re.compile(r"^(.+)\.\w+\[(\d+)\]$")
+
+
+def parse_component(component):
+    """
+    コンポーネント名を (ノード名, インデックス) に分解する
+    """
+    match = component_pattern.match(component)
+
+    if not match:
+        raise ValueError("invalid component: %s" % component)
+
+    return match.group(1), int(match.group(2))
+
+
+def encode_ranges(indices):
+    """
+    インデックス列を順序を保ったまま "12-40,55,60-58" のような文字列にする
+    増加・減少どちらの連番も 3 個以上続けば範囲にまとめる
+    """
+    indices = [int(i) for i in indices]
+    tokens = []
+    i = 0
+
+    while i < len(indices):
+        j = i
+
+        if i + 1 < len(indices) and abs(indices[i + 1] - indices[i]) == 1:
+            step = indices[i + 1] - indices[i]
+
+            while j + 1 < len(indices) and indices[j + 1] - indices[j] == step:
+                j += 1
+
+        if j - i >= 2:
+            tokens.append("%d-%d" % (indices[i], indices[j]))
+            i = j + 1
+        else:
+            tokens.append(str(indices[i]))
+            i += 1
+
+    return component_separator.join(tokens)
+
+
+def decode_ranges(text):
+    """
+    encode_ranges の文字列をインデックス配列に戻す
+    """
+    chunks = []
+
+    for token in text.split(component_separator):
+        if not token:
+            continue
+
+        if "-" in token:
+            first, last = [int(x) for x in token.split("-")]
+            step = 1 if last >= first else -1
+            chunks.append(np.arange(first, last + step, step))
+        else:
+            chunks.append(np.array([int(token)]))
+
+    if not chunks:
+        return np.zeros(0, dtype=int)
+
+    return np.concatenate(chunks).astype(int)
+
+
+class Binding(object):
+    """
+    カーブに結び付けられたエッジ列
+
+    mesh メッシュ名
+    edges エッジインデックスの配列
+    vertices 端点から順に並べた頂点インデックスの配列 (不明なら None)
+    checksum vertices を作った時点のトポロジーチェックサム (不明なら None)
+    """
+
+    def __init__(self, mesh, edges, vertices=None, checksum=None):
+        self.mesh = mesh
+        self.edges = np.asarray(edges, dtype=int)
+        self.vertices = None if vertices is None else np.asarray(vertices, dtype=int)
+        self.checksum = checksum
+
+    def edge_components(self):
+        """エッジのコンポーネント名のリスト"""
+        return ["%s.e[%d]" % (self.mesh, i) for i in self.edges]
+
+    def encode(self):
+        """最新の形式の文字列にする"""
+        fields = [format_prefix + str(current_version), self.mesh, "e=" + encode_ranges(self.edges)]
+
+        if self.vertices is not None:
+            fields.append("v=" + encode_ranges(self.vertices))
+
+            if self.checksum:
+                fields.append("t=" + self.checksum)
+
+        return field_separator.join(fields)
+
+
+def from_components(components):
+    """
+    同一メッシュのエッジのコンポーネント名のリストから Binding を作る
+    """
+    parsed = [parse_component(component) for component in components]
+
+    if not parsed:
+        raise ValueError("empty edge list")
+
+    mesh = parsed[0][0]
+
+    if any(node != mesh for node, _ in parsed):
+        raise ValueError("edges must belong to a single mesh")
+
+    return Binding(mesh, [index for _, index in parsed])
+
+
+def is_legacy(text):
+    """旧形式 (コンポーネント名のカンマ区切り) なら True"""
+    return not text.startswith(format_prefix)
+
+
+def decode(text):
+    """
+    保存された文字列を Binding にする. 旧形式と形式 2 のどちらも読める
+    """
+    if is_legacy(text):
+        return from_components([x for x in text.split(component_separator) if x])
+
+    fields = text[len(format_prefix):].split(field_separator)
+    version = int(fields[0])
+
+    if version > current_version:
+        raise ValueError("unsupported binding format version: %d" % version)
+
+    mesh = fields[1]
+    values = dict(field.split("=", 1) for field in fields[2:])
+    vertices = decode_ranges(values["v"]) if "v" in values else None
+
+    return Binding(mesh, decode_ranges(values["e"]), vertices, values.get("t"))
@@ -6,193 +6,1337 @@ import copy
 
 import importlib
 
+import numpy as np
+
 import maya.cmds as cmds
 import maya.mel as mel
 
-import nnutil.core as nu
-import nnutil.display as nd
+import nnutil.core as nu
+import nnutil.display as nd
+
+from . import curvemath as cm
+from . import backend
+from . import topology
+from . import binding
+from . import nncurve_undo
+from . import instrument
+from . import spatial
+
+# 計測中 (instrument.enable()) はコマンドの呼び出し回数を数える
+cmds = instrument.CountingCommands(cmds)
+
+# TODO: U値スライダー
+
+window_width = 300
+header_width = 50
+bw_single = 24
+bw_double = bw_single*2 + 2
+bw_3 = bw_single*3 + 2
+
+# アトリビュートにエッジ列を文字列で保存する際の区切り文字 (旧形式とフィールドの表示用)
+component_separator = binding.component_separator
+
+# このツールで生成されるカーブノードの名称につけるプリフィックス
+curve_prefix = "NNAEOC_Curve"
+
+# エッジ列をカーブに保存する際のカスタムアトリビュート名
+attr_name = "dst_edges"
+
+# 最後に Fit したときのカーブと頂点の指紋を保存するカスタムアトリビュート名
+fingerprint_attr_name = "dst_fingerprint"
+
+# エッジ列を拘束した時点の頂点列の長さの比率 (keep ratio mode で使う正規化弧長)
+ratios_attr_name = "dst_ratios"
+
+# このツールのカーブを登録しておく objectSet
+# リネームされたカーブも追えて, 一覧の取得がセットのメンバーの問い合わせ一回で済む
+registry_name = "NN_Curve_registry"
+
+# メッシュ毎のトポロジーインデックスとカーブ毎の並べ替え済み頂点列のキャッシュ
+topology_cache = topology.TopologyCache()
+
+# 弧長テーブルのキャッシュ. カーブ形状が変わっていなければ Fit で再計算しない
+arc_length_cache = cm.ArcLengthCache(max_bytes=64 * 1024 * 1024)
+
+# エッジ列の再割り当ての探索範囲 (平均エッジ長の倍数) とカーブから離れた経路へのペナルティ
+reassign_corridor = 4.0
+reassign_penalty = 4.0
+
+# ネイティブのスムースの強さ (Taubin の時は smooth_shrink で膨らませて縮みを抑える)
+smooth_factor = 0.5
+smooth_shrink = -0.53
+
+# 面への投影 (Fit 後の頂点を元の面に戻す) で探す範囲 (平均エッジ長の倍数)
+projection_radius = 2.0
+
+# シンメトリー Fit の鏡映軸 (0: X, 1: Y, 2: Z. ワールドの原点を通る平面) と鏡映先の頂点を探す距離 (平均エッジ長に対する割合)
+mirror_axis = 0
+mirror_tolerance = 0.01
+
+# Fit All などの一括処理でまとめて計算して書き込むカーブの本数
+# 小さくすると進捗表示と中断の反応が良くなり, 大きくすると書き込みの回数が減って速くなる
+batch_chunk_size = 64
+
+
+def addAttributes(curve, edges, capture_ratios=True):
+    """
+    カーブオブジェクトにアトリビュート追加
+    edges はエッジのコンポーネント名のリストか dst_edges 形式の文字列 (旧形式も可)
+    アトリビュートには binding の圧縮形式で保存する
+    capture_ratios が True なら今の頂点列の長さの比率も保存する
+    edges を Binding にできなければ (複数のメッシュにまたがるエッジなど) 指定をそのまま保存して警告し, 比率は消す
+    そのカーブは Fit で "broken" になり, findBrokenCurves / rebindCurves で直せる. 空の指定は未設定として空の文字列を保存する
+    """
+
+    try:
+        edges_str = makeBinding(edges).encode()
+
+    except ValueError as error:
+        edges_str = edges if isinstance(edges, str) else component_separator.join(edges)
+        capture_ratios = False
+        setRatios(curve, None)
+
+        if edges_str:
+            cmds.warning("%s: edges are stored as entered but cannot be fitted (%s)" % (curve, error))
+
+    curve_str = curve
+    attr_fullname = curve_str + "." + attr_name
+
+    if not cmds.attributeQuery(attr_name, node=curve_str, exists=True):
+        cmds.addAttr(curve_str, ln=attr_name, dt="string")
+
+    cmds.setAttr(attr_fullname, edges_str, e=True, type="string")
+    cmds.setAttr(attr_fullname, e=True, channelBox=True)
+
+    registerCurves([curve_str])
+
+    if capture_ratios:
+        try:
+            captureRatios(curve_str)
+
+        except ValueError:
+            # 一本に繋がらないエッジ列は比率を持たない
+            setRatios(curve_str, None)
+
+
+def toBinding(edges):
+    """
+    エッジの指定を binding.Binding にする
+    edges はコンポーネント名のリスト, dst_edges 形式の文字列 (旧形式も可), Binding のいずれか
+    """
+    if isinstance(edges, binding.Binding):
+        return edges
+
+    if isinstance(edges, str):
+        return binding.decode(edges)
+
+    return binding.from_components(edges)
+
+
+def makeBinding(edges):
+    """
+    エッジの指定をエッジ列の順に並べ替えた Binding にする
+    一本に繋がったエッジ列なら頂点列とトポロジーチェックサムも付ける
+    """
+    edge_binding = toBinding(edges)
+
+    try:
+        index = topology_cache.get(edge_binding.mesh, backend.get_backend())
+        vertices, ordered_edges = index.order_chain(edge_binding.edges, with_edges=True)
+
+    except ValueError:
+        return binding.Binding(edge_binding.mesh, edge_binding.edges)
+
+    return binding.Binding(edge_binding.mesh, ordered_edges, vertices, index.checksum)
+
+
+def getBinding(curve):
+    """
+    カーブに保存されたエッジ列を Binding で返す
+    """
+    return binding.decode(cmds.getAttr(curve + "." + attr_name))
+
+
+def getEdgeComponents(edges_str):
+    """
+    dst_edges 形式の文字列 (旧形式も可) をエッジのコンポーネント名のリストにする
+    """
+    return toBinding(edges_str).edge_components()
+
+
+def migrateAttributes():
+    """
+    旧形式の dst_edges を持つこのツールのカーブをすべて最新の形式に書き換える
+    戻り値は書き換えたカーブの数
+    """
+    count = 0
+
+    with topology_cache.batch():
+        for curve, _, edges_str in getCurveStates():
+            if edges_str and binding.is_legacy(edges_str):
+                addAttributes(curve, edges_str, capture_ratios=False)
+                count += 1
+
+    return count
+
+
+def getFingerprint(curve):
+    """
+    最後に Fit したときの指紋を返す. 未保存なら None
+    """
+    if not cmds.attributeQuery(fingerprint_attr_name, node=curve, exists=True):
+        return None
+
+    return cmds.getAttr(curve + "." + fingerprint_attr_name)
+
+
+def setFingerprint(curve, fingerprint):
+    """
+    Fit したときの指紋をカーブに保存する
+    """
+    if not cmds.attributeQuery(fingerprint_attr_name, node=curve, exists=True):
+        cmds.addAttr(curve, ln=fingerprint_attr_name, dt="string")
+
+    cmds.setAttr(curve + "." + fingerprint_attr_name, fingerprint, type="string")
+
+
+def getRatios(curve):
+    """
+    保存された頂点列の長さの比率を返す. 未保存なら None
+    """
+    if not cmds.attributeQuery(ratios_attr_name, node=curve, exists=True):
+        return None
+
+    values = cmds.getAttr(curve + "." + ratios_attr_name)
+
+    if not values:
+        return None
+
+    return np.asarray(values, dtype=float)
+
+
+def getStoredFits(curves):
+    """
+    カーブ毎の [指紋, 比率] (getFingerprint, getRatios と同じ値) をバックエンドでまとめて読む
+    """
+    values = backend.get_backend().get_curve_attributes(curves, [fingerprint_attr_name], [ratios_attr_name])
+    stored = []
+
+    for curve_values in values:
+        ratios = curve_values[ratios_attr_name]
+        stored.append([curve_values[fingerprint_attr_name], ratios if ratios is not None and len(ratios) else None])
+
+    return stored
+
+
+def setRatios(curve, ratios):
+    """
+    頂点列の長さの比率をカーブに保存する. None なら消す
+    """
+    if not cmds.attributeQuery(ratios_attr_name, node=curve, exists=True):
+        if ratios is None:
+            return
+
+        cmds.addAttr(curve, ln=ratios_attr_name, dt="doubleArray")
+
+    values = [] if ratios is None else np.asarray(ratios, dtype=float).tolist()
+    cmds.setAttr(curve + "." + ratios_attr_name, values, type="doubleArray")
+
+
+def captureRatios(curve):
+    """
+    今の頂点列の長さの比率 (エッジ列の頂点順) を測ってカーブに保存する
+    以後の keep ratio mode の Fit はこの比率を使うので, Fit を繰り返しても比率がずれていかない
+    """
+    edge_binding = getBinding(curve)
+    mesh, indices = getOrderedVertices(edge_binding, curve)
+    points = backend.get_backend().get_points(mesh, indices)
+    setRatios(curve, cm.chord_ratios(points, closed=isClosedChain(edge_binding, indices)))
+
+    # 比率が変わったので次の Fit All ではスキップしない
+    if getFingerprint(curve):
+        setFingerprint(curve, "")
+
+
+def captureCurveRatios(curves=None):
+    """
+    カーブの頂点列の長さの比率をまとめて取り直す
+    戻り値は取り直したカーブのリスト
+    """
+    captured = []
+
+    with nncurve_undo.chunk("NN_Curve Capture Ratios"), topology_cache.batch():
+        for curve in getValidCurves(curves):
+            try:
+                captureRatios(curve)
+                captured.append(curve)
+
+            except ValueError:
+                pass
+
+    return captured
+
+
+def makeFitFingerprint(cvs, indices, points, keep_ratio_mode, projection=0.0, symmetry=False):
+    """
+    カーブ CV と拘束頂点の座標から指紋を作る
+    頂点はインデックス順に並べ替えてから使うので頂点列の向きには依存しない
+    """
+    order = np.argsort(indices)
+    settings = [keep_ratio_mode, projection] if projection else [keep_ratio_mode]
+
+    if symmetry:
+        settings.append("mirror%d" % mirror_axis)
+
+    return cm.fingerprint([cvs, indices[order], points[order], settings])
+
+
+def appearanceValues():
+    """カーブの見た目のアトリビュートと値"""
+    line_width = 2
+    color = [1.0, 0.3, 0.0]
+
+    return {
+        "lineWidth": line_width,
+        "overrideEnabled": 1,
+        "overrideRGBColors": 1,
+        "overrideColorR": color[0],
+        "overrideColorG": color[1],
+        "overrideColorB": color[2],
+        "useOutlinerColor": True,
+        "outlinerColor": tuple(color),
+    }
+
+
+def changeAppearance(curve):
+    """カーブの見た目を変更する"""
+    for name, value in appearanceValues().items():
+        if isinstance(value, tuple):
+            cmds.setAttr('%s.%s' % (curve, name), *value)
+        else:
+            cmds.setAttr('%s.%s' % (curve, name), value)
+
+
+def makeCurve(edges, n=4, native=True):
+    """
+    引数のエッジ列からカーブを生成してアトリビュート付与する
+    連続しない複数エッジ列の場合はエラーを返す (エッジ列の分割は関数の外で行う)
+
+    native が True なら頂点列を直接 n スパンの B スプラインで最小二乗近似して cmds.curve 一回で作る
+    False なら従来通り polyToCurve + rebuildCurve で作る
+    """
+    with topology_cache.batch():
+        if native:
+            # 連続した一本のエッジ列 (開いていても閉じていても良い) 以外はエラーで終了 (ValueError)
+            mesh, indices = getOrderedVertices(edges)
+            curve = _makeCurveNative(mesh, indices, n, isClosedChain(edges, indices))
+
+        else:
+            # カーブ作成
+            with instrument.phase("conversion"):
+                cmds.select(edges, replace=True)
+                curve = cmds.polyToCurve(form=2, degree=3, conformToSmoothMeshPreview=1)[0]
+
+            # リビルドしてヒストリ消す
+            with instrument.phase("rebuild"):
+                cmds.rebuildCurve(curve, ch=1, rpo=1, rt=0, end=1, kr=0, kcp=0, kep=1, kt=0, s=n, d=3, tol=0.01)
+                cmds.DeleteHistory(curve)
+
+            # 連続した一本のエッジ列以外はエラーで終了 (ValueError)
+            getOrderedVertices(edges, curve)
+
+        # 見た目の変更
+        changeAppearance(curve)
+
+        addAttributes(curve, edges)
+
+    return [curve, edges]
+
+
+def _makeCurveNative(mesh, indices, n, closed=False):
+    """
+    並べ替え済みの頂点列を弦長パラメーター化して最小二乗近似したカーブを作る
+    closed なら頂点列の始点を継ぎ目にした周期カーブにする
+    ヒストリノードは作らない
+    """
+    with instrument.phase("read"):
+        points = backend.get_backend().get_points(mesh, indices)
+
+    with instrument.phase("rebuild"):
+        if closed:
+            cvs, knots = cm.fit_periodic_bspline(points, n)
+        else:
+            cvs, knots = cm.fit_bspline(points, n)
+
+    with instrument.phase("writeback"):
+        curve = cmds.curve(p=cvs.tolist(), k=knots.tolist(), d=3, per=closed)
+
+    return curve
+
+
+def remakeCurve(curve, edges, n=4, native=True):
+    """
+    既存のカーブをエッジ列から makeCurve と同じ方法で作り直し, 元のカーブの名前を引き継ぐ
+    edges はエッジのコンポーネント名のリストか dst_edges 形式の文字列 (旧形式も可)
+    新しいカーブを作れなければ (ValueError) 元のカーブは消さない
+    戻り値は [カーブ名, エッジのコンポーネント名のリスト]
+    """
+    if isinstance(edges, str):
+        edges = getEdgeComponents(edges)
+
+    new_curve, edges = makeCurve(edges, n, native)
+
+    # アトリビュートと比率は makeCurve で設定済みで, レジストリの objectSet もリネームに追従する
+    cmds.delete(curve)
+    curve = cmds.rename(new_curve, curve, ignoreShape=True)
+
+    return [curve, edges]
+
+
+def getCurveData(curve):
+    """
+    カーブの CV (ワールド空間), ノット (Maya 形式), 次数 を取得する
+    """
+    return backend.get_backend().get_curve_data(curve)
+
+
+def getVertexPositions(vertices):
+    """
+    同一メッシュの頂点コンポーネント名のリストから座標を一括で取得する
+    戻り値は [メッシュ名, 頂点インデックスの配列, 座標の (n, 3) 配列]
+    """
+    components = [backend.parse_component(vtx) for vtx in vertices]
+    mesh = components[0][0]
+    indices = np.array([index for _, index in components], dtype=int)
+    points = backend.get_backend().get_points(mesh, indices)
+
+    return [mesh, indices, points]
+
+
+def getOrderedVertices(edges, curve=None):
+    """
+    エッジ列を端点から順に並べた頂点インデックスにする
+    メッシュ毎のトポロジーインデックスを使うのでコンポーネント変換のコマンドは実行しない
+    curve を指定するとトポロジーが変わらない間は結果をカーブ毎にキャッシュする
+    edges が保存済みの頂点列を持ちトポロジーチェックサムが一致すればそれをそのまま使う
+    戻り値は [メッシュ名, 頂点インデックスの配列]
+    """
+    with instrument.phase("conversion"):
+        edge_binding = toBinding(edges)
+
+    mesh = edge_binding.mesh
+    mesh_backend = backend.get_backend()
+
+    with instrument.phase("sorting"):
+        if edge_binding.vertices is not None:
+            if edge_binding.checksum == topology_cache.get(mesh, mesh_backend).checksum:
+                return [mesh, edge_binding.vertices]
+
+        indices = topology_cache.get_chain(curve, mesh, edge_binding.edges, mesh_backend)
+
+    return [mesh, indices]
+
+
+def isClosedChain(edges, indices):
+    """
+    getOrderedVertices で並べた頂点列が閉じたループなら True
+    ループはエッジ数と頂点数が等しい (開いたエッジ列は頂点の方が一つ多い)
+    """
+    return len(toBinding(edges).edges) == len(indices)
+
+
+def alignEdgesOnCurve(edges, curve, keep_ratio_mode=True, n=4, native=True, writer=None, force=True):
+    """
+    edges 編集するエッジ (コンポーネント名のリスト, dst_edges 形式の文字列, Binding のいずれか)
+    curve 整形に使用するカーブ
+    keep_ratio_mode Trueなら元のエッジの長さの比率を維持する, False なら頂点をカーブ上に均等配置する
+    native True ならカーブを直接評価して全頂点の移動先を一括計算する
+           False なら従来通り内部リビルドしたカーブに pointOnCurve を頂点毎に実行する
+    writer 頂点の移動を溜める backend.PointWriter
+           指定した場合は書き込みを呼び出し側の flush に任せる. None ならこの関数内で書き込む
+    force False ならカーブと頂点が前回の Fit から変化していない場合は何もせず None を返す
+          (native の場合のみ)
+    """
+    if writer is None:
+        with instrument.operation("fit"), topology_cache.batch():
+            writer = backend.PointWriter()
+
+            with instrument.curve(curve):
+                ret = alignEdgesOnCurve(edges, curve, keep_ratio_mode, n, native, writer, force)
+
+            with instrument.phase("writeback"):
+                writer.flush()
+
+        return ret
+
+    if native:
+        return _alignEdgesOnCurveNative(edges, curve, keep_ratio_mode, writer, force)
+
+    if not isinstance(edges, list):
+        edges = toBinding(edges).edge_components()
+
+    # 内部リビルド
+    # 直線時に開始位置がずれるバグ対策も兼ね
+    with instrument.phase("rebuild"):
+        target_curve = cmds.duplicate(curve)
+        k = 8
+        cmds.rebuildCurve(target_curve, ch=1, rpo=1, rt=0, end=1, kr=0, kcp=0, kep=1, kt=0, s=n*k, d=3, tol=0.01)
+        cmds.DeleteHistory(target_curve)
+
+    # 選択エッジ集合と構成頂点
+    with instrument.phase("conversion"):
+        edge_set = edges
+        vtx_set = cmds.filterExpand(
+            cmds.polyListComponentConversion(edges, fe=True, tv=True), sm=31)
+
+    with instrument.phase("sorting"):
+        end_vts = nu.get_end_vtx_e(edge_set)
+
+        # 閉じていない連続した一本のエッジ列以外は現状エラーで終了
+        if not len(end_vts) == 2:
+            raise(Exception)
+
+        sorted_vts = nu.sortVtx(edge_set, vtx_set)
+
+        # カーブの始点終点と頂点リストお始点終点が逆なら頂点リストを反転する
+        if not nu.isStart(sorted_vts[0], target_curve):
+            sorted_vts.reverse()
+
+    # 各頂点の移動先の座標を計算
+    new_positions = []
+
+    with instrument.phase("sampling"):
+        if keep_ratio_mode:
+            # 頂点列間の比率を維持してカーブに再配置
+            mesh, indices, points = getVertexPositions(sorted_vts)
+            for u in cm.chord_ratios(points):
+                new_positions.append(cmds.pointOnCurve(target_curve, pr=float(u), p=True))
+
+        else:  # even space mode
+            # 頂点列間の比率を無視してカーブに等間隔で配置
+            for i in range(len(sorted_vts)):
+                u = float(i)/(len(sorted_vts)-1)
+                new_positions.append(cmds.pointOnCurve(target_curve, pr=u, p=True))
+
+    # 実際のコンポーネント移動
+    with instrument.phase("writeback"):
+        writer.add(sorted_vts, new_positions)
+
+    with instrument.phase("rebuild"):
+        cmds.delete(target_curve)
+
+    return [target_curve, edges]
+
+    # カーブ・エッジの同期モードは sync.py
+    """
+      両方向コンストレイント
+      頂点が変更されたらカーブを再生成
+      カーブが変更されたら keep ratio mode で頂点を更新する
+      カーブで形を変えて、頂点でエッジフローだけ直すのを平行してやる感じ
+    """
+
+
+def _alignEdgesOnCurveNative(edges, curve, keep_ratio_mode, writer, force):
+    """
+    alignEdgesOnCurve のカーブ評価を curvemath で一括処理する版
+    カーブの CV とノットを一度だけ読んで弧長テーブルを作り全頂点の移動先を一度に求める
+    一時カーブは作らず, 弧長テーブルは形状が同じ間 arc_length_cache から再利用する
+    カーブ CV と頂点座標の指紋が前回の Fit 時と同じなら force が False の場合はスキップする
+    """
+    job = _gatherFit(curve, edges, keep_ratio_mode, force)
+
+    if job is None:
+        return None
+
+    # 弧長テーブル (一時カーブのリビルドに相当) と全頂点の移動先の一括評価
+    with instrument.phase("sampling"):
+        result = cm.solve_fit(*job.solve_args())
+
+    _applyFit(job, result, writer)
+
+    return [curve, edges]
+
+
+class _FitJob(object):
+    """
+    Fit 一本分の読み込み結果 (gather フェーズの出力)
+    """
+
+    def __init__(self, curve, mesh, indices, points, curve_data, keep_ratio_mode, ratios=None, closed=False,
+                 projection=0.0, symmetry=False):
+        self.curve = curve
+        self.mesh = mesh
+        self.indices = indices
+        self.points = points
+        self.cvs, self.knots, self.degree = curve_data
+        self.keep_ratio_mode = keep_ratio_mode
+        self.ratios = ratios
+        self.closed = closed
+        self.projection = projection
+        self.symmetry = symmetry
+        self.table_key, self.table = arc_length_cache.find(self.cvs, self.knots, self.degree)
+
+    def solve_args(self):
+        """curvemath.solve_fit の引数"""
+        return (self.cvs, self.knots, self.degree, self.points, self.keep_ratio_mode, self.table,
+                arc_length_cache.samples_per_span, self.ratios, self.closed)
+
+
+def readChainPoints(chains):
+    """
+    [メッシュ名, 頂点インデックス] のリストの頂点座標を返す
+    メッシュ毎に全カーブ分の頂点をまとめて一回で読む
+    """
+    mesh_backend = backend.get_backend()
+    indices_by_mesh = {}
+
+    for mesh, indices in chains:
+        indices_by_mesh.setdefault(mesh, []).append(indices)
+
+    readback = {}
+
+    for mesh, parts in indices_by_mesh.items():
+        indices = np.unique(np.concatenate(parts))
+        readback[mesh] = (indices, mesh_backend.get_points(mesh, indices))
+
+    return [readback[mesh][1][np.searchsorted(readback[mesh][0], indices)] for mesh, indices in chains]
+
+
+def _gatherFit(curve, edges, keep_ratio_mode, force, projection=0.0, symmetry=False, chain=None, points=None,
+               curve_data=None, stored=None):
+    """
+    Fit に必要なカーブと頂点のデータを読み込む
+    前回の Fit から変化が無く force が False なら None を返す
+    projection 面への投影の強さ, symmetry 反対側に写すかどうか (指紋に含める. 処理自体は _projectFits, _mirrorFit で行う)
+    chain, points 呼び出し側でまとめて求めた [メッシュ名, 頂点インデックス] とその頂点座標. None ならここで求める
+    curve_data, stored 呼び出し側でまとめて読んだカーブのデータと [指紋, 比率] (getStoredFits). None ならここで読む
+    """
+    # 連続した一本のエッジ列以外はエラーで終了 (ValueError)
+    mesh, indices = chain or getOrderedVertices(edges, curve)
+    closed = isClosedChain(edges, indices)
+
+    # 頂点座標は一度にまとめて取得する
+    with instrument.phase("read"):
+        if points is None:
+            points = backend.get_backend().get_points(mesh, indices)
+
+        if curve_data is None:
+            curve_data = getCurveData(curve)
+
+        stored_fingerprint, stored_ratios = stored or [getFingerprint(curve), getRatios(curve)]
+
+    with instrument.phase("fingerprint"):
+        fingerprint = makeFitFingerprint(curve_data[0], indices, points, keep_ratio_mode, projection, symmetry)
+
+        if not force and stored_fingerprint == fingerprint:
+            return None
+
+    # 保存された比率があれば今の頂点間の長さは測り直さない
+    ratios = stored_ratios if keep_ratio_mode else None
+
+    if ratios is not None and len(ratios) != len(indices):
+        ratios = None
+
+    return _FitJob(curve, mesh, indices, points, curve_data, keep_ratio_mode, ratios, closed, projection, symmetry)
+
+
+def _applyFit(job, result, writer):
+    """
+    solve_fit の結果を writer に積み, writer の flush 後に指紋を保存する
+    """
+    flipped, new_positions, table = result
+    indices = job.indices[::-1] if flipped else job.indices
+
+    # 別スレッドで作った弧長テーブルをキャッシュに登録する
+    if job.table is None:
+        arc_length_cache.add(job.table_key, table)
+
+    # 実際のコンポーネント移動
+    with instrument.phase("writeback"):
+        writer.add_indices(job.mesh, indices, new_positions)
+
+    # Fit 後の状態を指紋として保存する
+    # Maya は頂点を float32 で持つので, 計算結果ではなく書き込んだ後に読み直した (次の Fit で読む) 座標で作る
+    def storeFingerprint(written):
+        with instrument.phase("fingerprint"):
+            setFingerprint(job.curve, makeFitFingerprint(job.cvs, indices, written(job.mesh, indices), job.keep_ratio_mode,
+                                                         job.projection, job.symmetry))
+
+    writer.after_flush(storeFingerprint)
+
+
+def _mirrorTargets(mesh, indices):
+    """
+    頂点列 indices の鏡映先の頂点インデックスと, 鏡映先に書き込む頂点のマスク
+    鏡映先が無い頂点と, 鏡映先が頂点列自身に含まれる頂点 (中心線をまたぐ頂点列など) は書き込まない
+    """
+    mirror = topology_cache.get_mirror(mesh, backend.get_backend(), mirror_axis, mirror_tolerance)
+    targets = mirror[indices]
+
+    return targets, (targets >= 0) & ~np.isin(targets, indices)
+
+
+def _mirrorFit(job, result, writer):
+    """
+    solve_fit の結果を鏡映頂点マップで反対側の頂点列に写して writer に積む
+    """
+    flipped, new_positions, _ = result
+    indices = job.indices[::-1] if flipped else job.indices
+    targets, mask = _mirrorTargets(job.mesh, indices)
+
+    mirrored = new_positions[mask]
+    mirrored[:, mirror_axis] *= -1.0
+
+    with instrument.phase("writeback"):
+        writer.add_indices(job.mesh, targets[mask], mirrored)
+
+
+def _meshSurface(mesh, cache=None):
+    """
+    面への投影用のメッシュの三角形インデックスと探す範囲
+    cache (辞書) を渡すと一回の一括処理の間使い回す. 最初に使った時点 (Fit の書き込み前) の形状で作る
+    """
+    if cache is not None and mesh in cache:
+        return cache[mesh]
+
+    mesh_backend = backend.get_backend()
+    points = mesh_backend.get_points(mesh)
+    triangles = mesh_backend.get_triangles(mesh)
+
+    data = {
+        "grid": spatial.TriangleGrid(points, triangles),
+        "max_distance": projection_radius * spatial.mean_edge_length(points, spatial.triangle_edges(triangles)),
+    }
+
+    if cache is not None:
+        cache[mesh] = data
+
+    return data
+
+
+def _projectFits(jobs, results, projection, cache=None):
+    """
+    solve_fit の結果の頂点を元の面上の最近点に向かって projection (0.0-1.0) の割合だけ動かす
+    メッシュ毎に全カーブ分の頂点をまとめて一回で問い合わせる
+    面から projection_radius より離れた頂点はカーブ上の位置のまま
+    戻り値は置き換えた結果のリスト
+    """
+    results = list(results)
+    rows_by_mesh = {}
+
+    for i, job in enumerate(jobs):
+        rows_by_mesh.setdefault(job.mesh, []).append(i)
+
+    for mesh, rows in rows_by_mesh.items():
+        surface = _meshSurface(mesh, cache)
+        positions = np.concatenate([results[i][1] for i in rows])
+        closest, _, _ = surface["grid"].closest_points(positions, surface["max_distance"])
+        projected = positions + (closest - positions) * projection
+        offsets = np.cumsum([0] + [len(results[i][1]) for i in rows])
+
+        for row, start, end in zip(rows, offsets[:-1], offsets[1:]):
+            flipped, _, table = results[row]
+            results[row] = (flipped, projected[start:end], table)
+
+    return results
+
+
+def isValid(curve):
+    """
+    このツールで利用できる有効なカーブかどうかの判定
+    """
+    return cmds.attributeQuery(attr_name, node=curve, exists=True)
+
+
+def isAvailable(curve):
+    """
+    processAll 時に fitToCurve を適用するなら Trueを返す
+    現状はビジビリティで判定
+    """
+    return cmds.getAttr("%(curve)s.visibility" % locals())
+
+
+def getRegistry(create=False):
+    """
+    カーブを登録する objectSet を返す. 無ければ create が True の時だけ作り, それ以外は None を返す
+    """
+    if cmds.objExists(registry_name):
+        return registry_name
+
+    if not create:
+        return None
+
+    return cmds.sets(name=registry_name, empty=True)
+
+
+def registerCurves(curves):
+    """
+    カーブをレジストリに登録する
+    """
+    if curves:
+        cmds.sets(curves, add=getRegistry(create=True))
+
+
+def findCurves():
+    """
+    dst_edges アトリビュートを持つノードをシーン全体から探す (名前に依存しない)
+    """
+    return cmds.ls("*." + attr_name, objectsOnly=True, recursive=True) or []
+
+
+def rebuildRegistry():
+    """
+    シーンを走査してレジストリを作り直す. レジストリの無い古いシーン用
+    戻り値は登録したカーブのリスト
+    """
+    curves = findCurves()
+    registry = getRegistry(create=True)
+
+    cmds.sets(clear=registry)
+    registerCurves(curves)
+
+    return curves
+
+
+def getAllCurves():
+    """
+    このツールで生成したカーブをすべて取得する
+    レジストリがあればそのメンバー, 無ければシーンを走査する
+    """
+    registry = getRegistry()
+
+    if registry is None:
+        return findCurves()
+
+    return cmds.sets(registry, q=True) or []
+
+
+def getCurveStates(curves=None):
+    """
+    curves のうちこのツールで利用できるカーブの [カーブ, 表示されているか, dst_edges の文字列] のリスト
+    visibility とアトリビュートはバックエンドで一括して読む
+    dst_edges が空 (エッジ列がまだ設定されていない) のカーブは含めない
+    curves が None ならシーン内のすべてのカーブ. 同じカーブが複数回あっても (CV を複数選択した場合など) 一度だけ返す
+    """
+    if curves is None:
+        curves = getAllCurves()
+
+    curves = list(dict.fromkeys(curves))
+
+    states = backend.get_backend().get_curve_states(curves, attr_name)
+
+    return [[curve, visible, edges_str] for curve, (visible, edges_str) in zip(curves, states) if edges_str]
+
+
+def getValidCurves(curves=None):
+    """
+    curves のうちこのツールで利用できるカーブだけを返す. None ならシーン内のすべてから探す
+    """
+    return [curve for curve, _, _ in getCurveStates(curves)]
+
+
+def _meshSearchData(mesh, cache=None):
+    """
+    エッジ列の再割り当て用のメッシュのデータ (頂点座標, 空間インデックス, 隣接インデックス, 平均エッジ長)
+    cache (辞書) を渡すと複数のカーブで使い回す
+    """
+    if cache is not None and mesh in cache:
+        return cache[mesh]
 
-# TODO: カーブを比率で分割しても曲率の違いで 全体曲線:部分曲線 と 全体折れ線:部分直線 の比率が一致しない問題どうにかする (元の比率をキャッシュする？)
-# TODO: ループ時の対応 (メッセージ出しつつ適当な所始点にしてしまいたい)
-# TODO: コンポーネントIDが変化したときに元の形状に近いエッジ列を推定する機能
+    mesh_backend = backend.get_backend()
+    index = topology_cache.get(mesh, mesh_backend)
+    points = mesh_backend.get_points(mesh)
 
-# TODO: U値スライダー
+    data = {
+        "index": index,
+        "points": points,
+        "grid": spatial.PointGrid(points),
+        "mean_edge_length": spatial.mean_edge_length(points, index.edge_vertices),
+    }
 
-DEBUG = False
+    if cache is not None:
+        cache[mesh] = data
 
-window_width = 300
-header_width = 50
-bw_single = 24
-bw_double = bw_single*2 + 2
-bw_3 = bw_single*3 + 2
+    return data
 
-# アトリビュートにエッジ列を文字列で保存する際の区切り文字
-component_separator = ','
 
-# このツールで生成されるカーブノードの名称につけるプリフィックス
-curve_prefix = "NNAEOC_Curve"
+def _edgeWeights(data, edge_vertices, samples):
+    """
+    エッジの長さにカーブからの距離 (両端の平均) に応じたペナルティを掛けた重み
+    """
+    points = data["points"]
+    mean_edge_length = data["mean_edge_length"]
+    lengths = np.linalg.norm(points[edge_vertices[:, 0]] - points[edge_vertices[:, 1]], axis=1)
 
-# エッジ列をカーブに保存する際のカスタムアトリビュート名
-attr_name = "dst_edges"
+    vertices, inverse = np.unique(edge_vertices, return_inverse=True)
+    vertex_distances = spatial.distances_to_points(points[vertices], samples)
+    ends_distance = vertex_distances[inverse.reshape(-1, 2)].mean(axis=1)
 
+    return lengths * (1.0 + reassign_penalty * ends_distance / mean_edge_length)
 
-def printd(description, message):
-    if DEBUG:
-        print(str(description) + ": " + str(message))
 
+def _corridorPath(data, start, end, samples, blocked_vertices=(), blocked_edges=()):
+    """
+    start から end まで, samples の近傍の頂点だけを通るカーブからの距離で重み付けした最短経路
+    近傍で繋がらなければ範囲を広げ, それでも繋がらなければメッシュ全体から探す
+    blocked_vertices, blocked_edges は通らない頂点とエッジ
+    戻り値は (頂点インデックス配列, エッジインデックス配列). 到達できなければ None
+    """
+    index = data["index"]
+    radius = reassign_corridor * data["mean_edge_length"]
+    blocked_vertices = np.asarray(blocked_vertices, dtype=int)
+    blocked_edges = np.asarray(blocked_edges, dtype=int)
+
+    for _ in range(4):
+        corridor = data["grid"].within(samples, radius)
+        allowed = np.zeros(len(data["points"]), dtype=bool)
+        allowed[corridor] = True
+        allowed[blocked_vertices] = False
+
+        # 範囲内の頂点同士のエッジだけ重みを計算する (範囲外のエッジは通らない)
+        edge_weights = np.full(index.edge_count, np.inf)
+        inner = np.flatnonzero(allowed[index.edge_vertices[:, 0]] & allowed[index.edge_vertices[:, 1]])
+        edge_weights[inner] = _edgeWeights(data, index.edge_vertices[inner], samples)
+        edge_weights[blocked_edges] = np.inf
+
+        path = index.shortest_path(start, end, edge_weights, allowed)
+
+        if path is not None:
+            return path
+
+        radius *= 2.0
+
+    allowed = np.ones(len(data["points"]), dtype=bool)
+    allowed[blocked_vertices] = False
+    edge_weights = _edgeWeights(data, index.edge_vertices, samples)
+    edge_weights[blocked_edges] = np.inf
 
-def addAttributes(curve, edges):
+    return index.shortest_path(start, end, edge_weights, allowed)
+
+
+def estimateChain(curve, mesh, cache=None):
     """
-    カーブオブジェクトにアトリビュート追加
+    カーブの形状に沿ったメッシュのエッジ列を推定する
+    カーブの端点に最も近い頂点を始点終点にして, カーブ近傍の頂点だけを通る
+    カーブからの距離で重み付けした最短経路を求める. 近傍で繋がらなければ範囲を広げる
+    周期カーブは継ぎ目と半周先の点の間を行きと帰りの二つの経路で結んだループにする
+    戻り値は並べ替え済みの binding.Binding
     """
+    data = _meshSearchData(mesh, cache)
+    index = data["index"]
+    mean_edge_length = data["mean_edge_length"]
 
-    edges_str = edges
-    curve_str = curve
-    attr_fullname = curve_str + "." + attr_name
+    with instrument.phase("sampling"):
+        curve_data = getCurveData(curve)
+        closed = cm.is_periodic(*curve_data)
+        table = arc_length_cache.get(*curve_data)
+        sample_count = int(np.clip(table.length / mean_edge_length * 2, 16, 4096))
+        samples = table.points_at(cm.even_ratios(sample_count))
 
-    if not cmds.attributeQuery(attr_name, node=curve_str, exists=True):
-        cmds.addAttr(curve_str, ln=attr_name, dt="string")
+    with instrument.phase("sorting"):
+        start = data["grid"].nearest(samples[0])[0]
+        end = data["grid"].nearest(samples[sample_count // 2 if closed else -1])[0]
 
-    cmds.setAttr(attr_fullname, edges_str, e=True, type="string")
-    cmds.setAttr(attr_fullname, e=True, channelBox=True)
+        if start == end:
+            raise ValueError("curve ends map to the same vertex: %s" % curve)
 
+        path = _corridorPath(data, start, end, samples)
 
-def changeAppearance(curve):
-    """カーブの見た目を変更する"""
-    line_width = 2
-    color = [1.0, 0.3, 0.0]
+        if path is not None and closed:
+            # 行きの経路の頂点とエッジを通らずに始点へ戻る
+            back = _corridorPath(data, end, start, samples, path[0][1:-1], path[1])
+
+            if back is None:
+                path = None
+            else:
+                path = (np.concatenate([path[0], back[0][1:-1]]), np.concatenate([path[1], back[1]]))
+
+        if path is None:
+            raise ValueError("no edge path between curve ends: %s" % curve)
+
+    vertices, edges = path
 
-    cmds.setAttr('%s.lineWidth' % curve, line_width)
-    cmds.setAttr('%s.overrideEnabled' % curve, 1)
-    cmds.setAttr('%s.overrideRGBColors' % curve, 1)
-    cmds.setAttr('%s.overrideColorR' % curve, color[0])
-    cmds.setAttr('%s.overrideColorG' % curve, color[1])
-    cmds.setAttr('%s.overrideColorB' % curve, color[2])
-    cmds.setAttr('%s.useOutlinerColor' % curve, True)
-    cmds.setAttr('%s.outlinerColor' % curve, color[0], color[1], color[2])
+    return binding.Binding(mesh, edges, vertices, index.checksum)
 
 
-def makeCurve(edges, n=4):
+def reassignEdges(curve, mesh=None, cache=None):
     """
-    引数のエッジ列からカーブを生成してアトリビュート付与する
-    連続しない複数エッジ列の場合はエラーを返す (エッジ列の分割は関数の外で行う)
+    カーブの形状からエッジ列を推定してカーブに再設定する
+    mesh 対象のメッシュ. None なら今のエッジ列と同じメッシュ
+    戻り値は新しいエッジのコンポーネント名のリスト
     """
-    # カーブ作成
-    cmds.select(edges, replace=True)
-    curve = cmds.polyToCurve(form=2, degree=3, conformToSmoothMeshPreview=1)[0]
+    if mesh is None:
+        mesh = getBinding(curve).mesh
 
-    # リビルドしてヒストリ消す
-    cmds.rebuildCurve(curve, ch=1, rpo=1, rt=0, end=1, kr=0, kcp=0, kep=1, kt=0, s=n, d=3, tol=0.01)
-    cmds.DeleteHistory(curve)
+    with topology_cache.batch():
+        edge_binding = estimateChain(curve, mesh, cache)
+        addAttributes(curve, edge_binding)
 
-    # 見た目の変更
-    changeAppearance(curve)
+    return edge_binding.edge_components()
 
-    # 選択エッジ集合と構成頂点
-    edge_set = edges
-    vtx_set = cmds.filterExpand(
-        cmds.polyListComponentConversion(edges, fe=True, tv=True), sm=31)
 
-    end_vts = nu.get_end_vtx_e(edge_set)
+def findBrokenCurves(curves=None):
+    """
+    エッジ列が今のメッシュと合わなくなったカーブのリスト
+    保存時のトポロジーチェックサムがあればそれと比較し, 無ければエッジ列が一本に繋がるかで判定する
+    """
+    mesh_backend = backend.get_backend()
+    broken = []
+
+    with topology_cache.batch():
+        for curve, _, edges_str in getCurveStates(curves):
+            try:
+                edge_binding = binding.decode(edges_str)
 
-    # 開いた状態の連続した一本のエッジ列以外は現状エラーで終了
-    if not len(end_vts) == 2:
-        raise(Exception)
+            except ValueError:
+                broken.append(curve)
+                continue
 
-    sorted_vts = nu.sortVtx(edge_set, vtx_set)
+            index = topology_cache.get(edge_binding.mesh, mesh_backend)
 
-    # カーブの始点終点と頂点リストお始点終点が逆なら頂点リストを反転する
-    if not nu.isStart(sorted_vts[0], curve):
-        sorted_vts.reverse()
+            if edge_binding.checksum is not None:
+                if edge_binding.checksum != index.checksum:
+                    broken.append(curve)
 
-    addAttributes(curve, edges)
+                continue
 
-    return [curve, edges]
+            try:
+                index.order_chain(edge_binding.edges)
+
+            except ValueError:
+                broken.append(curve)
 
+    return broken
 
-def alignEdgesOnCurve(edges, curve, keep_ratio_mode=True, n=4):
+
+def rebindCurves(curves=None):
     """
-    edges 編集するエッジ
-    curve 整形に使用するカーブ
-    keep_ratio_mode Trueなら元のエッジの長さの比率を維持する, False なら頂点をカーブ上に均等配置する
+    エッジ列が壊れたカーブをまとめてカーブの形状から再割り当てする
+    メッシュ毎の空間インデックスは一度だけ作る
+    戻り値は [再割り当てしたカーブのリスト, 失敗したカーブのリスト]
     """
+    rebound = []
+    failed = []
+    cache = {}
 
-    # 内部リビルド
-    # 直線時に開始位置がずれるバグ対策も兼ね
-    target_curve = cmds.duplicate(curve)
-    k = 8
-    cmds.rebuildCurve(target_curve, ch=1, rpo=1, rt=0, end=1, kr=0, kcp=0, kep=1, kt=0, s=n*k, d=3, tol=0.01)
-    cmds.DeleteHistory(target_curve)
+    with instrument.operation("rebind"), nncurve_undo.chunk("NN_Curve Rebind"), topology_cache.batch():
+        for curve in findBrokenCurves(curves):
+            with instrument.curve(curve):
+                try:
+                    reassignEdges(curve, cache=cache)
+                    rebound.append(curve)
 
-    # 選択エッジ集合と構成頂点
-    edge_set = edges
-    vtx_set = cmds.filterExpand(
-        cmds.polyListComponentConversion(edges, fe=True, tv=True), sm=31)
+                except ValueError:
+                    failed.append(curve)
 
-    end_vts = nu.get_end_vtx_e(edge_set)
+    return [rebound, failed]
 
-    # 閉じていない連続した一本のエッジ列以外は現状エラーで終了
-    if not len(end_vts) == 2:
-        raise(Exception)
 
-    sorted_vts = nu.sortVtx(edge_set, vtx_set)
+def _chunks(items, chunk_size=None):
+    """items を chunk_size 個ずつに分ける. None なら batch_chunk_size"""
+    chunk_size = max(1, int(chunk_size or batch_chunk_size))
 
-    # カーブの始点終点と頂点リストお始点終点が逆なら頂点リストを反転する
-    if not nu.isStart(sorted_vts[0], target_curve):
-        sorted_vts.reverse()
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
 
-    # 各頂点の移動先の座標を計算
-    new_positions = []
 
-    if keep_ratio_mode:
-        # 頂点列間の比率を維持してカーブに再配置
-        for i in range(len(sorted_vts)):
-            u = nu.vtxListPath(sorted_vts, i)/nu.vtxListPath(sorted_vts)
-            new_positions.append(cmds.pointOnCurve(target_curve, pr=u, p=True))
+def runWithProgress(title, steps, total, interval=None):
+    """
+    一括処理のジェネレーター (iterFitCurves など) を進捗ウィンドウを表示しながら最後まで進める
+    Esc で中断できる. 進捗の更新と中断の確認は interval 個 (None なら batch_chunk_size) 毎に行う
+    一括処理はチャンク単位で書き込むので, 中断しても処理済みのチャンクの結果はそのまま残る
+    戻り値は [yield された値のリスト, 中断したら True]
+    """
+    interval = max(1, int(interval or batch_chunk_size))
+    results = []
+    cancelled = False
 
-    else:  # even space mode
-        # 頂点列間の比率を無視してカーブに等間隔で配置
-        for i in range(len(sorted_vts)):
-            u = float(i)/(len(sorted_vts)-1)
-            new_positions.append(cmds.pointOnCurve(target_curve, pr=u, p=True))
+    cmds.progressWindow(title=title, progress=0, maxValue=max(total, 1), status="0 / %d" % total,
+                        isInterruptable=True)
 
-    # 実際のコンポーネント移動
-    for i in range(len(sorted_vts)):
-        cmds.xform(sorted_vts[i], ws=True, t=new_positions[i])
+    try:
+        for result in steps:
+            results.append(result)
 
-    cmds.delete(target_curve)
+            if len(results) % interval == 0 or len(results) == total:
+                if cmds.progressWindow(q=True, isCancelled=True):
+                    cancelled = True
+                    break
 
-    return [target_curve, edges]
+                cmds.progressWindow(e=True, progress=len(results), status="%d / %d" % (len(results), total))
 
-    # TODO: カーブ・エッジの同期モード欲しい
+    finally:
+        steps.close()
+        cmds.progressWindow(endProgress=True)
+
+    return [results, cancelled]
+
+
+def iterFitCurves(curves=None, keep_ratio_mode=True, force=False, chunk_size=None, workers=None, processes=False,
+                  projection=0.0, symmetry=False):
     """
-      両方向コンストレイント
-      頂点が変更されたらカーブを再生成
-      カーブが変更されたら keep ratio mode で頂点を更新する
-      カーブで形を変えて、頂点でエッジフローだけ直すのを平行してやる感じ
+    fitCurves のジェネレーター版
+    chunk_size 本ずつ gather, solve, apply してチャンク毎に書き込み, 書き込んだ後にカーブ毎の (カーブ名, 状態) を yield する
+    状態は "fitted", "skipped" (前回の Fit から変化無し), "mirrored" (反対側のカーブから写した), "hidden" (非表示のカーブ),
+    "broken" (エッジ列が解釈できないか一本に繋がらない. findBrokenCurves / rebindCurves で直す) のいずれか
+    途中で止めても (close しても) 書き込みは Fit 済みのチャンク単位で完結している
     """
+    surfaces = {}
 
+    # メッシュ名 -> 先に処理したカーブの鏡映先の頂点の集合
+    claimed = {}
 
-def isValid(curve):
+    with instrument.operation("fit"), nncurve_undo.chunk("NN_Curve Fit"), topology_cache.batch():
+        for chunk in _chunks(getCurveStates(curves), chunk_size):
+            writer = backend.PointWriter()
+            pending = []
+            jobs = []
+            statuses = []
+
+            # 先にチャンク内の全カーブの頂点列を求め, 頂点座標はメッシュ毎に一回で読む
+            for curve, visible, edges_str in chunk:
+                if not visible:
+                    statuses.append((curve, "hidden"))
+                    continue
+
+                with instrument.curve(curve):
+                    # 壊れたエッジ列のカーブがあっても残りのカーブの Fit は続ける
+                    try:
+                        with instrument.phase("conversion"):
+                            edges = binding.decode(edges_str)
+
+                        mesh, indices = getOrderedVertices(edges, curve)
+
+                    except ValueError:
+                        statuses.append((curve, "broken"))
+                        continue
+
+                    if symmetry:
+                        # 頂点列がすべて先に処理したカーブの鏡映先なら, そちらから写すので Fit しない
+                        if claimed.get(mesh, set()).issuperset(indices.tolist()):
+                            statuses.append((curve, "mirrored"))
+                            continue
+
+                        targets, mask = _mirrorTargets(mesh, indices)
+                        claimed.setdefault(mesh, set()).update(targets[mask].tolist())
+
+                pending.append((curve, edges, [mesh, indices]))
+                statuses.append((curve, None))
+
+            with instrument.phase("read"):
+                chain_points = readChainPoints([chain for _, _, chain in pending])
+                pending_curves = [curve for curve, _, _ in pending]
+                curves_data = backend.get_backend().get_curves_data(pending_curves) if pending_curves else []
+                stored_fits = getStoredFits(pending_curves)
+
+                # 以後はカーブと位置で対応させるので, バックエンドは入力のカーブ毎に一つずつ返す
+                assert len(curves_data) == len(stored_fits) == len(pending_curves)
+
+            gathered = {}
+
+            for (curve, edges, chain), points, curve_data, stored in zip(pending, chain_points, curves_data, stored_fits):
+                with instrument.curve(curve):
+                    gathered[curve] = _gatherFit(curve, edges, keep_ratio_mode, force, projection, symmetry, chain, points,
+                                                 curve_data, stored)
+
+                if gathered[curve] is not None:
+                    jobs.append(gathered[curve])
+
+            statuses = [(curve, status or ("skipped" if gathered[curve] is None else "fitted"))
+                        for curve, status in statuses]
+
+            with instrument.phase("solve"):
+                results = cm.solve_fits([job.solve_args() for job in jobs], workers, processes)
+
+            if projection > 0.0 and jobs:
+                with instrument.phase("projection"):
+                    results = _projectFits(jobs, results, projection, surfaces)
+
+            for job, result in zip(jobs, results):
+                with instrument.curve(job.curve):
+                    _applyFit(job, result, writer)
+
+                    if symmetry:
+                        _mirrorFit(job, result, writer)
+
+            with instrument.phase("writeback"):
+                writer.flush()
+
+            for status in statuses:
+                yield status
+
+
+def fitCurves(curves=None, keep_ratio_mode=True, force=False, workers=None, processes=False, chunk_size=None,
+              projection=0.0, symmetry=False):
     """
-    このツールで利用できる有効なカーブかどうかの判定
+    カーブに拘束されたエッジ列をまとめてカーブに合わせる (UI 無しで使える Fit All)
+    curves 対象のカーブ. None ならシーン内のこのツールのカーブすべて
+    force False なら前回の Fit から変化の無いカーブはスキップする
+    workers, processes 計算フェーズの並列数とプロセスプールを使うかどうか (curvemath.solve_fits)
+    chunk_size 一度に計算して書き込むカーブの本数. None なら batch_chunk_size
+    projection 0 より大きければ Fit 後の頂点を Fit 前の面上の最近点に向けてこの割合 (1.0 で面上) だけ戻す
+    symmetry True なら Fit 結果を mirror_axis で鏡映した反対側の頂点にも書き込み,
+        頂点列がすべて先のカーブの鏡映先になっているカーブは Fit せずスキップ扱いにする
+    非表示のカーブとエッジ列が壊れたカーブは処理しない
+    戻り値は [Fit したカーブ数, スキップしたカーブ数]
+
+    全カーブのデータを読み込む gather, 配列だけで並列に解く solve, まとめて書き込む apply の三段階をチャンク毎に処理する
     """
-    return cmds.attributeQuery(attr_name, node=curve, exists=True)
+    steps = iterFitCurves(curves, keep_ratio_mode, force, chunk_size, workers, processes, projection, symmetry)
+    statuses = [status for _, status in steps]
 
+    return [statuses.count("fitted"), statuses.count("skipped") + statuses.count("mirrored")]
 
-def isAvailable(curve):
+
+def rebuildWithSetting(curve, n):
     """
-    processAll 時に fitToCurve を適用するなら Trueを返す
-    現状はビジビリティで判定
+    カーブを n スパンの 3 次カーブにリビルドする. n が 0 以下なら 1 次の折れ線にする
     """
-    return cmds.getAttr("%(curve)s.visibility" % locals())
+    if n <= 0:
+        cmds.rebuildCurve(curve, ch=1, rpo=1, rt=0, end=1, kr=2, kcp=0, kep=1, kt=0, s=1, d=1, tol=0.01)
+    else:
+        cmds.rebuildCurve(curve, ch=1, rpo=1, rt=0, end=1, kr=0, kcp=0, kep=1, kt=0, s=n, d=3, tol=0.01)
 
 
-def getAllCurves():
+def smoothWithSetting(curve):
     """
-    このツールで生成したカーブをすべて取得する
+    カーブの全 CV をスムースする
+    """
+    target_str = curve + ".cv[*]"
+    cmds.smoothCurve(target_str, ch=1, rpo=1, s=1)
+
+
+def iterRebuildCurves(curves=None, n=4, native=True, chunk_size=None):
+    """
+    rebuildCurves のジェネレーター版
+    chunk_size 本ずつリビルドし, チャンク毎に処理したカーブ名を yield する
+    """
+    with instrument.operation("rebuild"), nncurve_undo.chunk("NN_Curve Rebuild"):
+        for chunk in _chunks(getValidCurves(curves), chunk_size):
+            if native:
+                _rebuildCurvesNative(chunk, n)
+
+            else:
+                for curve in chunk:
+                    with instrument.curve(curve), instrument.phase("rebuild"):
+                        rebuildWithSetting(curve, n)
+
+            for curve in chunk:
+                yield curve
+
+
+def rebuildCurves(curves=None, n=4, native=True, chunk_size=None):
+    """
+    カーブをまとめてリビルドする (UI 無しで使える Rebuild All)
+    curves 対象のカーブ. None ならシーン内のこのツールのカーブすべて
+    native が True なら全カーブを NumPy で一括して作り直しヒストリを作らない
+    戻り値は処理したカーブのリスト
+    """
+    return list(iterRebuildCurves(curves, n, native, chunk_size))
+
+
+def _rebuildCurvesNative(curves, n):
+    """
+    各カーブを弧長で等間隔にサンプリングし, n スパンの 3 次カーブで最小二乗近似して置き換える
+    n が 0 以下なら両端を結ぶ 1 次の線分にする
+    周期カーブは周期カーブのまま作り直す (最低 3 スパン, n が 0 以下なら 1 次の多角形)
+    サンプリング位置が開いたカーブ, 周期カーブそれぞれで共通なので正規方程式は一度ずつ解けばよい
+    """
+    if not curves:
+        return
+
+    spans = max(1, n)
+    degree = 3 if n > 0 else 1
+    count = max(64, spans * 16)
+
+    with instrument.phase("read"):
+        curve_data = backend.get_backend().get_curves_data(curves)
+        tables = [arc_length_cache.get(*data) for data in curve_data]
+        periodic = [cm.is_periodic(*data) for data in curve_data]
+
+    for closed in (False, True):
+        group = [i for i in range(len(curves)) if periodic[i] == closed]
+
+        if not group:
+            continue
+
+        ratios = cm.even_ratios(count, closed=closed)
+
+        with instrument.phase("sampling"):
+            samples = np.concatenate([tables[i].points_at(ratios) for i in group], axis=1)
+
+        with instrument.phase("rebuild"):
+            if closed:
+                cvs, knots = cm.fit_periodic_bspline(samples, max(spans, 3), degree, params=ratios)
+            else:
+                cvs, knots = cm.fit_bspline(samples, spans, degree, params=ratios)
+
+        with instrument.phase("writeback"):
+            for column, i in enumerate(group):
+                cmds.curve(curves[i], replace=True, worldSpace=True, p=cvs[:, column*3:column*3+3].tolist(),
+                           k=knots.tolist(), d=degree, per=closed)
+
+
+def iterSmoothCurves(curves=None, native=True, iterations=1, taubin=False, chunk_size=None):
+    """
+    smoothCurves のジェネレーター版
+    chunk_size 本ずつスムースして書き込み, チャンク毎に処理したカーブ名を yield する
+    """
+    with instrument.operation("smooth"), nncurve_undo.chunk("NN_Curve Smooth"):
+        for chunk in _chunks(getValidCurves(curves), chunk_size):
+            if native:
+                _smoothCurvesNative(chunk, iterations, taubin)
+
+            else:
+                for curve in chunk:
+                    with instrument.curve(curve), instrument.phase("smooth"):
+                        smoothWithSetting(curve)
+
+            for curve in chunk:
+                yield curve
+
+
+def smoothCurves(curves=None, native=True, iterations=1, taubin=False, chunk_size=None):
+    """
+    カーブをまとめてスムースする (UI 無しで使える Smooth All)
+    curves 対象のカーブ. None ならシーン内のこのツールのカーブすべて
+    native が True なら全カーブの CV を一括でスムースし, チャンク毎に一回のアンドゥ可能な書き込みで戻す
+    iterations, taubin は native の時のスムースの回数と Taubin スムースにするかどうか
+    戻り値は処理したカーブのリスト
+    """
+    return list(iterSmoothCurves(curves, native, iterations, taubin, chunk_size))
+
+
+def _smoothCurvesNative(curves, iterations=1, taubin=False):
+    """
+    全カーブの CV を連結してラプラシアン (taubin なら Taubin) スムースをかける
+    周期カーブは重複した CV を除いて一周つなげてスムースし, 書き戻す時に重複させ直す
     """
-    return cmds.ls(curve_prefix + "*")
+    if not curves:
+        return
+
+    mesh_backend = backend.get_backend()
+
+    with instrument.phase("read"):
+        curve_data = mesh_backend.get_curves_data(curves)
+        before = [data[0] for data in curve_data]
+        overlaps = [data[2] if cm.is_periodic(*data) else 0 for data in curve_data]
+
+    with instrument.phase("smooth"):
+        unique = [cvs[:len(cvs) - overlap] for cvs, overlap in zip(before, overlaps)]
+        offsets = np.cumsum([0] + [len(cvs) for cvs in unique])
+        shrink = smooth_shrink if taubin else None
+        after = cm.smooth_polylines(np.concatenate(unique), offsets, iterations, smooth_factor, shrink,
+                                    closed=[overlap > 0 for overlap in overlaps])
+
+    with instrument.phase("writeback"):
+        record = backend.CurvesRecord(mesh_backend)
+
+        for i, curve in enumerate(curves):
+            cvs = after[offsets[i]:offsets[i + 1]]
+            record.add(curve, before[i], np.concatenate([cvs, cvs[:overlaps[i]]]))
+
+        mesh_backend.commit(record)
 
 
 class NN_ToolWindow(object):
@@ -252,11 +1396,12 @@ class NN_ToolWindow(object):
 
         self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
         self.bt_ = cmds.button(l='Remake', c=self.onReMakeCurve, width=bw_3)
-        self.bt_ = cmds.button(l='Reassign', c=self.onReAssignEdges, width=bw_3)
+        self.bt_ = cmds.button(l='Reassign [all]', c=self.onReAssignEdges, dgc=self.onReAssignBroken, width=bw_3)
         cmds.setParent("..")
 
         self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
         self.cb_keep_ratio_mode = cmds.checkBox(l='keep ratio', v=True, cc=self.onSetKeepRatio)
+        self.bt_ = cmds.button(l='Recapture', c=self.onCaptureRatios)
         self.bt_ = cmds.button(l='/2', c=self.onRebuildResolutionDiv2)
         self.tx_rebuild_resolution = cmds.textField(tx='', width=32)
         self.bt_ = cmds.button(l='x2', c=self.onRebuildResolutionMul2)
@@ -266,8 +1411,27 @@ class NN_ToolWindow(object):
 
         self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
         self.label1 = cmds.text(label='Fit', width=header_width)
-        self.bt_ = cmds.button(l='Fit All', c=self.onFitAll, width=bw_3)
+        self.bt_ = cmds.button(l='Fit All [force]', c=self.onFitAll, dgc=self.onFitAllForce, width=bw_3)
         self.bt_ = cmds.button(l='Selected', c=self.onFitSelection, width=bw_double)
+        self.cb_sync = cmds.checkBox(l='Sync', v=False, cc=self.onSetSync)
+        cmds.setParent("..")
+
+        self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
+        self.label1 = cmds.text(label='', width=header_width)
+        self.label1 = cmds.text(label='snap to surface')
+        self.fl_projection = cmds.floatField(v=0.0, minValue=0.0, maxValue=1.0, precision=2, width=48)
+        self.cb_symmetry = cmds.checkBox(l='Symmetry', v=False)
+        cmds.setParent("..")
+
+        self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
+        self.label1 = cmds.text(label='Bake', width=header_width)
+        self.bt_ = cmds.button(l='Bake Keys [npz]', c=self.onBakeKeys, dgc=self.onBakeCache, width=bw_3)
+        cmds.setParent("..")
+
+        self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
+        self.label1 = cmds.text(label='Setup', width=header_width)
+        self.bt_ = cmds.button(l='Export', c=self.onExportSetup, width=bw_double)
+        self.bt_ = cmds.button(l='Import', c=self.onImportSetup, width=bw_double)
         cmds.setParent("..")
 
         cmds.separator(width=window_width)
@@ -303,9 +1467,37 @@ class NN_ToolWindow(object):
         self.bt_ = cmds.button(l='Draw On Top [off]', c=self.onEnableDrawOnTop, dgc=self.onDisableDrawOnTop)
         cmds.setParent("..")
 
+        cmds.separator(width=window_width)
+
+        self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
+        self.label1 = cmds.text(label='Scene', width=header_width)
+        self.bt_ = cmds.button(l='Rebuild Registry', c=self.onRebuildRegistry)
+        cmds.setParent("..")
+
+        cmds.separator(width=window_width)
+
+        self.rowLayout1 = cmds.rowLayout(numberOfColumns=10)
+        self.label1 = cmds.text(label='Profile', width=header_width)
+        self.cb_profile = cmds.checkBox(l='on', v=instrument.enabled, cc=self.onSetProfile)
+        self.bt_ = cmds.button(l='Report [json]', c=self.onShowProfile, dgc=self.onSaveProfile)
+        self.bt_ = cmds.button(l='Clear', c=self.onClearProfile)
+        cmds.setParent("..")
+
     def onSetKeepRatio(self, *args):
         pass
 
+    def onCaptureRatios(self, *args):
+        """
+        選択カーブ (無ければアクティブカーブ) の頂点列の長さの比率を今の状態で取り直す
+        """
+        curves = getValidCurves([nu.get_object(x) for x in cmds.ls(selection=True)])
+
+        if not curves:
+            curves = getValidCurves([cmds.textField(self.ed_curve, q=True, tx=True)])
+
+        captured = captureCurveRatios(curves)
+        nd.message("recaptured: %d" % len(captured))
+
     def onMakeCurve(self, *args):
         """
         カーブ生成とアトリビュート設定
@@ -317,25 +1509,22 @@ class NN_ToolWindow(object):
 
         polyline_list = nu.get_all_polylines(selections)
 
-        for edges in polyline_list:
-            # 選択エッジ列からカーブ生成
-            ret = makeCurve(edges, n=resolution)
-            curve = ret[0]
-            edges = ret[1]
+        with instrument.operation("make"), topology_cache.batch():
+            for edges in polyline_list:
+                # 選択エッジ列からカーブ生成
+                with instrument.curve(component_separator.join(edges[:1])):
+                    ret = makeCurve(edges, n=resolution)
+                curve = ret[0]
+                edges = ret[1]
 
-            # リネーム
-            curve = cmds.rename(curve, curve_prefix, ignoreShape=True)
+                # リネーム
+                # アトリビュートと比率は makeCurve で設定済みで, レジストリの objectSet もリネームに追従するので設定し直さない
+                curve = cmds.rename(curve, curve_prefix, ignoreShape=True)
 
-            # 生成されたカーブと選択エッジをエディットボックスに設定
-            edges_str = component_separator.join(edges)
-            cmds.textField(self.ed_edges, e=True, tx=edges_str)
-            curve_str = curve
-            cmds.textField(self.ed_curve, e=True, tx=curve_str)
-
-            # カーブオブジェクトにアトリビュート追加
-            edges_str = cmds.textField(self.ed_edges, q=True, tx=True)
-            curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
-            addAttributes(curve_str, edges_str)
+                # 生成されたカーブと選択エッジをエディットボックスに設定
+                edges_str = component_separator.join(edges)
+                cmds.textField(self.ed_edges, e=True, tx=edges_str)
+                cmds.textField(self.ed_curve, e=True, tx=curve)
 
     def onSetActive(self, *args):
         """
@@ -353,10 +1542,11 @@ class NN_ToolWindow(object):
         if len(selections) == 0:
             return
 
-        if curve_prefix in selections[0]:
-            curve_str = selections[0]
-            attr_fullname = curve_str + "." + attr_name
-            edges_str = cmds.getAttr(attr_fullname)
+        # 名前ではなくアトリビュートでこのツールのカーブか判定する (リネームされたカーブも対象にする)
+        states = getCurveStates(selections[:1])
+
+        if states:
+            curve_str, _, edges_str = states[0]
             cmds.textField(self.ed_curve, e=True, tx=curve_str)
             cmds.textField(self.ed_edges, e=True, tx=edges_str)
 
@@ -375,11 +1565,12 @@ class NN_ToolWindow(object):
             addAttributes(curve_str, edges_str)
 
     def onSelectEdges(self, *args):
+        """
+        エッジのフィールドのエッジを選択する
+        dst_edges 形式 (旧形式も可) を binding.decode で読んで edge_components() を選択する
+        """
         edges_str = cmds.textField(self.ed_edges, q=True, tx=True)
-        edges = edges_str.split(component_separator)
-
-        curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
-        curve = curve_str
+        edges = binding.decode(edges_str).edge_components()
 
         cmds.select(edges)
 
@@ -397,89 +1588,164 @@ class NN_ToolWindow(object):
             addAttributes(curve_str, edges_str)
 
     def onSelectCurve(self, *args):
-        edges_str = cmds.textField(self.ed_edges, q=True, tx=True)
-        edges = edges_str.split(component_separator)
-
+        """
+        カーブのフィールドのカーブを選択する
+        """
         curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
-        curve = curve_str
 
-        cmds.select(curve)
+        cmds.select(curve_str)
 
     def onFitActive(self, *args):
         edges_str = cmds.textField(self.ed_edges, q=True, tx=True)
-        edges = edges_str.split(component_separator)
+        edges = getEdgeComponents(edges_str)
         curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
-        curve = curve_str
         keep_ratio_mode = cmds.checkBox(
             self.cb_keep_ratio_mode, q=True, v=True)
 
-        n = int(cmds.textField(self.tx_rebuild_resolution, q=True, tx=True))
         alignEdgesOnCurve(edges, curve_str, keep_ratio_mode)
 
     def onFitSelection(self, *args):
         """ 選択カーブのみ fit to curve """
         select_objects = [nu.get_object(x) for x in cmds.ls(selection=True)]
-        curves = [x for x in select_objects if isValid(x)]
+        curves = getValidCurves(select_objects)
+        keep_ratio_mode = cmds.checkBox(self.cb_keep_ratio_mode, q=True, v=True)
+        projection = cmds.floatField(self.fl_projection, q=True, v=True)
+        symmetry = cmds.checkBox(self.cb_symmetry, q=True, v=True)
 
-        for curve in curves:
-            curve_str = curve
-            if isValid(curve_str) and isAvailable(curve_str):
-                attr_fullname = curve_str + "." + attr_name
-                edges_str = cmds.getAttr(attr_fullname)
-                edges = edges_str.split(component_separator)
-                keep_ratio_mode = cmds.checkBox(self.cb_keep_ratio_mode, q=True, v=True)
-                alignEdgesOnCurve(edges, curve_str, keep_ratio_mode)
+        fitCurves(curves, keep_ratio_mode, force=True, projection=projection, symmetry=symmetry)
 
         cmds.select(select_objects)
 
     def onFitAll(self, *args):
-        """ 全カーブfit to curve """
+        """ 全カーブfit to curve (前回の Fit から変化の無いカーブはスキップ) """
+        self.fitAll(force=False)
 
-        all_curves = getAllCurves()
-        for curve in all_curves:
-            curve_str = curve
-            if isValid(curve_str) and isAvailable(curve_str):
-                attr_fullname = curve_str + "." + attr_name
-                edges_str = cmds.getAttr(attr_fullname)
-                edges = edges_str.split(component_separator)
-                keep_ratio_mode = cmds.checkBox(self.cb_keep_ratio_mode, q=True, v=True)
-                alignEdgesOnCurve(edges, curve_str, keep_ratio_mode)
+    def onFitAllForce(self, *args):
+        """ 全カーブfit to curve (変化の無いカーブも処理する) """
+        self.fitAll(force=True)
+
+    def fitAll(self, force):
+        keep_ratio_mode = cmds.checkBox(self.cb_keep_ratio_mode, q=True, v=True)
+        projection = cmds.floatField(self.fl_projection, q=True, v=True)
+        symmetry = cmds.checkBox(self.cb_symmetry, q=True, v=True)
+        curves = getValidCurves()
+        steps = iterFitCurves(curves, keep_ratio_mode, force, projection=projection, symmetry=symmetry)
+        results, cancelled = runWithProgress("NN_Curve Fit", steps, len(curves))
+        statuses = [status for _, status in results]
+
+        nd.message("fit: %d, skipped: %d, mirrored: %d, broken: %d%s" % (
+            statuses.count("fitted"), statuses.count("skipped"), statuses.count("mirrored"), statuses.count("broken"),
+            " (cancelled)" if cancelled else ""))
+
+    def onSetSync(self, *args):
+        """
+        カーブとエッジ列の同期モードの開始/終了
+        選択にカーブがあればそのカーブだけ, 無ければすべてのカーブを同期する
+        """
+        from . import sync
+
+        if not cmds.checkBox(self.cb_sync, q=True, v=True):
+            sync.stop()
+            return
+
+        keep_ratio_mode = cmds.checkBox(self.cb_keep_ratio_mode, q=True, v=True)
+        curves = getValidCurves([nu.get_object(x) for x in cmds.ls(selection=True)]) or None
+        session = sync.start(curves, keep_ratio_mode)
+
+        nd.message("sync: %d curves" % len(session.bindings))
+
+    def bakeRange(self):
+        """
+        選択にカーブがあればそのカーブだけ, 無ければすべてのカーブを再生範囲でベイクする
+        """
+        from . import bake
+
+        keep_ratio_mode = cmds.checkBox(self.cb_keep_ratio_mode, q=True, v=True)
+        curves = getValidCurves([nu.get_object(x) for x in cmds.ls(selection=True)]) or None
+        start = cmds.playbackOptions(q=True, minTime=True)
+        end = cmds.playbackOptions(q=True, maxTime=True)
+
+        return bake.bakeCurves(curves, start, end, keep_ratio_mode=keep_ratio_mode)
+
+    def onBakeKeys(self, *args):
+        """
+        再生範囲の Fit 結果を頂点のキーフレームにする
+        """
+        from . import bake
+
+        result = self.bakeRange()
+        bake.keyBake(result)
+
+        nd.message("bake: %d frames, %d meshes" % (len(result.frames), len(result.meshes)))
+
+    def onBakeCache(self, *args):
+        """
+        再生範囲の Fit 結果を .npz のポイントキャッシュに保存する
+        """
+        from . import bake
+
+        paths = cmds.fileDialog2(fileFilter='NumPy (*.npz)', dialogStyle=2, fileMode=0)
+
+        if paths:
+            bake.saveCache(self.bakeRange(), paths[0])
+            nd.message("saved: %s" % paths[0])
+
+    def onExportSetup(self, *args):
+        """
+        選択にカーブがあればそのカーブだけ, 無ければすべてのカーブを .npz に書き出す
+        """
+        from . import exchange
+
+        paths = cmds.fileDialog2(fileFilter='NumPy (*.npz)', dialogStyle=2, fileMode=0)
+
+        if paths:
+            curves = getValidCurves([nu.get_object(x) for x in cmds.ls(selection=True)]) or None
+            count = exchange.exportCurves(paths[0], curves)
+            nd.message("exported: %d curves" % count)
+
+    def onImportSetup(self, *args):
+        """
+        書き出したカーブを読み込む. トポロジーが変わったメッシュのエッジ列はカーブの形状から再割り当てする
+        """
+        from . import exchange
+
+        paths = cmds.fileDialog2(fileFilter='NumPy (*.npz)', dialogStyle=2, fileMode=1)
+
+        if paths:
+            curves, broken = exchange.importCurves(paths[0])
+            nd.message("imported: %d, broken: %d" % (len(curves), len(broken)))
 
     def onReMakeCurve(self, *args):
         """
         アクティブエッジでアクティブカーブを作り直す
         """
         edges_str = cmds.textField(self.ed_edges, q=True, tx=True)
-        edges = edges_str.split(component_separator)
-
         curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
-        curve = curve_str
-
-        # 既存カーブの削除
-        cmds.delete(curve)
-
-        cmds.select(edges)
-        new_curve = cmds.polyToCurve(
-            form=2, degree=3, conformToSmoothMeshPreview=1)[0]
-        cmds.rebuildCurve(new_curve, ch=1, rpo=1, rt=0, end=1,
-                          kr=0, kcp=0, kep=1, kt=0, s=5, d=3, tol=0.01)
-        # カーブのヒストリ消す
-        cmds.DeleteHistory(new_curve)
+        resolution = int(cmds.textField(self.tx_rebuild_resolution, q=True, tx=True))
 
-        # リネーム
-        cmds.rename(new_curve, curve)
+        # makeCurve と同じく頂点列から直接最小二乗近似して作り直す
+        with instrument.operation("make"), instrument.curve(curve_str):
+            curve, _ = remakeCurve(curve_str, edges_str, n=resolution)
 
         cmds.textField(self.ed_curve, e=True, tx=curve)
 
-        # カーブオブジェクトにアトリビュート追加
-        addAttributes(curve_str, edges_str)
-
     def onReAssignEdges(self, *args):
         """
         カーブの形状からエッジ列を再設定
         """
-        nd.message("not implemented")
-        pass
+        curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
+
+        with nncurve_undo.chunk("NN_Curve Reassign"):
+            edges = reassignEdges(curve_str)
+
+        cmds.textField(self.ed_edges, e=True, tx=component_separator.join(edges))
+
+    def onReAssignBroken(self, *args):
+        """
+        トポロジーが変わってエッジ列が合わなくなったカーブをすべて再設定
+        """
+        rebound, failed = rebindCurves()
+        nd.message("rebound: %d, failed: %d" % (len(rebound), len(failed)))
 
     def onRebuildResolutionDiv2(self, *args):
         n = int(cmds.textField(self.tx_rebuild_resolution, q=True, tx=True))
@@ -493,10 +1759,7 @@ class NN_ToolWindow(object):
             cmds.textField(self.tx_rebuild_resolution, e=True, tx=1)
 
     def rebuild_with_setting(self, curve_str, n):
-        if n <= 0:
-            cmds.rebuildCurve(curve_str, ch=1, rpo=1, rt=0, end=1, kr=2, kcp=0, kep=1, kt=0, s=1, d=1, tol=0.01)
-        else:
-            cmds.rebuildCurve(curve_str, ch=1, rpo=1, rt=0, end=1, kr=0, kcp=0, kep=1, kt=0, s=n, d=3, tol=0.01)
+        rebuildWithSetting(curve_str, n)
 
     def onRebuildActive(self, *args):
         curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
@@ -507,22 +1770,19 @@ class NN_ToolWindow(object):
         cmds.selectType(cv=True)
 
     def onRebuildSelection(self, *args):
-        curves = [x for x in cmds.ls(selection=True) if isValid(x)]
+        curves = getValidCurves(cmds.ls(selection=True))
         n = int(cmds.textField(self.tx_rebuild_resolution, q=True, tx=True))
 
-        for curve_str in curves:
-            self.rebuild_with_setting(curve_str, n)
+        rebuildCurves(curves, n)
 
         cmds.select(curves)
         cmds.selectMode(component=True)
         cmds.selectType(cv=True)
 
     def onRebuildAll(self, *args):
-        curves = getAllCurves()
         n = int(cmds.textField(self.tx_rebuild_resolution, q=True, tx=True))
-
-        for curve_str in curves:
-            self.rebuild_with_setting(curve_str, n)
+        curves = getValidCurves()
+        curves, _ = runWithProgress("NN_Curve Rebuild", iterRebuildCurves(curves, n), len(curves))
 
         cmds.select(curves)
         cmds.selectMode(component=True)
@@ -532,26 +1792,22 @@ class NN_ToolWindow(object):
         cmds.RebuildCurveOptions()
 
     def smooth_with_setting(self, curve_str):
-        target_str = curve_str + ".cv[*]"
-        cmds.smoothCurve(target_str, ch=1, rpo=1, s=1)
+        smoothWithSetting(curve_str)
 
     def onSmoothActive(self, *args):
         curve_str = cmds.textField(self.ed_curve, q=True, tx=True)
         self.smooth_with_setting(curve_str)
 
     def onSmoothSelection(self, *args):
-        curves = [x for x in cmds.ls(selection=True) if isValid(x)]
+        curves = getValidCurves(cmds.ls(selection=True))
 
-        for curve_str in curves:
-            self.smooth_with_setting(curve_str)
+        smoothCurves(curves)
 
         cmds.select(curves)
 
     def onSmoothAll(self, *args):
-        curves = getAllCurves()
-
-        for curve_str in curves:
-            self.smooth_with_setting(curve_str)
+        curves = getValidCurves()
+        runWithProgress("NN_Curve Smooth", iterSmoothCurves(curves), len(curves))
 
     def onSmoothOp(self, *args):
         cmds.SmoothCurveOptions()
@@ -574,16 +1830,14 @@ class NN_ToolWindow(object):
         """
         表示されているカーブのみ選択する
         """
-        all_curves = getAllCurves()
-        visible_curves = [c for c in all_curves if cmds.getAttr(c+".visibility")]
+        visible_curves = [curve for curve, visible, _ in getCurveStates() if visible]
         cmds.select(visible_curves)
 
     def onSelectInvisible(self, *args):
         """
         非表示のカーブのみ選択する
         """
-        all_curves = getAllCurves()
-        invisible_curves = [c for c in all_curves if not cmds.getAttr(c+".visibility")]
+        invisible_curves = [curve for curve, visible, _ in getCurveStates() if not visible]
         cmds.select(invisible_curves)
 
     def onEnableDrawOnTop(self, *args):
@@ -602,6 +1856,52 @@ class NN_ToolWindow(object):
                 shape = cmds.listRelatives(obj, shapes=True)[0]
                 cmds.setAttr(shape + ".alwaysDrawOnTop", 0)
 
+    def onRebuildRegistry(self, *args):
+        """
+        シーンを走査してカーブのレジストリを作り直す
+        """
+        curves = rebuildRegistry()
+        nd.message("registered: %d" % len(curves))
+
+    def onSetProfile(self, *args):
+        """
+        計測の開始/停止
+        """
+        if cmds.checkBox(self.cb_profile, q=True, v=True):
+            instrument.enable()
+        else:
+            instrument.disable()
+
+    def onShowProfile(self, *args):
+        """
+        計測結果を表にしてスクリプトエディタとウィンドウに表示する
+        """
+        table = instrument.format_table()
+        print(table)
+
+        window = 'NN_Curve_Profile'
+
+        if cmds.window(window, exists=True):
+            cmds.deleteUI(window, window=True)
+
+        cmds.window(window, t='NN_Curve Profile', widthHeight=(720, 400))
+        cmds.paneLayout()
+        cmds.scrollField(text=table, editable=False, wordWrap=False, font='fixedWidthFont')
+        cmds.showWindow(window)
+
+    def onSaveProfile(self, *args):
+        """
+        計測結果を JSON で保存する
+        """
+        paths = cmds.fileDialog2(fileFilter='JSON (*.json)', dialogStyle=2, fileMode=0)
+
+        if paths:
+            instrument.dump_json(paths[0])
+            nd.message("saved: %s" % paths[0])
+
+    def onClearProfile(self, *args):
+        instrument.reset()
+
 
 def showNNToolWindow():
     NN_ToolWindow().create()
@@ -0,0 +1,666 @@
+#! python
+# coding:utf-8
+"""
+NURBS カーブの評価と弧長パラメーター化
+Maya に依存しない Python/NumPy だけの実装なので Maya 外でも動作確認できる
+
+ノット列はすべて Maya 形式 (標準形式より両端のノットが 1 つずつ少ない) で受け取る
+有理カーブのウェイトは扱わない
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+
+def full_knots(knots):
+    """
+    Maya 形式のノット列を標準形式 (CV 数 + 次数 + 1 個) に変換する
+    両端に追加するノットは有効区間の評価に影響しないので端の値を複製する
+    """
+    knots = np.asarray(knots, dtype=float)
+    return np.concatenate([knots[:1], knots, knots[-1:]])
+
+
+def domain(knots, degree):
+    """カーブの有効パラメーター範囲 (min, max) を返す"""
+    t = full_knots(knots)
+    return t[degree], t[len(t) - degree - 1]
+
+
+def evaluate(cvs, knots, degree, params):
+    """
+    params の各パラメーターにおけるカーブ上の座標を返す
+    de Boor のアルゴリズムを全パラメーター一括で計算する
+
+    cvs (CV 数, 次元) の配列
+    knots Maya 形式のノット列
+    degree 次数
+    params (m,) のパラメーター配列. 有効範囲外の値は端にクランプする
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    t = full_knots(knots)
+    p = degree
+    n_cvs = len(t) - p - 1
+    lo, hi = t[p], t[n_cvs]
+    u = np.clip(np.atleast_1d(np.asarray(params, dtype=float)), lo, hi)
+
+    # u が属するノット区間 t[k] <= u < t[k+1] (終端は最後の有効区間に含める)
+    k = np.searchsorted(t, u, side="right") - 1
+    k = np.clip(k, p, n_cvs - 1)
+
+    d = cvs[k[:, None] + np.arange(-p, 1)[None, :]].copy()
+
+    for r in range(1, p + 1):
+        for j in range(p, r - 1, -1):
+            t_left = t[j + k - p]
+            t_right = t[j + 1 + k - r]
+            denom = t_right - t_left
+            safe = np.where(denom == 0.0, 1.0, denom)
+            alpha = np.where(denom == 0.0, 0.0, (u - t_left) / safe)
+            d[:, j] = (1.0 - alpha)[:, None] * d[:, j - 1] + alpha[:, None] * d[:, j]
+
+    return d[:, p]
+
+
+def evaluate_frames(cvs_frames, knots, degree, params):
+    """
+    CV だけがフレーム毎に異なるカーブを全フレーム一括で評価する
+
+    cvs_frames (フレーム数, CV 数, 次元) の配列. ノット列と次数は全フレーム共通
+    params 全フレーム共通の (m,) かフレーム毎の (フレーム数, m) のパラメーター配列
+    戻り値は (フレーム数, m, 次元) の配列
+    """
+    cvs_frames = np.asarray(cvs_frames, dtype=float)
+    params = np.asarray(params, dtype=float)
+    frame_count = len(cvs_frames)
+
+    k, values = basis_functions(knots, degree, params.ravel())
+
+    # パラメーターが共通なら基底関数の行列と全フレームの CV の行列積で済む
+    if params.ndim == 1:
+        basis = np.zeros((len(params), cvs_frames.shape[1]))
+        np.add.at(basis, (np.arange(len(params))[:, None], k[:, None] + np.arange(-degree, 1)[None, :]), values)
+
+        return np.matmul(basis, cvs_frames)
+
+    k = k.reshape(params.shape)
+    values = values.reshape(params.shape + (degree + 1,))
+
+    frame_index = np.arange(frame_count)[:, None]
+    result = np.zeros((frame_count, params.shape[-1], cvs_frames.shape[2]))
+
+    for a in range(degree + 1):
+        result += values[:, :, a, None] * cvs_frames[frame_index, k - degree + a]
+
+    return result
+
+
+def sample_params(knots, degree, samples_per_span):
+    """有効範囲の各ノット区間を samples_per_span 分割したパラメーター列を返す"""
+    t = full_knots(knots)
+    lo, hi = domain(knots, degree)
+    breaks = np.unique(t[(t >= lo) & (t <= hi)])
+
+    if len(breaks) < 2:
+        return np.array([lo, hi])
+
+    steps = np.arange(samples_per_span, dtype=float) / samples_per_span
+    params = (breaks[:-1, None] + np.diff(breaks)[:, None] * steps[None, :]).ravel()
+
+    return np.append(params, hi)
+
+
+def uniform_knots(spans, degree=3):
+    """
+    0 から 1 までを spans 等分した両端クランプの Maya 形式のノット列
+    """
+    spans = max(1, int(spans))
+    inner = np.linspace(0.0, 1.0, spans + 1)
+
+    return np.concatenate([np.zeros(degree - 1), inner, np.ones(degree - 1)])
+
+
+def periodic_knots(spans, degree=3):
+    """
+    0 から 1 までを spans 等分した周期カーブの Maya 形式のノット列
+    両側に degree - 1 個ずつ等間隔のノットがはみ出す
+    """
+    spans = max(1, int(spans))
+
+    return np.arange(-(degree - 1), spans + degree, dtype=float) / spans
+
+
+def is_periodic(cvs, knots, degree):
+    """
+    周期カーブ (先頭 degree 個の CV が末尾に重複している) なら True
+    """
+    cvs = np.asarray(cvs, dtype=float)
+
+    if len(cvs) <= 2 * degree or degree < 1:
+        return False
+
+    return np.allclose(cvs[:degree], cvs[-degree:])
+
+
+def basis_functions(knots, degree, params):
+    """
+    各パラメーターで 0 でない基底関数の値を一括で求める
+    戻り値は (k, values)
+        k (m,) 各パラメーターの属するノット区間. 0 でないのは CV k-degree から k まで
+        values (m, degree + 1) その degree + 1 個の基底関数の値
+    """
+    t = full_knots(knots)
+    p = degree
+    n_cvs = len(t) - p - 1
+    u = np.clip(np.atleast_1d(np.asarray(params, dtype=float)), t[p], t[n_cvs])
+
+    k = np.searchsorted(t, u, side="right") - 1
+    k = np.clip(k, p, n_cvs - 1)
+
+    values = np.zeros((len(u), p + 1))
+    values[:, 0] = 1.0
+    left = np.zeros((len(u), p + 1))
+    right = np.zeros((len(u), p + 1))
+
+    for j in range(1, p + 1):
+        left[:, j] = u - t[k + 1 - j]
+        right[:, j] = t[k + j] - u
+        saved = np.zeros(len(u))
+
+        for r in range(j):
+            denom = right[:, r + 1] + left[:, j - r]
+            temp = values[:, r] / np.where(denom == 0.0, 1.0, denom)
+            values[:, r] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+
+        values[:, j] = saved
+
+    return k, values
+
+
+def greville(knots, degree, count):
+    """先頭 count 個の CV のグレビル点 (CV に対応するパラメーター)"""
+    knots = np.asarray(knots, dtype=float)
+
+    return np.array([knots[i:i + degree].mean() for i in range(count)])
+
+
+def _polyline_guess(points, params, at, period=None):
+    """
+    点列を params の位置に置いた折れ線の at での座標
+    点が足りず CV が決まらない場合の初期値に使う
+    """
+    params = np.asarray(params, dtype=float)
+    order = np.argsort(params, kind="stable")
+
+    return np.stack([np.interp(at, params[order], points[order, axis], period=period)
+                     for axis in range(points.shape[1])], axis=1)
+
+
+def fit_bspline(points, spans, degree=3, params=None, knots=None):
+    """
+    点列を spans スパンの B スプラインで最小二乗近似する
+    両端の CV は点列の始点と終点に一致させ, 残りの CV を正規方程式で解く
+
+    points (m, 3) の点列
+    params 各点の正規化パラメーター (0 から 1). 省略時は弦長パラメーター化
+    knots Maya 形式のノット列. 指定すると spans は無視してこのノット列で近似する
+    戻り値は (CV の配列, Maya 形式のノット列)
+    """
+    points = np.asarray(points, dtype=float)
+
+    if knots is None:
+        knots = uniform_knots(spans, degree)
+
+    knots = np.asarray(knots, dtype=float)
+    n_cvs = len(knots) - degree + 1
+
+    if params is None:
+        params = chord_ratios(points)
+
+    lo, hi = domain(knots, degree)
+    k, values = basis_functions(knots, degree, lo + np.asarray(params, dtype=float) * (hi - lo))
+
+    # 正規方程式 (N^T N) P = N^T Q を帯の部分だけ足し込んで作る
+    columns = k[:, None] + np.arange(-degree, 1)[None, :]
+    normal = np.zeros((n_cvs, n_cvs))
+    rhs = np.zeros((n_cvs, points.shape[1]))
+
+    for a in range(degree + 1):
+        np.add.at(rhs, columns[:, a], values[:, a, None] * points)
+
+        for b in range(degree + 1):
+            np.add.at(normal, (columns[:, a], columns[:, b]), values[:, a] * values[:, b])
+
+    # 両端の CV を固定して内側の CV だけを解く
+    # 内側の CV は弦の折れ線上の初期値からの差分を解くので, 点数が CV 数より少なくて決まらない CV は原点ではなく折れ線上に残る
+    cvs = _polyline_guess(points, params, (greville(knots, degree, n_cvs) - lo) / (hi - lo))
+    cvs[0] = points[0]
+    cvs[-1] = points[-1]
+
+    if n_cvs > 2:
+        inner = slice(1, n_cvs - 1)
+        residual = rhs[inner] - normal[inner].dot(cvs)
+        cvs[inner] += np.linalg.lstsq(normal[inner, inner], residual, rcond=None)[0]
+
+    return cvs, knots
+
+
+def fit_periodic_bspline(points, spans, degree=3, params=None, knots=None):
+    """
+    閉じた点列を spans スパンの周期 B スプラインで最小二乗近似する
+
+    points (m, 3) の点列 (始点は繰り返さない)
+    params 各点の正規化パラメーター (0 から 1 未満). 省略時は閉じた弦長パラメーター化
+    knots 周期カーブの Maya 形式のノット列. 指定すると spans は無視してこのノット列で近似する
+    戻り値は (末尾に先頭 degree 個を重複させた CV の (spans + degree, 3) 配列, Maya 形式のノット列)
+    """
+    points = np.asarray(points, dtype=float)
+
+    if knots is None:
+        knots = periodic_knots(max(int(spans), degree), degree)
+
+    knots = np.asarray(knots, dtype=float)
+    spans = len(knots) - 2 * degree + 1
+
+    if params is None:
+        params = chord_ratios(points, closed=True)
+
+    lo, hi = domain(knots, degree)
+    k, values = basis_functions(knots, degree, lo + np.mod(params, 1.0) * (hi - lo))
+
+    # 重複した CV は同じ未知数にまとめる
+    columns = (k[:, None] + np.arange(-degree, 1)[None, :]) % spans
+    normal = np.zeros((spans, spans))
+    rhs = np.zeros((spans, points.shape[1]))
+
+    for a in range(degree + 1):
+        np.add.at(rhs, columns[:, a], values[:, a, None] * points)
+
+        for b in range(degree + 1):
+            np.add.at(normal, (columns[:, a], columns[:, b]), values[:, a] * values[:, b])
+
+    # fit_bspline と同じく折れ線上の初期値からの差分を解く
+    guess = _polyline_guess(points, np.mod(params, 1.0), np.mod((greville(knots, degree, spans) - lo) / (hi - lo), 1.0),
+                            period=1.0)
+    cvs = guess + np.linalg.lstsq(normal, rhs - normal.dot(guess), rcond=None)[0]
+
+    return np.concatenate([cvs, cvs[:degree]]), knots
+
+
+class ArcLengthTable(object):
+    """
+    カーブを密にサンプリングした弧長テーブル
+    正規化弧長 (0.0-1.0) からパラメーターと座標を一括で求める
+    """
+
+    def __init__(self, cvs, knots, degree, samples_per_span=32):
+        self.cvs = np.asarray(cvs, dtype=float)
+        self.knots = np.asarray(knots, dtype=float)
+        self.degree = degree
+
+        self.params = sample_params(self.knots, degree, samples_per_span)
+        self.points = evaluate(self.cvs, self.knots, degree, self.params)
+        segment_lengths = np.linalg.norm(np.diff(self.points, axis=0), axis=1)
+        self.lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+        self.length = self.lengths[-1]
+
+    @property
+    def nbytes(self):
+        """テーブルが保持している配列のバイト数"""
+        return self.cvs.nbytes + self.knots.nbytes + self.params.nbytes + self.points.nbytes + self.lengths.nbytes
+
+    def closest_ratios(self, points, chunk_size=2048):
+        """各点に最も近いサンプル点の正規化弧長"""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        nearest = np.empty(len(points), dtype=int)
+
+        for start in range(0, len(points), chunk_size):
+            block = points[start:start + chunk_size]
+            d2 = ((block[:, None, :] - self.points[None, :, :]) ** 2).sum(axis=2)
+            nearest[start:start + chunk_size] = np.argmin(d2, axis=1)
+
+        if self.length <= 0.0:
+            return np.zeros(len(points))
+
+        return self.lengths[nearest] / self.length
+
+    def params_at(self, ratios):
+        """正規化弧長の配列をカーブパラメーターの配列に変換する"""
+        ratios = np.clip(np.asarray(ratios, dtype=float), 0.0, 1.0)
+
+        if self.length <= 0.0:
+            return self.params[0] + ratios * (self.params[-1] - self.params[0])
+
+        return np.interp(ratios * self.length, self.lengths, self.params)
+
+    def points_at(self, ratios):
+        """正規化弧長の配列に対応するカーブ上の座標を一括で返す"""
+        return evaluate(self.cvs, self.knots, self.degree, self.params_at(ratios))
+
+
+def shape_hash(cvs, knots, degree):
+    """
+    CV, ノット, 次数 から形状のハッシュ文字列を作る
+    """
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(cvs, dtype=float).tobytes())
+    h.update(np.ascontiguousarray(knots, dtype=float).tobytes())
+    h.update(str(degree).encode("ascii"))
+
+    return h.hexdigest()
+
+
+def fingerprint(arrays, decimals=5):
+    """
+    配列のリストから変更検出用の短いハッシュ文字列を作る
+    浮動小数は decimals 桁に丸めて読み書きの誤差を吸収する
+    """
+    h = hashlib.md5()
+
+    for array in arrays:
+        array = np.asarray(array)
+
+        if array.dtype.kind == "f":
+            # -0.0 と 0.0 を同じにするため 0.0 を足す
+            array = np.round(array, decimals) + 0.0
+
+        h.update(np.ascontiguousarray(array).tobytes())
+
+    return h.hexdigest()[:16]
+
+
+class ArcLengthCache(object):
+    """
+    形状ハッシュをキーにした弧長テーブルの LRU キャッシュ
+    保持しているテーブルの合計が max_bytes を超えたら古く使われたものから捨てる
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, samples_per_span=32):
+        self.max_bytes = max_bytes
+        self.samples_per_span = samples_per_span
+        self.tables = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.tables)
+
+    def get(self, cvs, knots, degree):
+        """
+        形状に対応する弧長テーブルを返す. キャッシュに無ければ作成して登録する
+        """
+        key, table = self.find(cvs, knots, degree)
+
+        if table is None:
+            table = ArcLengthTable(cvs, knots, degree, self.samples_per_span)
+            self.add(key, table)
+
+        return table
+
+    def find(self, cvs, knots, degree):
+        """
+        形状のキーとキャッシュ済みのテーブル (無ければ None) を返す
+        テーブルを別スレッドで作る場合は find で探して作ったものを add で登録する
+        """
+        key = shape_hash(cvs, knots, degree)
+        table = self.tables.pop(key, None)
+
+        if table is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.tables[key] = table
+
+        return key, table
+
+    def add(self, key, table):
+        """テーブルを登録する"""
+        old_table = self.tables.pop(key, None)
+
+        if old_table is not None:
+            self.nbytes -= old_table.nbytes
+
+        self.tables[key] = table
+        self.nbytes += table.nbytes
+
+        # 直前に使ったもの以外を古い順に捨てる
+        while self.nbytes > self.max_bytes and len(self.tables) > 1:
+            _, old_table = self.tables.popitem(last=False)
+            self.nbytes -= old_table.nbytes
+
+    def clear(self):
+        """キャッシュをすべて破棄する"""
+        self.tables.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+def even_ratios(count, closed=False):
+    """
+    count 個の点を等間隔に配置する正規化弧長の配列
+    closed なら 1.0 (始点と同じ位置) は含めない
+    """
+    if closed:
+        return np.arange(count, dtype=float) / max(count, 1)
+
+    if count < 2:
+        return np.zeros(count)
+
+    return np.linspace(0.0, 1.0, count)
+
+
+def chord_ratios(points, closed=False):
+    """
+    折れ線の始点から各頂点までの長さを全長で正規化した配列
+    累積和で一度に求める. 全長が 0 なら等間隔とみなす
+    closed なら終点から始点に戻る辺も全長に含める
+    """
+    points = np.asarray(points, dtype=float)
+
+    if closed and len(points) > 1:
+        points = np.concatenate([points, points[:1]])
+
+    segment_lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+
+    if closed:
+        if len(points) < 2 or lengths[-1] <= 0.0:
+            return even_ratios(max(len(points) - 1, 1), closed=True)
+
+        return lengths[:-1] / lengths[-1]
+
+    if len(points) < 2 or lengths[-1] <= 0.0:
+        return even_ratios(len(points))
+
+    return lengths / lengths[-1]
+
+
+def smooth_polylines(points, offsets, iterations=1, factor=0.5, shrink=None, closed=None):
+    """
+    連結した複数の点列 (カーブの CV 列など) をまとめてラプラシアンスムースする
+    各点列の両端の点は動かさない. 閉じた点列は端を作らず一周つなげてスムースする
+
+    points 全点列を連結した (m, 3) の配列
+    offsets 各点列の開始位置と末尾 (点列の数 + 1 個. [0, 5, 12] なら 0-4 と 5-11)
+    iterations 繰り返し回数
+    factor 一回で隣接点の中点へ近づける割合
+    shrink 負の値を指定すると factor の後に shrink でも一回動かす (Taubin スムース. 縮みを抑える)
+    closed 点列毎に閉じているかどうかの配列. None ならすべて開いている
+    """
+    points = np.array(points, dtype=float)
+    offsets = np.asarray(offsets, dtype=int)
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+    closed = np.zeros(len(starts), dtype=bool) if closed is None else np.asarray(closed, dtype=bool)
+
+    index = np.arange(len(points))
+    prev_index = index - 1
+    next_index = index + 1
+    prev_index[starts] = np.where(closed, ends, starts)
+    next_index[ends] = np.where(closed, starts, ends)
+
+    movable = np.ones(len(points))
+    movable[starts[~closed]] = 0.0
+    movable[ends[~closed]] = 0.0
+
+    weights = [factor] if shrink is None else [factor, shrink]
+
+    for _ in range(iterations):
+        for weight in weights:
+            laplacian = 0.5 * (points[prev_index] + points[next_index]) - points
+            points += (weight * movable)[:, None] * laplacian
+
+    return points
+
+
+def is_reversed(points, table):
+    """
+    頂点列の始点がカーブの始点よりも終点に近ければ True を返す
+    """
+    start, end = table.points_at([0.0, 1.0])
+    first = np.asarray(points[0], dtype=float)
+
+    return np.linalg.norm(first - end) < np.linalg.norm(first - start)
+
+
+def loop_alignment(table, points, ratios):
+    """
+    閉じた頂点列をカーブに沿わせる時の継ぎ目の位置と向き
+    各頂点に最も近いカーブ上の位置と頂点の比率との差の円周平均を両方向で求め, 揃っている方を選ぶ
+    戻り値は (頂点列の始点を置く正規化弧長, 頂点列がカーブと逆向きなら True)
+    """
+    nearest = table.closest_ratios(points)
+    forward = np.exp(2j * np.pi * (nearest - ratios)).mean()
+    backward = np.exp(2j * np.pi * (nearest + ratios)).mean()
+
+    if abs(backward) > abs(forward):
+        return np.angle(backward) / (2 * np.pi) % 1.0, True
+
+    return np.angle(forward) / (2 * np.pi) % 1.0, False
+
+
+def target_ratios(table, points, keep_ratio_mode=True, ratios=None, closed=False):
+    """
+    頂点列の各頂点を置くカーブ上の正規化弧長を決める (solve_fit の配置の部分)
+    戻り値は (頂点列を反転したか, 反転後の頂点列の順の正規化弧長の配列)
+    """
+    points = np.asarray(points, dtype=float)
+
+    if closed:
+        if not keep_ratio_mode:
+            ratios = even_ratios(len(points), closed=True)
+        elif ratios is None:
+            ratios = chord_ratios(points, closed=True)
+
+        ratios = np.asarray(ratios, dtype=float)
+        seam, backward = loop_alignment(table, points, ratios)
+
+        return False, (seam - ratios if backward else seam + ratios) % 1.0
+
+    # カーブの始点終点と頂点列の始点終点が逆なら頂点列を反転する
+    flipped = is_reversed(points, table)
+
+    if flipped:
+        points = points[::-1]
+
+    if keep_ratio_mode and ratios is not None:
+        # 保存済みの比率でカーブに再配置
+        ratios = np.asarray(ratios, dtype=float)
+
+        if flipped:
+            ratios = 1.0 - ratios[::-1]
+
+    elif keep_ratio_mode:
+        # 頂点列間の比率を維持してカーブに再配置
+        ratios = chord_ratios(points)
+
+    else:  # even space mode
+        # 頂点列間の比率を無視してカーブに等間隔で配置
+        ratios = even_ratios(len(points))
+
+    return flipped, ratios
+
+
+def solve_fit(cvs, knots, degree, points, keep_ratio_mode=True, table=None, samples_per_span=32, ratios=None,
+              closed=False):
+    """
+    カーブ一本分の Fit の計算
+    配列だけを受け取って返すので別スレッドや別プロセスでも実行できる
+
+    points カーブに合わせる頂点列の座標
+    table 作成済みの弧長テーブル. None ならここで作る
+    ratios keep ratio mode で使う保存済みの比率 (points の順). None なら points から測る
+    closed 頂点列が閉じたループなら True. 継ぎ目と向きは loop_alignment で決める
+    戻り値は (頂点列を反転したか, 移動先の座標の配列 (反転後の頂点列の順), 弧長テーブル)
+    """
+    if table is None:
+        table = ArcLengthTable(cvs, knots, degree, samples_per_span)
+
+    flipped, ratios = target_ratios(table, points, keep_ratio_mode, ratios, closed)
+
+    return flipped, table.points_at(ratios), table
+
+
+def solve_fit_frames(cvs_frames, knots, degree, points, keep_ratio_mode=True, samples_per_span=32, ratios=None,
+                     closed=False):
+    """
+    アニメーションするカーブに対する全フレーム分の Fit の計算
+    頂点の並びと比率 (閉じたループなら継ぎ目と向きも) は最初のフレームで決めて全フレームで使う
+    弧長テーブルは全フレーム分を (フレーム数, サンプル数) の配列として一度に作る
+
+    cvs_frames (フレーム数, CV 数, 3) のフレーム毎の CV. ノット列と次数は全フレーム共通
+    points, ratios, closed は solve_fit と同じ
+    戻り値は (頂点列を反転したか, 移動先の座標の (フレーム数, 頂点数, 3) 配列 (反転後の頂点列の順))
+    """
+    cvs_frames = np.asarray(cvs_frames, dtype=float)
+    first = ArcLengthTable(cvs_frames[0], knots, degree, samples_per_span)
+    flipped, ratios = target_ratios(first, points, keep_ratio_mode, ratios, closed)
+    ratios = np.clip(ratios, 0.0, 1.0)
+
+    params = sample_params(knots, degree, samples_per_span)
+    samples = evaluate_frames(cvs_frames, knots, degree, params)
+    segment_lengths = np.linalg.norm(np.diff(samples, axis=1), axis=2)
+    lengths = np.concatenate([np.zeros((len(cvs_frames), 1)), np.cumsum(segment_lengths, axis=1)], axis=1)
+
+    target_params = np.empty((len(cvs_frames), len(ratios)))
+
+    for frame, frame_lengths in enumerate(lengths):
+        if frame_lengths[-1] <= 0.0:
+            target_params[frame] = params[0] + ratios * (params[-1] - params[0])
+        else:
+            target_params[frame] = np.interp(ratios * frame_lengths[-1], frame_lengths, params)
+
+    return flipped, evaluate_frames(cvs_frames, knots, degree, target_params)
+
+
+def _solve_fit_args(args):
+    return solve_fit(*args)
+
+
+def solve_fits(jobs, workers=None, processes=False):
+    """
+    solve_fit の引数のタプルのリストを並列に解いて結果のリストを返す
+
+    workers 並列数. None なら CPU 数, 1 以下なら並列化しない
+    processes True ならプロセスプール, False ならスレッドプール
+        プロセスプールは配列の受け渡しのコストがかかるが GIL に縛られない
+        Maya GUI から使う場合は multiprocessing.set_executable で mayapy を指定しておく
+    """
+    jobs = list(jobs)
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(jobs) < 2:
+        return [solve_fit(*args) for args in jobs]
+
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    chunk_size = max(1, len(jobs) // (workers * 4)) if processes else 1
+
+    with executor_class(max_workers=min(workers, len(jobs))) as executor:
+        return list(executor.map(_solve_fit_args, jobs, chunksize=chunk_size))
@@ -0,0 +1,184 @@
+#! python
+# coding:utf-8
+"""
+カーブとエッジ列のセットアップの書き出しと読み込み
+
+このツールのカーブの CV, ノット, 次数, エッジ列, 並べ替え済みの頂点列, 保存済みの比率を
+カーブ毎の配列をつなげた形で一つの .npz にまとめる
+読み込みはカーブ一本につき cmds.curve 一回で作り, アトリビュートはバックエンドでまとめて書き込む
+エッジ列は書き出した時のトポロジーチェックサムと今のメッシュを比べて検証する
+
+    exchange.exportCurves("setup.npz")
+    curves, broken = exchange.importCurves("setup.npz", meshes={"body_v1": "body_v2"})
+"""
+
+import numpy as np
+
+import maya.cmds as cmds
+
+from . import core
+from . import backend
+from . import binding
+from . import curvemath as cm
+from . import instrument
+from . import nncurve_undo
+
+cmds = instrument.CountingCommands(cmds)
+
+
+# 書き出すファイルの形式のバージョン
+format_version = 1
+
+
+def _pack(arrays, shape=()):
+    """配列のリストを一つにつなげた配列と各配列の開始位置 (最後に全体の長さ) にする"""
+    offsets = np.cumsum([0] + [len(array) for array in arrays])
+    packed = np.concatenate(arrays) if arrays else np.zeros((0,) + shape)
+
+    return packed.reshape((-1,) + shape), offsets
+
+
+def _unpack(packed, offsets):
+    return [packed[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def exportCurves(path, curves=None):
+    """
+    curves (None ならシーン内のこのツールのカーブすべて) を path に .npz で書き出す
+    頂点列は今のトポロジーで並べ直し, メッシュ毎の今のトポロジーチェックサムと一緒に保存する
+    一本に繋がらないエッジ列は頂点列を空にする
+    戻り値は書き出したカーブの数
+    """
+    mesh_backend = backend.get_backend()
+    names, mesh_names, degrees = [], [], []
+    cvs, knots, edges, vertices, ratios = [], [], [], [], []
+    checksums = {}
+
+    with instrument.operation("export"), core.topology_cache.batch():
+        for curve, _, edges_str in core.getCurveStates(curves):
+            with instrument.curve(curve):
+                edge_binding = core.makeBinding(binding.decode(edges_str))
+
+                with instrument.phase("read"):
+                    curve_cvs, curve_knots, degree = core.getCurveData(curve)
+                    curve_ratios = core.getRatios(curve)
+
+            checksums[edge_binding.mesh] = core.topology_cache.get(edge_binding.mesh, mesh_backend).checksum
+
+            names.append(curve)
+            mesh_names.append(edge_binding.mesh)
+            degrees.append(degree)
+            cvs.append(np.asarray(curve_cvs, dtype=float))
+            knots.append(np.asarray(curve_knots, dtype=float))
+            edges.append(edge_binding.edges)
+            vertices.append(np.zeros(0, dtype=int) if edge_binding.vertices is None else edge_binding.vertices)
+            ratios.append(np.zeros(0) if curve_ratios is None else curve_ratios)
+
+    meshes = sorted(checksums)
+    arrays = {
+        "version": np.array(format_version),
+        "names": np.array(names, dtype=str),
+        "meshes": np.array(meshes, dtype=str),
+        "checksums": np.array([checksums[mesh] or "" for mesh in meshes], dtype=str),
+        "mesh_ids": np.array([meshes.index(mesh) for mesh in mesh_names], dtype=int),
+        "degrees": np.array(degrees, dtype=int),
+    }
+
+    arrays["cvs"], arrays["cv_offsets"] = _pack(cvs, (3,))
+
+    for key, values in (("knots", knots), ("edges", edges), ("vertices", vertices), ("ratios", ratios)):
+        arrays[key], arrays[key + "_offsets"] = _pack(values)
+
+    arrays["edges"] = arrays["edges"].astype(int)
+    arrays["vertices"] = arrays["vertices"].astype(int)
+
+    np.savez_compressed(path, **arrays)
+
+    return len(names)
+
+
+def _validateBinding(mesh, edges, vertices, checksum, mesh_backend):
+    """
+    書き出した時のエッジ列を今のメッシュで検証した Binding と, 検証できたかどうかを返す
+    チェックサムが違っても同じエッジ列が同じ頂点列になるならそのまま使える
+    検証できなければ書き出した時のチェックサムを残し, findBrokenCurves で見つかるようにする
+    """
+    index = core.topology_cache.get(mesh, mesh_backend)
+
+    if checksum and checksum == index.checksum:
+        return binding.Binding(mesh, edges, vertices if len(vertices) else None, checksum), True
+
+    try:
+        ordered_vertices, ordered_edges = index.order_chain(edges, with_edges=True)
+
+    except ValueError:
+        ordered_vertices = None
+
+    if ordered_vertices is not None and (not len(vertices) or np.array_equal(ordered_vertices, vertices)
+                                         or np.array_equal(ordered_vertices[::-1], vertices)):
+        return binding.Binding(mesh, ordered_edges, ordered_vertices, index.checksum), True
+
+    return binding.Binding(mesh, edges, vertices if len(vertices) else None, checksum or None), False
+
+
+def importCurves(path, meshes=None, rebind=True):
+    """
+    exportCurves で書き出したカーブを作り直す
+    meshes 書き出した時のメッシュ名 -> 今のメッシュ名 (名前が変わったメッシュだけで良い)
+    rebind True ならエッジ列を検証できなかったカーブをカーブの形状から再割り当てする (core.rebindCurves)
+    カーブ名が既にあれば Maya の規則で別名になる. 今のシーンに無いメッシュがあれば何も作らずに ValueError
+    戻り値は [作ったカーブのリスト, エッジ列が壊れたままのカーブのリスト]
+    """
+    meshes = meshes or {}
+    mesh_backend = backend.get_backend()
+
+    with np.load(path) as data:
+        if int(data["version"]) > format_version:
+            raise ValueError("unsupported setup format version: %d" % int(data["version"]))
+
+        names = data["names"].tolist()
+        mesh_names = [meshes.get(mesh, mesh) for mesh in data["meshes"].tolist()]
+        checksums = data["checksums"].tolist()
+        mesh_ids = data["mesh_ids"]
+        degrees = data["degrees"].tolist()
+        cvs = _unpack(data["cvs"], data["cv_offsets"])
+        knots, edges, vertices, ratios = [_unpack(data[key], data[key + "_offsets"])
+                                          for key in ("knots", "edges", "vertices", "ratios")]
+
+    for mesh in mesh_names:
+        if not cmds.objExists(mesh):
+            raise ValueError("mesh not found: %s" % mesh)
+
+    created = []
+    unverified = []
+    record = backend.AttributesRecord(mesh_backend)
+    appearance = core.appearanceValues()
+
+    with instrument.operation("import"), nncurve_undo.chunk("NN_Curve Import"), core.topology_cache.batch():
+        for i, name in enumerate(names):
+            mesh_id = int(mesh_ids[i])
+
+            with instrument.curve(name):
+                edge_binding, valid = _validateBinding(mesh_names[mesh_id], edges[i], vertices[i], checksums[mesh_id],
+                                                       mesh_backend)
+
+                with instrument.phase("writeback"):
+                    periodic = cm.is_periodic(cvs[i], knots[i], degrees[i])
+                    curve = cmds.curve(p=cvs[i].tolist(), k=knots[i].tolist(), d=degrees[i], per=periodic, name=name)
+
+            strings = {core.attr_name: edge_binding.encode()}
+            arrays = {core.ratios_attr_name: ratios[i]} if len(ratios[i]) else None
+            record.add(curve, strings, arrays, appearance)
+            created.append(curve)
+
+            if not valid:
+                unverified.append(curve)
+
+        with instrument.phase("writeback"):
+            mesh_backend.commit(record)
+            core.registerCurves(created)
+
+        if rebind and unverified:
+            _, unverified = core.rebindCurves(unverified)
+
+    return [created, unverified]
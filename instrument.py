@@ -0,0 +1,248 @@
+#! python
+# coding:utf-8
+"""
+ホットパスの計測
+
+処理 (operation) 毎, カーブ毎に フェーズ別の時間と Maya コマンドの呼び出し回数を集計する
+enable() するまでは operation/curve/phase/count はほぼ何もしない
+
+    instrument.enable()
+    core.fitCurves()
+    print(instrument.format_table())
+    instrument.dump_json("fit_profile.json")
+"""
+
+import collections
+import contextlib
+import json
+import time
+
+
+enabled = False
+
+
+class _NullContext(object):
+    """計測が無効な時に返す何もしないコンテキスト"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_null_context = _NullContext()
+
+
+def _new_bucket(name):
+    return {
+        "name": name,
+        "seconds": 0.0,
+        "phases": collections.OrderedDict(),
+        "commands": collections.Counter(),
+    }
+
+
+class Profiler(object):
+    """
+    operation -> curve の二階層で時間とコマンド回数を溜める
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.operations = []
+        self.current_operation = None
+        self.current_curve = None
+
+    def _buckets(self):
+        buckets = []
+
+        if self.current_operation is not None:
+            buckets.append(self.current_operation)
+
+        if self.current_curve is not None:
+            buckets.append(self.current_curve)
+
+        return buckets
+
+    @contextlib.contextmanager
+    def operation(self, name):
+        bucket = _new_bucket(name)
+        bucket["curves"] = collections.OrderedDict()
+        outer = self.current_operation
+
+        if outer is None:
+            self.operations.append(bucket)
+            self.current_operation = bucket
+
+        start = time.perf_counter()
+
+        try:
+            yield bucket
+        finally:
+            bucket["seconds"] += time.perf_counter() - start
+
+            if outer is None:
+                self.current_operation = None
+
+    @contextlib.contextmanager
+    def curve(self, name):
+        if self.current_operation is None or self.current_curve is not None:
+            yield None
+            return
+
+        curves = self.current_operation["curves"]
+        bucket = curves.setdefault(name, _new_bucket(name))
+        self.current_curve = bucket
+        start = time.perf_counter()
+
+        try:
+            yield bucket
+        finally:
+            bucket["seconds"] += time.perf_counter() - start
+            self.current_curve = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+
+            for bucket in self._buckets():
+                bucket["phases"][name] = bucket["phases"].get(name, 0.0) + seconds
+
+    def count(self, command):
+        for bucket in self._buckets():
+            bucket["commands"][command] += 1
+
+    def report(self):
+        """JSON にできる形の集計結果"""
+        result = []
+
+        for operation in self.operations:
+            entry = {
+                "name": operation["name"],
+                "seconds": operation["seconds"],
+                "phases": dict(operation["phases"]),
+                "commands": dict(operation["commands"]),
+                "curves": [],
+            }
+
+            for curve in sorted(operation["curves"].values(), key=lambda c: -c["seconds"]):
+                entry["curves"].append({
+                    "name": curve["name"],
+                    "seconds": curve["seconds"],
+                    "phases": dict(curve["phases"]),
+                    "commands": dict(curve["commands"]),
+                })
+
+            result.append(entry)
+
+        return result
+
+
+profiler = Profiler()
+
+
+def enable():
+    """計測を開始する. 溜まっている結果は破棄する"""
+    global enabled
+    profiler.reset()
+    enabled = True
+
+
+def disable():
+    """計測を止める. 溜まった結果は report で取り出せる"""
+    global enabled
+    enabled = False
+
+
+def reset():
+    profiler.reset()
+
+
+def operation(name):
+    """一つの処理 (Fit All など) を囲むコンテキスト"""
+    return profiler.operation(name) if enabled else _null_context
+
+
+def curve(name):
+    """処理の中のカーブ一本分を囲むコンテキスト"""
+    return profiler.curve(name) if enabled else _null_context
+
+
+def phase(name):
+    """フェーズ (conversion, sorting, rebuild, sampling, writeback など) を囲むコンテキスト"""
+    return profiler.phase(name) if enabled else _null_context
+
+
+def count(command):
+    """コマンドの呼び出しを一回数える"""
+    if enabled:
+        profiler.count(command)
+
+
+class CountingCommands(object):
+    """
+    maya.cmds の代わりに使うラッパー
+    計測中だけコマンドの呼び出しを数え, それ以外は元の関数をそのまま返す
+    """
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        function = getattr(self._module, name)
+
+        if not enabled:
+            return function
+
+        def counted(*args, **kwargs):
+            profiler.count(name)
+            return function(*args, **kwargs)
+
+        return counted
+
+
+def report():
+    return profiler.report()
+
+
+def dump_json(path):
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+
+
+def format_table(max_curves=20):
+    """
+    処理毎のフェーズ別時間と, 時間のかかったカーブ上位 max_curves 本の表
+    """
+    lines = []
+
+    for operation in report():
+        phase_names = list(operation["phases"])
+        header = "%-24s %9s %6s " % ("curve", "ms", "cmds") + " ".join("%11s" % name[:11] for name in phase_names)
+
+        lines.append("[%s] %.2f ms, %d commands" % (
+            operation["name"], operation["seconds"] * 1000.0, sum(operation["commands"].values())))
+        lines.append(header)
+        lines.append("-" * len(header))
+
+        rows = [dict(operation, name="(total)")] + operation["curves"][:max_curves]
+
+        for row in rows:
+            lines.append("%-24s %9.2f %6d " % (row["name"][:24], row["seconds"] * 1000.0, sum(row["commands"].values()))
+                         + " ".join("%11.2f" % (row["phases"].get(name, 0.0) * 1000.0) for name in phase_names))
+
+        if operation["commands"]:
+            commands = sorted(operation["commands"].items(), key=lambda item: -item[1])
+            lines.append("commands: " + ", ".join("%s=%d" % item for item in commands))
+
+        lines.append("")
+
+    return "\n".join(lines)
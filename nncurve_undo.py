@@ -0,0 +1,100 @@
+#! python
+# coding:utf-8
+"""
+一括書き込みのアンドゥ
+
+MFnMesh.setPoints など API による書き込みはアンドゥキューに積まれないので,
+書き込み前後の座標配列を持つレコードをこのファイル自身をプラグインとして登録したコマンドに渡して記録する
+アンドゥ/リドゥでは配列をそのまま書き戻すだけなので大量の頂点でも一回のコマンドで済む
+
+Maya がプラグインとして読み込むとパッケージとは別のモジュールになるため
+相対インポートは使わず, レコードの受け渡しは sys.modules に置いた共有モジュール経由で行う
+"""
+
+import contextlib
+import os
+import sys
+import types
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+
+
+# プラグイン名 (ファイル名) とコマンド名
+plugin_name = "nncurve_undo"
+command_name = "nnCurveApply"
+
+shared_module_name = "_nncurve_undo_shared"
+
+if shared_module_name not in sys.modules:
+    sys.modules[shared_module_name] = types.ModuleType(shared_module_name)
+    sys.modules[shared_module_name].pending = None
+
+shared = sys.modules[shared_module_name]
+
+
+def maya_useNewAPI():
+    pass
+
+
+class ApplyCommand(om.MPxCommand):
+    """
+    commit で渡されたレコードを実行してアンドゥキューに積むコマンド
+    レコードは redo() と undo() を持つオブジェクト
+    """
+
+    def __init__(self):
+        om.MPxCommand.__init__(self)
+        self.record = None
+
+    def doIt(self, args):
+        self.record = shared.pending
+        shared.pending = None
+        self.redoIt()
+
+    def redoIt(self):
+        self.record.redo()
+
+    def undoIt(self):
+        self.record.undo()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om.MFnPlugin(plugin).registerCommand(command_name, ApplyCommand)
+
+
+def uninitializePlugin(plugin):
+    om.MFnPlugin(plugin).deregisterCommand(command_name)
+
+
+def load_plugin():
+    """
+    このファイルをプラグインとして読み込む
+    """
+    if not cmds.pluginInfo(plugin_name, q=True, loaded=True):
+        cmds.loadPlugin(os.path.splitext(os.path.abspath(__file__))[0] + ".py", quiet=True)
+
+
+def commit(record):
+    """
+    レコードを実行し, アンドゥ可能な一回のコマンドとして記録する
+    """
+    load_plugin()
+    shared.pending = record
+    getattr(cmds, command_name)()
+
+
+@contextlib.contextmanager
+def chunk(name):
+    """
+    ブロック内のコマンドを一回のアンドゥ単位にまとめる
+    """
+    cmds.undoInfo(openChunk=True, chunkName=name)
+
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
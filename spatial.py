@@ -0,0 +1,393 @@
+#! python
+# coding:utf-8
+"""
+点群と三角形の空間インデックスと鏡映頂点の対応
+Maya に依存しない NumPy だけの実装
+
+点 (三角形) を一様なセルに分けてセル番号順に並べておき, セルの範囲を二分探索で引く
+構築はソート一回なので百万頂点のメッシュでも一瞬で作れる
+"""
+
+import numpy as np
+
+
+class PointGrid(object):
+    """
+    一様グリッドによる点群のインデックス
+
+    points (n, 3) の座標
+    cell_size セルの一辺. None なら 1 セルに平均数点入る大きさにする
+    """
+
+    def __init__(self, points, cell_size=None, points_per_cell=4):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+
+        if len(self.points) == 0:
+            raise ValueError("empty point set")
+
+        self.lower = self.points.min(axis=0)
+        extent = np.maximum(self.points.max(axis=0) - self.lower, 1e-9)
+
+        if cell_size is None:
+            volume = np.prod(np.maximum(extent, extent.max() * 1e-3))
+            cell_size = (volume * points_per_cell / len(self.points)) ** (1.0 / 3.0)
+
+        self.cell_size = float(cell_size)
+        self.dims = np.floor(extent / self.cell_size).astype(np.int64) + 1
+
+        keys = self._keys(self._cells(self.points))
+        self.order = np.argsort(keys)
+        self.sorted_keys = keys[self.order]
+
+    def _cells(self, points):
+        cells = np.floor((np.asarray(points, dtype=float) - self.lower) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.dims - 1)
+
+    def _keys(self, cells):
+        return cells[..., 0] + self.dims[0] * (cells[..., 1] + self.dims[1] * cells[..., 2])
+
+    def _candidates(self, lower_cell, upper_cell):
+        """セル範囲 [lower_cell, upper_cell] に入っている点のインデックス"""
+        lower_cell = np.clip(lower_cell, 0, self.dims - 1)
+        upper_cell = np.clip(upper_cell, 0, self.dims - 1)
+
+        if np.any(upper_cell < lower_cell):
+            return np.zeros(0, dtype=np.int64)
+
+        # x 方向に連続したセルは連続したキーなので, (y, z) 毎に一回の範囲検索で済む
+        ys, zs = np.meshgrid(np.arange(lower_cell[1], upper_cell[1] + 1),
+                             np.arange(lower_cell[2], upper_cell[2] + 1), indexing="ij")
+        row_keys = self.dims[0] * (ys.ravel() + self.dims[1] * zs.ravel())
+        starts = np.searchsorted(self.sorted_keys, row_keys + lower_cell[0], side="left")
+        ends = np.searchsorted(self.sorted_keys, row_keys + upper_cell[0], side="right")
+
+        if not np.any(ends > starts):
+            return np.zeros(0, dtype=np.int64)
+
+        return np.concatenate([self.order[s:e] for s, e in zip(starts, ends) if e > s])
+
+    def nearest(self, point):
+        """
+        point に一番近い点のインデックスと距離を返す
+        """
+        point = np.asarray(point, dtype=float)
+        center = self._cells(point)
+        ring = 0
+        best = (-1, np.inf)
+
+        while True:
+            candidates = self._candidates(center - ring, center + ring)
+
+            if len(candidates):
+                distances = np.linalg.norm(self.points[candidates] - point, axis=1)
+                i = int(np.argmin(distances))
+
+                if distances[i] < best[1]:
+                    best = (int(candidates[i]), float(distances[i]))
+
+            # 調べたリングより外の点はリングの内側の幅より遠い
+            if best[0] >= 0 and best[1] <= ring * self.cell_size:
+                return best
+
+            if np.all(center - ring <= 0) and np.all(center + ring >= self.dims - 1):
+                return best
+
+            ring += 1
+
+    def within(self, centers, radius):
+        """
+        centers のいずれかから radius 以内にある点のインデックスの配列 (昇順)
+        """
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        reach = int(np.ceil(radius / self.cell_size))
+        found = []
+
+        for center, cell in zip(centers, self._cells(centers)):
+            candidates = self._candidates(cell - reach, cell + reach)
+
+            if len(candidates):
+                distances = np.linalg.norm(self.points[candidates] - center, axis=1)
+                found.append(candidates[distances <= radius])
+
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+
+        return np.unique(np.concatenate(found))
+
+    def nearest_within(self, queries, radius):
+        """
+        queries の各点から radius 以内で一番近い点のインデックスと距離 (無ければ -1 と inf)
+        周りのセルとの組ごとに, セル内の点を一つずつずらしながら全点まとめて比べる
+        """
+        queries = np.asarray(queries, dtype=float).reshape(-1, 3)
+        best = np.full(len(queries), -1, dtype=np.int64)
+        best_distances = np.full(len(queries), np.inf)
+
+        # 範囲外の点も切り詰めずにセル番号を求め, 隣のセルが範囲内ならそこを調べる
+        cells = np.floor((queries - self.lower) / self.cell_size).astype(np.int64)
+        reach = np.arange(-int(np.ceil(radius / self.cell_size)), int(np.ceil(radius / self.cell_size)) + 1)
+        offsets = np.stack(np.meshgrid(reach, reach, reach, indexing="ij"), axis=-1).reshape(-1, 3)
+
+        for offset in offsets:
+            neighbors = cells + offset
+            rows = np.flatnonzero(np.all((neighbors >= 0) & (neighbors < self.dims), axis=1))
+            keys = self._keys(neighbors[rows])
+            starts = np.searchsorted(self.sorted_keys, keys, side="left")
+            counts = np.searchsorted(self.sorted_keys, keys, side="right") - starts
+
+            for j in range(int(counts.max()) if len(counts) else 0):
+                has = counts > j
+                query_rows = rows[has]
+                candidates = self.order[starts[has] + j]
+                distances = np.linalg.norm(self.points[candidates] - queries[query_rows], axis=1)
+                better = (distances <= radius) & (distances < best_distances[query_rows])
+
+                best[query_rows[better]] = candidates[better]
+                best_distances[query_rows[better]] = distances[better]
+
+        return best, best_distances
+
+
+def mean_edge_length(points, edges, max_samples=65536):
+    """
+    頂点インデックスの組 edges (k, 2) の平均の長さ. 探索範囲や許容誤差の基準に使う
+    多ければ max_samples 本程度に間引いて見積もる. エッジが無いか長さが 0 なら 1e-9
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+
+    if len(edges) == 0:
+        return 1e-9
+
+    sampled = edges[::max(1, len(edges) // max_samples)]
+    lengths = np.linalg.norm(points[sampled[:, 0]] - points[sampled[:, 1]], axis=1)
+
+    return max(float(lengths.mean()), 1e-9)
+
+
+def triangle_edges(triangles):
+    """三角形 (t, 3) の三辺を頂点インデックスの組 (3t, 2) にする (共有する辺は重複する)"""
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+
+    return np.stack([triangles, np.roll(triangles, -1, axis=1)], axis=2).reshape(-1, 2)
+
+
+def mirror_map(points, axis=0, tolerance=1e-4):
+    """
+    各点を axis 軸の 0 の平面で鏡映した位置から tolerance 以内で一番近い点のインデックスの配列
+    対応する点が無ければ -1. 平面上の点は自分自身に対応する
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    mirrored = points.copy()
+    mirrored[:, axis] *= -1.0
+
+    mirror, _ = PointGrid(points).nearest_within(mirrored, tolerance)
+
+    return mirror
+
+
+def distances_to_points(points, targets, chunk_size=4096):
+    """
+    points の各点から targets の最も近い点までの距離
+    targets が少ない (カーブのサンプル点など) 場合向けの総当たり
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    targets = np.asarray(targets, dtype=float).reshape(-1, 3)
+    result = np.empty(len(points))
+
+    for start in range(0, len(points), chunk_size):
+        block = points[start:start + chunk_size]
+        d2 = ((block[:, None, :] - targets[None, :, :]) ** 2).sum(axis=2)
+        result[start:start + chunk_size] = np.sqrt(d2.min(axis=1))
+
+    return result
+
+
+def closest_points_on_triangles(p, a, b, c):
+    """
+    点 p から三角形 (a, b, c) 上の最も近い点を一括で求める. 引数はすべて (m, 3) の配列
+    頂点, 辺, 内部のどの領域に最近点があるかを重心座標の符号で判定する
+    """
+    ab = b - a
+    ac = c - a
+    ap = p - a
+    bp = p - b
+    cp = p - c
+
+    d1 = (ab * ap).sum(axis=1)
+    d2 = (ac * ap).sum(axis=1)
+    d3 = (ab * bp).sum(axis=1)
+    d4 = (ac * bp).sum(axis=1)
+    d5 = (ab * cp).sum(axis=1)
+    d6 = (ac * cp).sum(axis=1)
+
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    def ratio(numerator, denominator):
+        return numerator / np.where(denominator == 0.0, 1.0, denominator)
+
+    # 内部. 優先度の低い領域から順に上書きする
+    denom = va + vb + vc
+    result = a + ab * ratio(vb, denom)[:, None] + ac * ratio(vc, denom)[:, None]
+
+    regions = [
+        # 辺 bc
+        ((va <= 0.0) & (d4 - d3 >= 0.0) & (d5 - d6 >= 0.0),
+         lambda: b + (c - b) * ratio(d4 - d3, (d4 - d3) + (d5 - d6))[:, None]),
+        # 辺 ac
+        ((vb <= 0.0) & (d2 >= 0.0) & (d6 <= 0.0), lambda: a + ac * ratio(d2, d2 - d6)[:, None]),
+        # 頂点 c
+        ((d6 >= 0.0) & (d5 <= d6), lambda: c),
+        # 辺 ab
+        ((vc <= 0.0) & (d1 >= 0.0) & (d3 <= 0.0), lambda: a + ab * ratio(d1, d1 - d3)[:, None]),
+        # 頂点 b
+        ((d3 >= 0.0) & (d4 <= d3), lambda: b),
+        # 頂点 a
+        ((d1 <= 0.0) & (d2 <= 0.0), lambda: a),
+    ]
+
+    for mask, points in regions:
+        if np.any(mask):
+            result[mask] = points()[mask]
+
+    return result
+
+
+class TriangleGrid(object):
+    """
+    一様グリッドによる三角形のインデックス
+    各三角形をバウンディングボックスが重なるすべてのセルに登録し, セル番号順に並べておく
+
+    points (n, 3) の頂点座標
+    triangles (t, 3) の三角形の頂点インデックス
+    cell_size セルの一辺. None なら三角形のバウンディングボックスの平均の大きさにする
+    """
+
+    def __init__(self, points, triangles, cell_size=None):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+
+        if len(self.triangles) == 0:
+            raise ValueError("empty triangle set")
+
+        corners = self.points[self.triangles]
+        lower = corners.min(axis=1)
+        upper = corners.max(axis=1)
+        self.lower = lower.min(axis=0)
+        extent = np.maximum(upper.max(axis=0) - self.lower, 1e-9)
+
+        if cell_size is None:
+            cell_size = (upper - lower).max(axis=1).mean()
+
+        self.cell_size = max(float(cell_size), float(extent.max()) * 1e-6)
+        self.dims = np.floor(extent / self.cell_size).astype(np.int64) + 1
+
+        # 三角形毎のセル範囲を展開して (セル, 三角形) の組を作る
+        lower_cells = self._cells(lower)
+        spans = self._cells(upper) - lower_cells + 1
+        counts = spans.prod(axis=1)
+        triangle_ids = np.repeat(np.arange(len(self.triangles)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        span = spans[triangle_ids]
+        cells = lower_cells[triangle_ids] + np.stack(
+            [local % span[:, 0], (local // span[:, 0]) % span[:, 1], local // (span[:, 0] * span[:, 1])], axis=1)
+
+        keys = self._keys(cells)
+        order = np.argsort(keys)
+        self.sorted_keys = keys[order]
+        self.cell_triangles = triangle_ids[order]
+
+    def _cells(self, points):
+        cells = np.floor((np.asarray(points, dtype=float) - self.lower) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.dims - 1)
+
+    def _keys(self, cells):
+        return cells[..., 0] + self.dims[0] * (cells[..., 1] + self.dims[1] * cells[..., 2])
+
+    def _shell_pairs(self, queries, cells, ring, limits):
+        """
+        各点のセルからチェビシェフ距離がちょうど ring のセルに登録された三角形との組
+        点からセルまでの距離が limits (その点で見つかっている最短距離) 以上のセルは調べない
+        戻り値は (queries の行番号の配列, 三角形インデックスの配列)
+        """
+        steps = np.arange(-ring, ring + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+        offsets = offsets[np.abs(offsets).max(axis=1) == ring]
+
+        shell = cells[:, None, :] + offsets[None, :, :]
+        cell_lower = self.lower + shell * self.cell_size
+        gap = np.maximum(np.maximum(cell_lower - queries[:, None, :], queries[:, None, :] - cell_lower - self.cell_size), 0.0)
+        near = np.linalg.norm(gap, axis=2) < limits[:, None]
+        valid = np.all((shell >= 0) & (shell < self.dims), axis=2) & near
+        rows = np.nonzero(valid)[0]
+        keys = self._keys(shell[valid])
+
+        starts = np.searchsorted(self.sorted_keys, keys, side="left")
+        counts = np.searchsorted(self.sorted_keys, keys, side="right") - starts
+        positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - starts, counts)
+
+        return np.repeat(rows, counts), self.cell_triangles[positions]
+
+    def closest_points(self, queries, max_distance=None, chunk_size=4096):
+        """
+        各点に最も近い三角形上の点
+        点のセルから外側へ一周ずつ調べ, 調べた範囲の外より近い点が見つかった点から確定する
+        max_distance これより遠い三角形は探さない. 見つからなかった点は元の座標, 距離 inf, 三角形 -1 になる
+                     None なら必ず見つけるが, メッシュから遠い点ほど調べるセルが増えて遅くなる
+        戻り値は (最近点の (m, 3) 配列, 距離の配列, 三角形インデックスの配列)
+        """
+        queries = np.asarray(queries, dtype=float).reshape(-1, 3)
+        closest = np.empty_like(queries)
+        distances = np.empty(len(queries))
+        triangle_ids = np.empty(len(queries), dtype=np.int64)
+
+        for start in range(0, len(queries), chunk_size):
+            block = slice(start, start + chunk_size)
+            closest[block], distances[block], triangle_ids[block] = self._closest_block(queries[block], max_distance)
+
+        return closest, distances, triangle_ids
+
+    def _closest_block(self, queries, max_distance=None):
+        count = len(queries)
+        best_points = queries.copy()
+        best_distances = np.full(count, np.inf if max_distance is None else float(max_distance))
+        best_triangles = np.full(count, -1, dtype=np.int64)
+
+        cells = self._cells(queries)
+
+        # 点から自分のセルの壁までの最短距離. 範囲外の点は 0 とみなす
+        offset = queries - self.lower - cells * self.cell_size
+        margin = np.clip(np.minimum(offset, self.cell_size - offset).min(axis=1), 0.0, None)
+
+        pending = np.arange(count)
+        ring = 0
+
+        while len(pending):
+            rows, candidates = self._shell_pairs(queries[pending], cells[pending], ring, best_distances[pending])
+
+            if len(rows):
+                targets = pending[rows]
+                corners = self.points[self.triangles[candidates]]
+                points = closest_points_on_triangles(queries[targets], corners[:, 0], corners[:, 1], corners[:, 2])
+                distances = np.linalg.norm(points - queries[targets], axis=1)
+
+                # 点毎に一番近い組を選ぶ
+                order = np.lexsort((distances, targets))
+                first = order[np.r_[True, np.diff(targets[order]) != 0]]
+                better = distances[first] < best_distances[targets[first]]
+                chosen = first[better]
+
+                best_points[targets[chosen]] = points[chosen]
+                best_distances[targets[chosen]] = distances[chosen]
+                best_triangles[targets[chosen]] = candidates[chosen]
+
+            covered = np.all(cells[pending] - ring <= 0, axis=1) & np.all(cells[pending] + ring >= self.dims - 1, axis=1)
+            done = covered | (best_distances[pending] <= ring * self.cell_size + margin[pending])
+            pending = pending[~done]
+            ring += 1
+
+        best_distances[best_triangles < 0] = np.inf
+
+        return best_points, best_distances, best_triangles
@@ -0,0 +1,269 @@
+#! python
+# coding:utf-8
+"""
+カーブとエッジ列の同期モード
+
+    カーブが変更されたら keep ratio mode で頂点を更新する
+    頂点が変更されたらカーブの CV を頂点列に合わせて作り直す
+
+拘束されたカーブとメッシュのシェイプにだけ dirty コールバックを登録し,
+変更があったノードを溜めておいて evalDeferred でアイドル時に一回だけまとめて更新する
+更新はトポロジーと弧長テーブルのキャッシュを使い, 変更のあったエッジ列だけを処理する
+メッシュのトポロジーは同期中は確認済みのままにし, トポロジー変更のコールバックが来た時だけ確認し直す
+頂点座標はメッシュ全体ではなくエッジ列の頂点だけを読む
+"""
+
+import numpy as np
+
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+
+from . import core
+from . import backend
+from . import binding
+from . import curvemath as cm
+from . import instrument
+
+
+def _shapeObject(node):
+    selection = om.MSelectionList()
+    selection.add(node)
+    dag_path = selection.getDagPath(0)
+    dag_path.extendToShape()
+
+    return dag_path.node()
+
+
+class SyncSession(object):
+    """
+    同期モードの状態
+
+    bindings カーブ名 -> Binding
+    chains カーブ名 -> (メッシュ名, 並べ替え済み頂点インデックス)
+    last_points カーブ名 -> 最後に同期した時点の頂点列の座標
+    dirty_curves, dirty_meshes 次の更新で処理するノード
+    topology_changed 次の更新で頂点列を求め直すメッシュ
+    """
+
+    def __init__(self, curves=None, keep_ratio_mode=True):
+        self.keep_ratio_mode = keep_ratio_mode
+        self.bindings = {}
+        self.chains = {}
+        self.last_points = {}
+        self.curves_by_mesh = {}
+        self.callback_ids = []
+        self.dirty_curves = set()
+        self.dirty_meshes = set()
+        self.topology_changed = set()
+        self.pending = False
+        self.applying = False
+
+        for curve, _, edges_str in core.getCurveStates(curves):
+            self.bindings[curve] = binding.decode(edges_str)
+            self.curves_by_mesh.setdefault(self.bindings[curve].mesh, []).append(curve)
+
+    def start(self):
+        """コールバックを登録して同期を始める"""
+        core.topology_cache.pin(self.curves_by_mesh)
+
+        with core.topology_cache.batch():
+            self.updateChains(list(self.bindings))
+
+        for curve in self.bindings:
+            self.callback_ids.append(om.MNodeMessage.addNodeDirtyPlugCallback(
+                _shapeObject(curve), self.onCurveDirty, curve))
+
+        for mesh in self.curves_by_mesh:
+            shape = _shapeObject(mesh)
+            self.callback_ids.append(om.MNodeMessage.addNodeDirtyPlugCallback(shape, self.onMeshDirty, mesh))
+            self.callback_ids.append(om.MPolyMessage.addPolyTopologyChangedCallback(shape, self.onTopologyChanged, mesh))
+
+        for message in (om.MSceneMessage.kBeforeNew, om.MSceneMessage.kBeforeOpen):
+            self.callback_ids.append(om.MSceneMessage.addCallback(message, self.onSceneChange))
+
+    def stop(self):
+        """コールバックを解除して同期を止める"""
+        if self.callback_ids:
+            om.MMessage.removeCallbacks(self.callback_ids)
+
+        self.callback_ids = []
+        self.dirty_curves.clear()
+        self.dirty_meshes.clear()
+        self.topology_changed.clear()
+        core.topology_cache.unpin(self.curves_by_mesh)
+
+    def orderChains(self, curves):
+        """
+        エッジ列の頂点列を求め直し, 求められたカーブのリストを返す
+        一本に繋がらなくなったエッジ列のカーブは頂点からの更新をしない
+        """
+        ordered = []
+
+        for curve in curves:
+            try:
+                mesh, indices = core.getOrderedVertices(self.bindings[curve], curve)
+
+            except ValueError:
+                self.chains.pop(curve, None)
+                self.last_points.pop(curve, None)
+                continue
+
+            self.chains[curve] = (mesh, indices)
+            ordered.append(curve)
+
+        return ordered
+
+    def updateChains(self, curves):
+        """エッジ列の頂点列と現在の座標を覚えておく. 座標はメッシュ毎にエッジ列の頂点だけまとめて読む"""
+        curves = self.orderChains(curves)
+
+        with instrument.phase("read"):
+            points = core.readChainPoints([self.chains[curve] for curve in curves])
+
+        self.last_points.update(zip(curves, points))
+
+    # コールバック
+    # dirty はドラッグ中に何度も呼ばれるので印を付けて更新を予約するだけにする
+
+    def onCurveDirty(self, node, plug, curve):
+        if not self.applying:
+            self.dirty_curves.add(curve)
+            self.schedule()
+
+    def onMeshDirty(self, node, plug, mesh):
+        if not self.applying:
+            self.dirty_meshes.add(mesh)
+            self.schedule()
+
+    def onTopologyChanged(self, node, mesh):
+        # 頂点番号が変わるので次の更新でトポロジーを確認して頂点列を求め直す
+        core.topology_cache.invalidate(mesh)
+        self.topology_changed.add(mesh)
+        self.dirty_meshes.add(mesh)
+        self.schedule()
+
+    def onSceneChange(self, *args):
+        stop()
+
+    def schedule(self):
+        """次のアイドル時の更新を一回だけ予約する"""
+        if not self.pending:
+            self.pending = True
+            cmds.evalDeferred(self.flush, lowestPriority=True)
+
+    # 更新
+
+    def flush(self):
+        """溜まった変更をまとめて反映する"""
+        self.pending = False
+
+        if not self.callback_ids:
+            return
+
+        curves = sorted(self.dirty_curves)
+        meshes = sorted(self.dirty_meshes)
+        changed = sorted(self.topology_changed)
+        self.dirty_curves.clear()
+        self.dirty_meshes.clear()
+        self.topology_changed.clear()
+
+        self.applying = True
+
+        try:
+            # 同期中のメッシュは pin してあるので, トポロジーの確認はコールバックが来たメッシュだけで行われる
+            with instrument.operation("sync"), core.topology_cache.batch():
+                for mesh in changed:
+                    self.orderChains(self.curves_by_mesh.get(mesh, []))
+
+                # カーブが変更された方を優先してエッジ列をカーブに合わせる
+                if curves:
+                    core.fitCurves(curves, self.keep_ratio_mode, force=True, workers=1)
+                    self.updateChains(curves)
+
+                self.regenerateCurves(meshes, skip=set(curves))
+
+        finally:
+            self.applying = False
+
+    def regenerateCurves(self, meshes, skip=()):
+        """
+        meshes 上のエッジ列のうち頂点が動いたものだけカーブの CV を作り直す
+        ノット列と CV 数は変えず, 頂点列を最小二乗近似した CV で置き換える
+        """
+        mesh_backend = backend.get_backend()
+        record = backend.CurvesRecord(mesh_backend)
+        curves = [curve for mesh in meshes for curve in self.curves_by_mesh.get(mesh, [])
+                  if curve not in skip and curve in self.chains]
+
+        with instrument.phase("read"):
+            chain_points = core.readChainPoints([self.chains[curve] for curve in curves])
+
+        for curve, points in zip(curves, chain_points):
+            if np.array_equal(points, self.last_points.get(curve)):
+                continue
+
+            self.last_points[curve] = points
+
+            with instrument.curve(curve), instrument.phase("rebuild"):
+                cvs, knots, degree = core.getCurveData(curve)
+
+                if cm.is_periodic(cvs, knots, degree):
+                    new_cvs = self.fitLoop(points, cvs, knots, degree)
+
+                else:
+                    # カーブの向きに頂点列を合わせる
+                    if np.linalg.norm(points[-1] - cvs[0]) < np.linalg.norm(points[0] - cvs[0]):
+                        points = points[::-1]
+
+                    new_cvs, _ = cm.fit_bspline(points, 0, degree, knots=knots)
+
+                record.add(curve, cvs, new_cvs)
+
+        if record.entries:
+            with instrument.phase("writeback"):
+                mesh_backend.commit(record)
+
+
+    def fitLoop(self, points, cvs, knots, degree):
+        """
+        閉じた頂点列を周期カーブのノット列のまま近似し直す
+        カーブ上の継ぎ目と向きは今のカーブに合わせ, 頂点列の始点からずらさない
+        """
+        table = core.arc_length_cache.get(cvs, knots, degree)
+        ratios = cm.chord_ratios(points, closed=True)
+        seam, backward = cm.loop_alignment(table, points, ratios)
+        params = seam - ratios if backward else seam + ratios
+
+        new_cvs, _ = cm.fit_periodic_bspline(points, 0, degree, params=params, knots=knots)
+
+        return new_cvs
+
+
+_session = None
+
+
+def start(curves=None, keep_ratio_mode=True):
+    """
+    同期モードを開始する
+    curves 同期するカーブ. None ならシーン内のこのツールのカーブすべて
+    """
+    global _session
+    stop()
+
+    _session = SyncSession(curves, keep_ratio_mode)
+    _session.start()
+
+    return _session
+
+
+def stop():
+    """同期モードを終了する"""
+    global _session
+
+    if _session is not None:
+        _session.stop()
+        _session = None
+
+
+def isRunning():
+    return _session is not None
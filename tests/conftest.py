@@ -0,0 +1,36 @@
+#! python
+# coding:utf-8
+"""
+テスト共通のフィクスチャ
+
+パッケージ全体を読み込むテストは bench.Harness で偽の maya.cmds / OpenMaya / nnutil を組み込んでから読み込み,
+backend には bench の FakeBackend を使う
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench
+
+
+@pytest.fixture(scope="session")
+def _session_harness():
+    return bench.Harness()
+
+
+@pytest.fixture
+def harness(_session_harness):
+    """シーンとキャッシュを空にした Harness"""
+    _session_harness.reset()
+
+    return _session_harness
+
+
+@pytest.fixture
+def package(harness):
+    """偽モジュールの上で読み込んだパッケージ"""
+    return harness.package
@@ -0,0 +1,136 @@
+#! python
+# coding:utf-8
+"""
+backend.PointWriter と書き込みレコードのテスト (bench の FakeBackend を使う)
+"""
+
+import numpy as np
+
+
+def make_meshes(harness):
+    scene = harness.scene
+    scene.add_strip_mesh("pStripA", 3, 10)
+    scene.add_strip_mesh("pStripB", 3, 10)
+
+    return scene.meshes["pStripA"]["points"].copy(), scene.meshes["pStripB"]["points"].copy()
+
+
+def test_point_writer_groups_writes_per_mesh(harness, package):
+    before_a, before_b = make_meshes(harness)
+    writer = package.backend.PointWriter(harness.backend)
+
+    writer.add_indices("pStripA", [1, 2], [[1.0, 1.0, 1.0], [2.0, 2.0, 2.0]])
+    writer.add(["pStripB.vtx[3]", "pStripA.vtx[5]"], [[3.0, 3.0, 3.0], [5.0, 5.0, 5.0]])
+    # 同じ頂点は後から追加した座標を使う
+    writer.add_indices("pStripA", [2], [[4.0, 4.0, 4.0]])
+
+    assert sorted(writer.moves) == ["pStripA", "pStripB"]
+    assert sorted(writer.moves["pStripA"]) == [1, 2, 5]
+
+    harness.backend.calls.clear()
+    writer.flush()
+
+    # 書き込みはメッシュ毎に一回
+    assert harness.backend.calls["set_points"] == 2
+    assert harness.backend.calls["commit"] == 1
+    assert writer.moves == {}
+
+    points_a = harness.scene.meshes["pStripA"]["points"]
+    assert np.allclose(points_a[[1, 2, 5]], [[1.0, 1.0, 1.0], [4.0, 4.0, 4.0], [5.0, 5.0, 5.0]])
+    assert np.allclose(np.delete(points_a, [1, 2, 5], axis=0), np.delete(before_a, [1, 2, 5], axis=0))
+    assert np.allclose(harness.scene.meshes["pStripB"]["points"][3], [3.0, 3.0, 3.0])
+    assert np.allclose(np.delete(harness.scene.meshes["pStripB"]["points"], 3, axis=0), np.delete(before_b, 3, axis=0))
+
+
+def test_point_writer_flush_without_moves_does_nothing(harness, package):
+    make_meshes(harness)
+    writer = package.backend.PointWriter(harness.backend)
+
+    writer.flush()
+
+    assert sum(harness.backend.calls.values()) == 0
+
+
+def test_points_record_keeps_before_and_after(harness, package):
+    before_a, _ = make_meshes(harness)
+    records = []
+    harness.backend.commit = lambda record: (records.append(record), record.redo())
+    writer = package.backend.PointWriter(harness.backend)
+
+    writer.add_indices("pStripA", [4, 7], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    writer.flush()
+
+    (mesh, indices, before, after), = records[0].entries
+    assert mesh == "pStripA"
+    assert np.array_equal(indices, [4, 7])
+    assert np.allclose(before, before_a[[4, 7]])
+    assert np.allclose(after, [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+
+
+def test_points_record_undo_redo_restores_positions(harness, package):
+    before_a, before_b = make_meshes(harness)
+    records = []
+    harness.backend.commit = lambda record: (records.append(record), record.redo())
+    writer = package.backend.PointWriter(harness.backend)
+
+    writer.add_indices("pStripA", [0, 9], [[1.0, 1.0, 1.0], [2.0, 2.0, 2.0]])
+    writer.add_indices("pStripB", [5], [[3.0, 3.0, 3.0]])
+    writer.flush()
+    after_a = harness.scene.meshes["pStripA"]["points"].copy()
+    after_b = harness.scene.meshes["pStripB"]["points"].copy()
+
+    records[0].undo()
+    assert np.allclose(harness.scene.meshes["pStripA"]["points"], before_a)
+    assert np.allclose(harness.scene.meshes["pStripB"]["points"], before_b)
+
+    records[0].redo()
+    assert np.allclose(harness.scene.meshes["pStripA"]["points"], after_a)
+    assert np.allclose(harness.scene.meshes["pStripB"]["points"], after_b)
+
+
+def test_point_writer_after_flush_reads_back_written_points(harness, package):
+    make_meshes(harness)
+    writer = package.backend.PointWriter(harness.backend)
+    results = []
+
+    writer.add_indices("pStripA", [6, 2], [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+    writer.after_flush(lambda written: results.append(written("pStripA", [2, 6])))
+    writer.flush()
+
+    # FakeScene は Maya と同じく float32 で持つので, 読み直した値は float32 に丸めた座標になる
+    expected = np.array([[0.4, 0.5, 0.6], [0.1, 0.2, 0.3]], dtype=np.float32).astype(float)
+    assert np.array_equal(results[0], expected)
+
+
+def test_pnts_key_values_offset_current_tweaks(package):
+    rng = np.random.default_rng(21)
+    base = rng.normal(size=(4, 3))
+    tweaks = rng.normal(size=(4, 3)) * 0.1
+    current = base + tweaks
+
+    # 回転, 不均一スケール, 移動を含むワールド行列 (行ベクトル形式)
+    angle = 0.7
+    rotation = np.array([[np.cos(angle), np.sin(angle), 0.0], [-np.sin(angle), np.cos(angle), 0.0], [0.0, 0.0, 1.0]])
+    matrix = np.eye(4)
+    matrix[:3, :3] = np.diag([2.0, 1.0, 0.5]) @ rotation
+    matrix[3, :3] = [3.0, -1.0, 4.0]
+    inverse = np.linalg.inv(matrix)
+
+    positions = rng.normal(size=(5, 4, 3))
+    values = package.backend.pnts_key_values(positions, inverse.ravel().tolist(), current, tweaks)
+
+    assert values.shape == (5, 4, 3)
+
+    # 調整値をキーの値にした時のワールド座標がベイクした座標になる
+    world = (base + values) @ matrix[:3, :3] + matrix[3, :3]
+    assert np.allclose(world, positions)
+
+    # 今のワールド座標をキーにすると今の調整値のまま
+    now = current @ matrix[:3, :3] + matrix[3, :3]
+    assert np.allclose(package.backend.pnts_key_values(now[None], inverse, current, tweaks)[0], tweaks)
+
+
+def test_pnts_key_values_without_vertices(package):
+    values = package.backend.pnts_key_values(np.zeros((3, 0, 3)), np.eye(4), np.zeros((0, 3)), [])
+
+    assert values.shape == (3, 0, 3)
@@ -0,0 +1,116 @@
+#! python
+# coding:utf-8
+"""
+bake のフレーム範囲ベイクのテスト (bench の FakeScene と FakeBackend を使う)
+"""
+
+import importlib
+
+import numpy as np
+import pytest
+
+import curvemath as cm
+
+
+@pytest.fixture
+def bake(package):
+    return importlib.import_module(package.__name__ + ".bake")
+
+
+def make_curves(harness, count, cols=12):
+    """count 行のエッジ列とそれぞれから少しずらしたガイドカーブを作る"""
+    scene = harness.scene
+    mesh = scene.add_strip_mesh("pStrip", count + 1, cols)
+    curves = []
+
+    for row in range(count):
+        curve = scene.add_guide_curve(scene.unique_name("NNAEOC_Curve"), mesh, row)
+        harness.core.addAttributes(curve, scene.row_edges(mesh, row))
+        curves.append(curve)
+
+    return mesh, curves
+
+
+def test_bake_matches_fit_per_frame(harness, package, bake):
+    mesh, curves = make_curves(harness, 3)
+    initial = harness.scene.meshes[mesh]["points"].copy()
+    frames = bake.frameRange(0, 4)
+
+    result = bake.bakeCurves(curves, 0, 4)
+
+    # ベイクはシーンの頂点を動かさない
+    assert np.array_equal(harness.scene.meshes[mesh]["points"], initial)
+    assert np.array_equal(result.frames, frames)
+    assert list(result.meshes) == [mesh]
+
+    indices, positions = result.meshes[mesh]
+    assert positions.shape == (len(frames), len(indices), 3)
+    column = dict((index, i) for i, index in enumerate(indices.tolist()))
+
+    for curve in curves:
+        edges = package.binding.decode(harness.scene.attrs[curve]["dst_edges"])
+        job = harness.core._gatherFit(curve, edges, True, force=True)
+        cvs_frames = harness.backend.get_curve_cvs_at_frames(curve, frames)
+        flipped, expected = cm.solve_fit_frames(cvs_frames, job.knots, job.degree, job.points, True, 32, job.ratios)
+        job_indices = job.indices[::-1] if flipped else job.indices
+
+        assert np.allclose(positions[:, [column[index] for index in job_indices.tolist()]], expected)
+
+    # アニメーションしていないフレーム 0 は Fit の結果と同じ
+    harness.core.fitCurves(curves, True, force=True)
+    assert np.allclose(harness.scene.meshes[mesh]["points"][indices], positions[0], atol=1e-5)
+
+
+def test_key_bake_writes_keys_in_one_undo(harness, bake):
+    mesh, curves = make_curves(harness, 2)
+    result = bake.bakeCurves(curves, 1, 3)
+    indices, positions = result.meshes[mesh]
+
+    records = []
+    harness.backend.commit = lambda record: (records.append(record), record.redo())
+    harness.backend.calls.clear()
+    bake.keyBake(result)
+
+    assert len(records) == 1
+    assert harness.backend.calls["key_points"] == 1
+
+    keys = harness.scene.keys[mesh]
+    assert sorted(keys) == sorted(indices.tolist())
+
+    for column, index in enumerate(indices.tolist()):
+        assert np.allclose(keys[index], positions[:, column])
+
+    records[0].undo()
+    assert harness.scene.keys[mesh] == {}
+
+    records[0].redo()
+    assert sorted(harness.scene.keys[mesh]) == sorted(indices.tolist())
+
+
+def test_cache_round_trip_and_apply_frame(harness, bake, tmp_path):
+    mesh, curves = make_curves(harness, 2)
+    result = bake.bakeCurves(curves, 1, 5)
+    path = str(tmp_path / "fit_cache.npz")
+
+    bake.saveCache(result, path)
+    loaded = bake.loadCache(path)
+
+    assert np.array_equal(loaded.frames, result.frames)
+    assert loaded.checksums == result.checksums
+
+    assert np.array_equal(loaded.meshes[mesh][0], result.meshes[mesh][0])
+    assert np.array_equal(loaded.meshes[mesh][1], result.meshes[mesh][1])
+
+    # 一番近いフレーム (3) の座標を書き込む
+    indices, positions = loaded.meshes[mesh]
+    bake.applyFrame(loaded, 3.2)
+    assert np.allclose(harness.scene.meshes[mesh]["points"][indices], positions[2], atol=1e-5)
+
+    # トポロジーが変わったメッシュには書き込まない
+    before = harness.scene.meshes[mesh]["points"].copy()
+    loaded.checksums[mesh] = "changed"
+
+    with pytest.raises(ValueError):
+        bake.applyFrame(loaded, 1)
+
+    assert np.array_equal(harness.scene.meshes[mesh]["points"], before)
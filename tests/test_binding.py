@@ -0,0 +1,128 @@
+#! python
+# coding:utf-8
+"""
+binding (dst_edges の文字列形式) のテスト
+"""
+
+import numpy as np
+import pytest
+
+import binding
+
+
+@pytest.mark.parametrize("indices, text", [
+    ([], ""),
+    ([7], "7"),
+    ([3, 4], "3,4"),
+    ([3, 4, 5], "3-5"),
+    ([12, 13, 14, 15, 55], "12-15,55"),
+    ([60, 59, 58, 2, 4, 6], "60-58,2,4,6"),
+    ([0, 1, 2, 1, 0], "0-2,1,0"),
+    ([5, 5, 5], "5,5,5"),
+])
+def test_encode_ranges(indices, text):
+    assert binding.encode_ranges(indices) == text
+    assert np.array_equal(binding.decode_ranges(text), indices)
+    assert binding.decode_ranges(text).dtype.kind == "i"
+
+
+def test_ranges_round_trip_random():
+    rng = np.random.RandomState(0)
+
+    for _ in range(50):
+        runs = [np.arange(start, start + rng.randint(1, 6) * step, step)
+                for start, step in zip(rng.randint(0, 1000, 6), rng.choice([-1, 1], 6))]
+        indices = np.concatenate(runs)
+
+        assert np.array_equal(binding.decode_ranges(binding.encode_ranges(indices)), indices)
+
+
+def test_binding_round_trip():
+    edge_binding = binding.Binding("pSphere1", [12, 13, 14, 40], [11, 12, 13, 14, 41], "10/20/30/abcdef")
+    text = edge_binding.encode()
+
+    assert text == "#2;pSphere1;e=12-14,40;v=11-14,41;t=10/20/30/abcdef"
+
+    decoded = binding.decode(text)
+    assert decoded.mesh == "pSphere1"
+    assert np.array_equal(decoded.edges, edge_binding.edges)
+    assert np.array_equal(decoded.vertices, edge_binding.vertices)
+    assert decoded.checksum == edge_binding.checksum
+
+
+def test_binding_without_vertices():
+    text = binding.Binding("pCube1", [3, 2, 1]).encode()
+    decoded = binding.decode(text)
+
+    assert text == "#2;pCube1;e=3-1"
+    assert decoded.vertices is None and decoded.checksum is None
+
+
+def test_decode_legacy_format():
+    text = "pSphere1.e[12],pSphere1.e[13],pSphere1.e[40],"
+
+    assert binding.is_legacy(text)
+
+    decoded = binding.decode(text)
+    assert decoded.mesh == "pSphere1"
+    assert np.array_equal(decoded.edges, [12, 13, 40])
+    assert decoded.vertices is None
+    assert decoded.edge_components() == ["pSphere1.e[12]", "pSphere1.e[13]", "pSphere1.e[40]"]
+
+
+def test_decode_rejects_newer_version():
+    with pytest.raises(ValueError):
+        binding.decode("#3;pSphere1;e=1-3")
+
+
+@pytest.mark.parametrize("components", [
+    [],
+    ["pSphere1.e[1]", "pCube1.e[2]"],
+    ["pSphere1"],
+])
+def test_from_components_rejects_invalid(components):
+    with pytest.raises(ValueError):
+        binding.from_components(components)
+
+
+def test_migrate_attributes(harness):
+    scene = harness.scene
+    core = harness.core
+    mesh = scene.add_strip_mesh("pStrip", 3, 10)
+    edges = scene.row_edges(mesh, 1)
+    legacy = scene.add_guide_curve("NNAEOC_Curve1", mesh, 1)
+    current = scene.add_guide_curve("NNAEOC_Curve2", mesh, 0)
+    core.addAttributes(current, scene.row_edges(mesh, 0))
+    scene.attrs[legacy][core.attr_name] = ",".join(edges)
+    core.registerCurves([legacy])
+    current_str = scene.attrs[current][core.attr_name]
+
+    assert core.migrateAttributes() == 1
+
+    migrated = binding.decode(scene.attrs[legacy][core.attr_name])
+    assert not binding.is_legacy(scene.attrs[legacy][core.attr_name])
+    assert migrated.edge_components() == edges
+    assert np.array_equal(migrated.vertices, np.arange(10, 20))
+    assert scene.attrs[current][core.attr_name] == current_str
+    assert core.migrateAttributes() == 0
+
+
+def test_add_attributes_keeps_unusable_edges_and_warns(harness):
+    scene = harness.scene
+    core = harness.core
+    scene.add_strip_mesh("pStripA", 3, 10)
+    scene.add_strip_mesh("pStripB", 3, 10)
+    curve = scene.add_guide_curve("NNAEOC_Curve1", "pStripA", 0)
+    edges = scene.row_edges("pStripA", 0)[:2] + scene.row_edges("pStripB", 0)[:2]
+
+    core.addAttributes(curve, edges)
+
+    # 二つのメッシュにまたがるエッジも捨てずにそのまま保存し, 警告する
+    assert scene.attrs[curve][core.attr_name] == ",".join(edges)
+    assert len(scene.warnings) == 1 and curve in scene.warnings[0]
+    assert core.findBrokenCurves([curve]) == [curve]
+
+    # 空の指定は未設定として警告しない
+    core.addAttributes(curve, "")
+    assert scene.attrs[curve][core.attr_name] == ""
+    assert len(scene.warnings) == 1
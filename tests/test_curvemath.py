@@ -0,0 +1,572 @@
+#! python
+# coding:utf-8
+"""
+curvemath の Maya 無しのテスト
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# パッケージの __init__ は Maya を読み込むので curvemath だけを直接読み込む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import curvemath as cm
+
+
+def short_chain(count, origin=(20.0, 11.0, 5.0)):
+    """origin 付近の count 頂点の短いエッジ列"""
+    i = np.arange(count, dtype=float)
+    return np.asarray(origin) + np.stack([i * 0.3, np.sin(i) * 0.1, i * 0.05], axis=1)
+
+
+def assert_near_chain(cvs, points, margin=0.5):
+    """CV が点列の外接箱から margin 以上離れていない"""
+    lower = points.min(axis=0) - margin
+    upper = points.max(axis=0) + margin
+    assert np.all(cvs >= lower) and np.all(cvs <= upper), cvs
+
+
+def cox_de_boor(t, i, p, u):
+    """
+    標準形式のノット列 t の i 番目の p 次基底関数の u での値 (Cox-de Boor の漸化式そのまま)
+    終端 u == t[-1] は最後の 0 でない区間に含める
+    """
+    if p == 0:
+        if t[i] <= u < t[i + 1]:
+            return 1.0
+
+        last = np.nonzero(t < t[-1])[0][-1]
+        return 1.0 if u == t[-1] and i == last else 0.0
+
+    value = 0.0
+
+    if t[i + p] > t[i]:
+        value += (u - t[i]) / (t[i + p] - t[i]) * cox_de_boor(t, i, p - 1, u)
+
+    if t[i + p + 1] > t[i + 1]:
+        value += (t[i + p + 1] - u) / (t[i + p + 1] - t[i + 1]) * cox_de_boor(t, i + 1, p - 1, u)
+
+    return value
+
+
+def reference_points(cvs, knots, degree, params):
+    """全 CV の基底関数の重み付き和で求めたカーブ上の座標"""
+    t = cm.full_knots(knots)
+    basis = np.array([[cox_de_boor(t, i, degree, u) for i in range(len(cvs))] for u in params])
+
+    return basis.dot(cvs)
+
+
+# 非一様なノット列 (Maya 形式) と次数の組
+reference_curves = [
+    (1, [0.0, 0.5, 2.0, 3.0]),
+    (2, [0.0, 0.0, 1.0, 1.5, 4.0, 4.0]),
+    (3, [0.0, 0.0, 0.0, 0.7, 1.0, 2.5, 3.0, 3.0, 3.0]),
+    (3, [0.0, 0.0, 0.0, 1.0, 1.0, 2.0, 3.0, 3.0, 3.0]),
+]
+
+
+@pytest.mark.parametrize("degree, knots", reference_curves)
+def test_basis_functions_match_cox_de_boor(degree, knots):
+    t = cm.full_knots(knots)
+    lo, hi = cm.domain(knots, degree)
+    params = np.concatenate([np.linspace(lo, hi, 23), np.unique(knots)])
+    k, values = cm.basis_functions(knots, degree, params)
+
+    for u, span, span_values in zip(params, k, values):
+        expected = [cox_de_boor(t, i, degree, u) for i in range(span - degree, span + 1)]
+        assert np.allclose(span_values, expected, atol=1e-12), u
+
+    assert np.allclose(values.sum(axis=1), 1.0)
+
+
+def test_basis_functions_uniform_cubic_at_knot():
+    """一様な 3 次の内側のノット上の値は 1/6, 2/3, 1/6, 0"""
+    knots = cm.uniform_knots(6)
+    k, values = cm.basis_functions(knots, 3, [0.5])
+
+    assert np.allclose(values[0], [1.0 / 6.0, 2.0 / 3.0, 1.0 / 6.0, 0.0])
+    assert k[0] == 6
+
+
+@pytest.mark.parametrize("degree, knots", reference_curves)
+def test_evaluate_matches_cox_de_boor(degree, knots):
+    rng = np.random.RandomState(degree + len(knots))
+    cvs = rng.uniform(-5.0, 5.0, (len(knots) - degree + 1, 3))
+    lo, hi = cm.domain(knots, degree)
+    params = np.linspace(lo, hi, 31)
+
+    assert np.allclose(cm.evaluate(cvs, knots, degree, params), reference_points(cvs, knots, degree, params), atol=1e-12)
+
+    # 範囲外は端にクランプする
+    assert np.allclose(cm.evaluate(cvs, knots, degree, [lo - 1.0, hi + 1.0]), [cvs[0], cvs[-1]])
+
+
+def test_evaluate_bezier_midpoint():
+    """1 スパンの 3 次は Bezier 曲線で, 中点は (P0 + 3 P1 + 3 P2 + P3) / 8"""
+    cvs = np.array([[0.0, 0.0, 0.0], [1.0, 2.0, 0.0], [3.0, 2.0, 1.0], [4.0, 0.0, 2.0]])
+    point = cm.evaluate(cvs, [0.0, 0.0, 0.0, 1.0, 1.0, 1.0], 3, [0.5])[0]
+
+    assert np.allclose(point, (cvs[0] + 3.0 * cvs[1] + 3.0 * cvs[2] + cvs[3]) / 8.0)
+
+
+def test_evaluate_frames_matches_evaluate():
+    degree, knots = reference_curves[2]
+    rng = np.random.RandomState(1)
+    cvs_frames = rng.uniform(-5.0, 5.0, (4, len(knots) - degree + 1, 3))
+    params = rng.uniform(0.0, 3.0, (4, 9))
+
+    shared = cm.evaluate_frames(cvs_frames, knots, degree, params[0])
+    per_frame = cm.evaluate_frames(cvs_frames, knots, degree, params)
+
+    for frame, cvs in enumerate(cvs_frames):
+        assert np.allclose(shared[frame], cm.evaluate(cvs, knots, degree, params[0]))
+        assert np.allclose(per_frame[frame], cm.evaluate(cvs, knots, degree, params[frame]))
+
+
+def test_arc_length_table_polyline():
+    """1 次のカーブは折れ線なので長さと弧長の位置が手で求められる (3 + 4 = 7)"""
+    cvs = np.array([[0.0, 0.0, 0.0], [3.0, 0.0, 0.0], [3.0, 4.0, 0.0]])
+    table = cm.ArcLengthTable(cvs, [0.0, 1.0, 2.0], 1)
+
+    assert np.isclose(table.length, 7.0)
+    assert np.allclose(table.params_at([0.0, 3.0 / 7.0, 5.0 / 7.0, 1.0]), [0.0, 1.0, 1.5, 2.0])
+    assert np.allclose(table.points_at([0.0, 1.5 / 7.0, 5.0 / 7.0, 1.0]),
+                       [[0.0, 0.0, 0.0], [1.5, 0.0, 0.0], [3.0, 2.0, 0.0], [3.0, 4.0, 0.0]])
+    assert np.allclose(table.closest_ratios(cvs), [0.0, 3.0 / 7.0, 1.0])
+
+
+def test_arc_length_table_circle():
+    """円を近似した周期カーブの弧長の位置は中心からの角度にほぼ比例する"""
+    angles = np.arange(16) * 2.0 * np.pi / 16
+    circle = np.stack([np.cos(angles), np.sin(angles), np.zeros(16)], axis=1)
+    cvs, knots = cm.fit_periodic_bspline(circle, 16)
+    table = cm.ArcLengthTable(cvs, knots, 3)
+    points = table.points_at(np.linspace(0.0, 1.0, 9)[:-1])
+    point_angles = np.mod(np.arctan2(points[:, 1], points[:, 0]) - np.arctan2(points[0, 1], points[0, 0]), 2.0 * np.pi)
+
+    assert np.isclose(table.length, 2.0 * np.pi, rtol=1e-3)
+    assert np.allclose(point_angles, np.arange(8) * 2.0 * np.pi / 8, atol=1e-3)
+
+
+def test_chord_ratios():
+    points = np.array([[0.0, 0.0, 0.0], [3.0, 0.0, 0.0], [3.0, 4.0, 0.0]])
+    square = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [0.0, 1.0, 0.0]])
+
+    # 閉じると 3 - 4 - 5 の三角形
+    assert np.allclose(cm.chord_ratios(points), [0.0, 3.0 / 7.0, 1.0])
+    assert np.allclose(cm.chord_ratios(points, closed=True), [0.0, 3.0 / 12.0, 7.0 / 12.0])
+    assert np.allclose(cm.chord_ratios(square, closed=True), [0.0, 0.25, 0.5, 0.75])
+
+    # 全長が 0 なら等間隔
+    assert np.allclose(cm.chord_ratios(np.zeros((3, 3))), [0.0, 0.5, 1.0])
+    assert np.allclose(cm.chord_ratios(np.zeros((4, 3)), closed=True), [0.0, 0.25, 0.5, 0.75])
+    assert np.allclose(cm.chord_ratios(np.zeros((1, 3))), [0.0])
+
+
+@pytest.mark.parametrize("degree, knots", reference_curves[1:])
+def test_fit_bspline_reproduces_curve(degree, knots):
+    """カーブ上の点を同じノット列とパラメーターで近似すると元の CV に戻る"""
+    rng = np.random.RandomState(len(knots))
+    cvs = rng.uniform(-5.0, 5.0, (len(knots) - degree + 1, 3))
+    lo, hi = cm.domain(knots, degree)
+    params = np.linspace(0.0, 1.0, 40)
+    points = reference_points(cvs, knots, degree, lo + params * (hi - lo))
+
+    fitted, fitted_knots = cm.fit_bspline(points, 0, degree, params=params, knots=knots)
+
+    assert np.allclose(fitted_knots, knots)
+    assert np.allclose(fitted, cvs, atol=1e-9)
+
+
+def make_fit_jobs(count=12):
+    """solve_fit の引数のタプルのリスト (開いた列と閉じたループを混ぜる)"""
+    rng = np.random.RandomState(3)
+    jobs = []
+
+    for i in range(count):
+        knots = cm.uniform_knots(4)
+        cvs = np.stack([np.linspace(0.0, 5.0, 7), rng.uniform(-1.0, 1.0, 7), rng.uniform(-1.0, 1.0, 7)], axis=1)
+        points = cm.evaluate(cvs, knots, 3, np.sort(rng.uniform(0.0, 1.0, 9))) + rng.normal(0.0, 0.05, (9, 3))
+
+        if i % 3 == 2:
+            angles = np.sort(rng.uniform(0.0, 2.0 * np.pi, 10))
+            points = np.stack([np.cos(angles), np.sin(angles), np.zeros(10)], axis=1) * 2.0
+            cvs, knots = cm.fit_periodic_bspline(points + 0.1, 6)
+            jobs.append((cvs, knots, 3, points, i % 2 == 0, None, 32, None, True))
+        else:
+            jobs.append((cvs, knots, 3, points, i % 2 == 0))
+
+    return jobs
+
+
+def assert_same_fits(results, expected):
+    assert len(results) == len(expected)
+
+    for (flipped, positions, table), (expected_flipped, expected_positions, _) in zip(results, expected):
+        assert flipped == expected_flipped
+        assert np.array_equal(positions, expected_positions)
+        assert table.length > 0.0
+
+
+def test_solve_fits_serial_matches_solve_fit():
+    jobs = make_fit_jobs()
+
+    assert_same_fits(cm.solve_fits(jobs, workers=1), [cm.solve_fit(*args) for args in jobs])
+
+
+def test_solve_fits_thread_pool_matches_serial():
+    jobs = make_fit_jobs()
+
+    assert_same_fits(cm.solve_fits(jobs, workers=4), cm.solve_fits(jobs, workers=1))
+
+
+def test_solve_fits_process_pool_matches_serial():
+    jobs = make_fit_jobs()
+
+    assert_same_fits(cm.solve_fits(jobs, workers=2, processes=True), cm.solve_fits(jobs, workers=1))
+
+
+def test_fit_periodic_bspline_reproduces_curve():
+    knots = cm.periodic_knots(6)
+    rng = np.random.RandomState(6)
+    cvs = rng.uniform(-5.0, 5.0, (6, 3))
+    cvs = np.concatenate([cvs, cvs[:3]])
+    lo, hi = cm.domain(knots, 3)
+    params = np.arange(30) / 30.0
+    points = reference_points(cvs, knots, 3, lo + params * (hi - lo))
+
+    fitted, fitted_knots = cm.fit_periodic_bspline(points, 0, 3, params=params, knots=knots)
+
+    assert cm.is_periodic(fitted, fitted_knots, 3)
+    assert np.allclose(fitted, cvs, atol=1e-9)
+
+    # 継ぎ目をずらしたパラメーター (1.0 を超える値) でも同じ CV になる
+    shifted, _ = cm.fit_periodic_bspline(points, 0, 3, params=params + 1.0, knots=knots)
+    assert np.allclose(shifted, cvs, atol=1e-9)
+
+
+@pytest.mark.parametrize("count", [2, 3, 4, 5, 6])
+def test_fit_bspline_short_chain_stays_on_chain(count):
+    points = short_chain(count)
+    cvs, knots = cm.fit_bspline(points, 4)
+
+    assert len(cvs) == 7
+    assert np.allclose(cvs[0], points[0]) and np.allclose(cvs[-1], points[-1])
+    assert_near_chain(cvs, points)
+
+    # 点が足りなくても点列は通る
+    curve_points = cm.evaluate(cvs, knots, 3, cm.domain(knots, 3)[0] + cm.chord_ratios(points))
+    assert np.allclose(curve_points, points, atol=1e-6)
+
+
+@pytest.mark.parametrize("count", [2, 3, 5])
+def test_fit_bspline_short_chain_with_fixed_knots(count):
+    """同期モード (sync.regenerateCurves) のように今のカーブのノット列のまま少ない頂点で近似し直す"""
+    points = short_chain(count)
+    cvs, _ = cm.fit_bspline(points, 0, 3, knots=cm.uniform_knots(8))
+
+    assert len(cvs) == 11
+    assert_near_chain(cvs, points)
+
+    # 一頂点だけ動かしても CV は点列の近くに留まる
+    moved = points.copy()
+    moved[count // 2] += [0.0, 0.2, 0.0]
+    moved_cvs, _ = cm.fit_bspline(moved, 0, 3, knots=cm.uniform_knots(8))
+    assert_near_chain(moved_cvs, moved)
+
+
+def test_fit_periodic_bspline_short_loop_with_fixed_knots():
+    """同期モード (sync.fitLoop) のように継ぎ目をずらしたパラメーターと今のノット列で近似し直す"""
+    angles = np.arange(4) * 2.0 * np.pi / 4
+    points = np.array([20.0, 11.0, 5.0]) + np.stack([np.cos(angles), np.sin(angles), np.zeros(4)], axis=1)
+    params = 0.3 - cm.chord_ratios(points, closed=True)
+    cvs, knots = cm.fit_periodic_bspline(points, 0, 3, params=params, knots=cm.periodic_knots(8))
+
+    assert len(cvs) == 11
+    assert_near_chain(cvs, points, margin=1.0)
+
+
+@pytest.mark.parametrize("count", [3, 4])
+def test_fit_periodic_bspline_small_loop_stays_on_loop(count):
+    angles = np.arange(count) * 2.0 * np.pi / count
+    points = np.array([20.0, 11.0, 5.0]) + np.stack([np.cos(angles), np.sin(angles), np.zeros(count)], axis=1)
+    cvs, knots = cm.fit_periodic_bspline(points, 6)
+
+    assert cm.is_periodic(cvs, knots, 3)
+    assert_near_chain(cvs, points, margin=1.0)
+
+
+def cache_curve(i):
+    """i 毎に形状の違う同じ大きさのカーブ"""
+    knots = cm.uniform_knots(4)
+    cvs = np.stack([np.linspace(0.0, 5.0, 7), np.full(7, float(i)), np.zeros(7)], axis=1)
+
+    return cvs, knots, 3
+
+
+def test_arc_length_cache_hits_and_misses():
+    cache = cm.ArcLengthCache()
+    table = cache.get(*cache_curve(0))
+
+    assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+    assert cache.get(*cache_curve(0)) is table
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 形状が変われば別のテーブル
+    assert cache.get(*cache_curve(1)) is not table
+    assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+    assert cache.nbytes == sum(t.nbytes for t in cache.tables.values())
+
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache), cache.nbytes) == (0, 0, 0, 0)
+
+
+def test_arc_length_cache_evicts_least_recently_used():
+    table_bytes = cm.ArcLengthTable(*cache_curve(0)).nbytes
+    cache = cm.ArcLengthCache(max_bytes=table_bytes * 3)
+    tables = [cache.get(*cache_curve(i)) for i in range(3)]
+
+    # 0 を使い直すと一番古いのは 1 になる
+    assert cache.get(*cache_curve(0)) is tables[0]
+
+    cache.get(*cache_curve(3))
+
+    assert len(cache) == 3
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.find(*cache_curve(1))[1] is None
+    assert cache.find(*cache_curve(0))[1] is tables[0]
+    assert cache.find(*cache_curve(2))[1] is tables[2]
+
+    # 上限を超えて詰め込んでも上限を超えない
+    for i in range(4, 20):
+        cache.get(*cache_curve(i))
+        assert cache.nbytes <= cache.max_bytes
+
+    assert len(cache) == 3
+    assert cache.nbytes == sum(t.nbytes for t in cache.tables.values())
+
+
+def test_arc_length_cache_add_replaces_same_key():
+    cache = cm.ArcLengthCache()
+    key, table = cache.find(*cache_curve(0))
+    assert table is None
+
+    first = cm.ArcLengthTable(*cache_curve(0))
+    second = cm.ArcLengthTable(*cache_curve(0))
+    cache.add(key, first)
+    cache.add(key, second)
+
+    assert len(cache) == 1
+    assert cache.nbytes == second.nbytes
+    assert cache.get(*cache_curve(0)) is second
+
+
+def polygon(count, radius=2.0, origin=(1.0, -3.0, 0.5)):
+    """xy 平面上の正 count 角形の頂点 (始点は繰り返さない)"""
+    angles = 2 * np.pi * np.arange(count) / count
+    return np.asarray(origin) + radius * np.stack([np.cos(angles), np.sin(angles), np.zeros(count)], axis=1)
+
+
+def test_smooth_polylines_pins_open_ends():
+    rng = np.random.default_rng(3)
+    first = rng.normal(size=(7, 3))
+    second = rng.normal(size=(5, 3))
+    points = np.concatenate([first, second])
+    offsets = [0, 7, 12]
+
+    smoothed = cm.smooth_polylines(points, offsets, iterations=5)
+
+    pinned = [0, 6, 7, 11]
+    assert np.array_equal(smoothed[pinned], points[pinned])
+    assert not np.allclose(smoothed[1:6], points[1:6])
+
+    # 点列毎に独立してスムースされる
+    alone = cm.smooth_polylines(second, [0, 5], iterations=5)
+    assert np.allclose(smoothed[7:], alone)
+
+
+def test_smooth_polylines_closed_loop_has_no_seam():
+    loop = polygon(8) + np.tile([[0.0, 0.0, 0.3], [0.0, 0.0, -0.3]], (4, 1))
+    smoothed = cm.smooth_polylines(loop, [0, 8], iterations=3, closed=[True])
+
+    # 閉じた点列は端を固定せず, 始点をずらしても同じ結果になる
+    assert not np.allclose(smoothed[0], loop[0])
+    rolled = cm.smooth_polylines(np.roll(loop, 3, axis=0), [0, 8], iterations=3, closed=[True])
+    assert np.allclose(rolled, np.roll(smoothed, 3, axis=0))
+
+    # 正多角形の重心はそのままで, z の凹凸だけがならされる
+    assert np.allclose(smoothed.mean(axis=0), loop.mean(axis=0))
+    assert np.abs(smoothed[:, 2] - 0.5).max() < 0.3
+
+
+def test_smooth_polylines_mixes_open_and_closed():
+    loop = polygon(6)
+    line = short_chain(5)
+    points = np.concatenate([line, loop])
+
+    smoothed = cm.smooth_polylines(points, [0, 5, 11], iterations=2, closed=[False, True])
+
+    assert np.allclose(smoothed[:5], cm.smooth_polylines(line, [0, 5], iterations=2))
+    assert np.allclose(smoothed[5:], cm.smooth_polylines(loop, [0, 6], iterations=2, closed=[True]))
+
+
+def test_smooth_polylines_taubin_does_not_shrink():
+    loop = polygon(16)
+    origin = loop.mean(axis=0)
+    radius = np.linalg.norm(loop - origin, axis=1).mean()
+
+    laplacian = cm.smooth_polylines(loop, [0, 16], iterations=10, factor=0.5, closed=[True])
+    taubin = cm.smooth_polylines(loop, [0, 16], iterations=10, factor=0.5, shrink=-0.53, closed=[True])
+
+    laplacian_radius = np.linalg.norm(laplacian - origin, axis=1).mean()
+    taubin_radius = np.linalg.norm(taubin - origin, axis=1).mean()
+
+    assert laplacian_radius < radius * 0.9
+    assert abs(taubin_radius - radius) < radius * 0.01
+
+
+def circle_table(radius=3.0, spans=8, origin=(1.0, -3.0, 0.5)):
+    """円を周期カーブで近似した弧長テーブル"""
+    cvs, knots = cm.fit_periodic_bspline(polygon(64, radius, origin), spans)
+    return cm.ArcLengthTable(cvs, knots, 3, 64)
+
+
+def uneven_loop(radius=3.0, origin=(1.0, -3.0, 0.5), start=0.37):
+    """円周上に不等間隔に並んだ閉じた頂点列 (始点は start 周の位置)"""
+    turns = start + np.array([0.0, 0.05, 0.15, 0.2, 0.35, 0.5, 0.55, 0.7, 0.8, 0.9])
+    angles = 2 * np.pi * turns
+    return np.asarray(origin) + radius * np.stack([np.cos(angles), np.sin(angles), np.zeros(len(turns))], axis=1)
+
+
+def test_fit_periodic_bspline_circle():
+    table = circle_table()
+    points = table.points_at(np.linspace(0.0, 1.0, 50))
+    radius = np.linalg.norm(points - [1.0, -3.0, 0.5], axis=1)
+
+    assert cm.is_periodic(table.cvs, table.knots, 3)
+    assert np.allclose(points[0], points[-1])
+    assert np.allclose(radius, 3.0, atol=5e-3)
+    assert abs(table.length - 6 * np.pi) < 1e-2
+
+
+@pytest.mark.parametrize("backward", [False, True])
+def test_loop_alignment_finds_seam_and_direction(backward):
+    table = circle_table()
+    points = uneven_loop()
+
+    if backward:
+        points = np.roll(points[::-1], 1, axis=0)
+
+    ratios = cm.chord_ratios(points, closed=True)
+    seam, reversed_loop = cm.loop_alignment(table, points, ratios)
+
+    assert reversed_loop == backward
+    assert np.linalg.norm(table.points_at([seam])[0] - points[0]) < 0.05
+
+
+@pytest.mark.parametrize("backward", [False, True])
+def test_target_ratios_closed_puts_vertices_back(backward):
+    table = circle_table()
+    points = uneven_loop()
+
+    if backward:
+        points = points[::-1]
+
+    flipped, ratios = cm.target_ratios(table, points, closed=True)
+
+    # 閉じたループは反転せず, 向きは比率の進む向きで表す
+    assert not flipped
+    assert np.all((ratios >= 0.0) & (ratios < 1.0))
+    assert np.allclose(table.points_at(ratios), points, atol=0.05)
+
+
+def test_target_ratios_closed_even_mode():
+    table = circle_table()
+    points = uneven_loop()
+
+    _, ratios = cm.target_ratios(table, points, keep_ratio_mode=False, closed=True)
+    placed = table.points_at(ratios)
+    gaps = np.linalg.norm(placed - np.roll(placed, -1, axis=0), axis=1)
+
+    # 等間隔に頂点列の順で並ぶ
+    assert np.allclose(gaps, gaps.mean(), rtol=1e-2)
+    assert np.allclose(np.diff(ratios) % 1.0, 0.1)
+
+
+@pytest.mark.parametrize("shift", [0, 3, 7])
+def test_solve_fit_closed_round_trip_with_rotated_ratios(shift):
+    """保存した比率は頂点の始点をずらして (ループの継ぎ目を回して) も同じ配置に戻す"""
+    table = circle_table()
+    points = uneven_loop()
+    stored = cm.chord_ratios(points, closed=True)
+
+    # 頂点列の始点を shift 個回し, 比率も新しい始点を 0 にして回す
+    rotated = np.roll(points, -shift, axis=0)
+    rotated_ratios = (np.roll(stored, -shift) - stored[shift]) % 1.0
+
+    # 頂点が円の上から外れていても保存した比率の位置に戻る
+    moved = rotated * [1.2, 0.9, 1.0] + [0.0, 0.0, 0.4]
+    flipped, targets, _ = cm.solve_fit(table.cvs, table.knots, 3, moved, ratios=rotated_ratios, table=table,
+                                       closed=True)
+
+    assert not flipped
+    assert np.allclose(targets, rotated, atol=0.1)
+    assert np.allclose(cm.chord_ratios(targets, closed=True), rotated_ratios, atol=1e-2)
+
+
+def wave_frames(cvs, count=6):
+    """CV が y 方向に揺れるフレーム毎の CV"""
+    offsets = np.sin(np.arange(count) * 0.4)[:, None] * np.linspace(0.0, 0.8, len(cvs))[None, :]
+    frames = np.repeat(np.asarray(cvs, dtype=float)[None], count, axis=0)
+    frames[:, :, 1] += offsets
+
+    return frames
+
+
+@pytest.mark.parametrize("keep_ratio_mode", [True, False])
+@pytest.mark.parametrize("stored", [False, True])
+def test_solve_fit_frames_matches_solve_fit_per_frame(keep_ratio_mode, stored):
+    rng = np.random.RandomState(21)
+    knots = cm.uniform_knots(5)
+    cvs = np.stack([np.linspace(0.0, 8.0, 8), rng.uniform(-1.0, 1.0, 8), rng.uniform(-1.0, 1.0, 8)], axis=1)
+    points = np.stack([np.linspace(8.2, -0.1, 9), np.zeros(9), np.full(9, 0.3)], axis=1)
+    ratios = np.sort(rng.uniform(0.0, 1.0, 9)) if stored else None
+    cvs_frames = wave_frames(cvs)
+
+    flipped, positions = cm.solve_fit_frames(cvs_frames, knots, 3, points, keep_ratio_mode, 32, ratios)
+
+    assert positions.shape == (len(cvs_frames), len(points), 3)
+
+    for frame, frame_cvs in enumerate(cvs_frames):
+        frame_flipped, expected, _ = cm.solve_fit(frame_cvs, knots, 3, points, keep_ratio_mode, None, 32, ratios)
+
+        assert frame_flipped == flipped
+        assert np.allclose(positions[frame], expected, atol=1e-9)
+
+
+def test_solve_fit_frames_closed_keeps_first_frame_seam():
+    """閉じたループの継ぎ目と向きは最初のフレームで決めて全フレームで使う"""
+    table = circle_table()
+    points = uneven_loop()[::-1]
+    cvs_frames = wave_frames(table.cvs[:-3])
+    cvs_frames = np.concatenate([cvs_frames, cvs_frames[:, :3]], axis=1)
+
+    flipped, positions = cm.solve_fit_frames(cvs_frames, table.knots, 3, points, closed=True)
+    first = cm.ArcLengthTable(cvs_frames[0], table.knots, 3)
+    _, ratios = cm.target_ratios(first, points, closed=True)
+
+    assert not flipped
+
+    for frame, frame_cvs in enumerate(cvs_frames):
+        expected = cm.ArcLengthTable(frame_cvs, table.knots, 3).points_at(ratios)
+        assert np.allclose(positions[frame], expected, atol=1e-9)
+
+    # 最初のフレームは solve_fit と同じ
+    _, expected, _ = cm.solve_fit(cvs_frames[0], table.knots, 3, points, closed=True)
+    assert np.allclose(positions[0], expected, atol=1e-9)
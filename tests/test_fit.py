@@ -0,0 +1,138 @@
+#! python
+# coding:utf-8
+"""
+core の Fit のテスト (bench の FakeScene と FakeBackend を使う)
+"""
+
+import numpy as np
+
+import bench
+
+
+def make_curves(harness, count, cols=12):
+    """count 行のエッジ列とそれぞれから少しずらしたガイドカーブを作る"""
+    scene = harness.scene
+    mesh = scene.add_strip_mesh("pStrip", count + 1, cols)
+    curves = []
+
+    for row in range(count):
+        curve = scene.add_guide_curve(scene.unique_name("NNAEOC_Curve"), mesh, row)
+        harness.core.addAttributes(curve, scene.row_edges(mesh, row))
+        curves.append(curve)
+
+    return mesh, curves
+
+
+class MergingBackend(bench.FakeBackend):
+    """Maya の MSelectionList のように, 同じカーブを一つにまとめてカーブのデータを返すバックエンド"""
+
+    def get_curves_data(self, curves):
+        return bench.FakeBackend.get_curves_data(self, list(dict.fromkeys(curves)))
+
+
+def test_fit_curves_with_duplicate_curves(harness, package):
+    mesh, curves = make_curves(harness, 3)
+    initial = harness.scene.meshes[mesh]["points"].copy()
+
+    harness.core.fitCurves(curves, True, force=True)
+    expected = harness.scene.meshes[mesh]["points"].copy()
+
+    harness.scene.meshes[mesh]["points"][:] = initial
+    merging = MergingBackend(harness.scene, package.topology)
+    package.backend.set_backend(merging)
+
+    # CV を複数選択した時のように同じカーブが重なっても, 各カーブは一度だけ自分の CV で Fit される
+    steps = list(harness.core.iterFitCurves([curves[0], curves[0], curves[1], curves[2], curves[1]], True, force=True))
+
+    assert steps == [(curve, "fitted") for curve in curves]
+    assert np.array_equal(harness.scene.meshes[mesh]["points"], expected)
+
+
+def test_get_curve_states_dedupes(harness):
+    _, curves = make_curves(harness, 2)
+
+    states = harness.core.getCurveStates([curves[1], curves[0], curves[1]])
+
+    assert [curve for curve, _, _ in states] == [curves[1], curves[0]]
+
+
+def test_fit_curves_continues_past_broken_curves(harness):
+    mesh, curves = make_curves(harness, 3)
+    edges = harness.scene.row_edges(mesh, 1)
+
+    # 途中の抜けたエッジ列は一本に繋がらない
+    harness.core.addAttributes(curves[1], edges[:3] + edges[5:])
+    before = harness.scene.meshes[mesh]["points"].copy()
+
+    steps = list(harness.core.iterFitCurves(curves, True, force=True, chunk_size=1))
+
+    assert steps == [(curves[0], "fitted"), (curves[1], "broken"), (curves[2], "fitted")]
+    assert harness.core.findBrokenCurves(curves) == [curves[1]]
+
+    points = harness.scene.meshes[mesh]["points"]
+    cols = harness.scene.meshes[mesh]["cols"]
+    assert np.array_equal(points[cols:2 * cols], before[cols:2 * cols])
+    assert not np.array_equal(points[2 * cols:3 * cols], before[2 * cols:3 * cols])
+
+
+def make_symmetric_curves(harness, rows=5, cols=12):
+    """y = 0 で鏡映の関係になる rows 行の格子 (中央の行は中心線上) と各行のカーブ"""
+    mesh, curves = make_curves(harness, rows - 1, cols)
+    curves.append(harness.scene.add_guide_curve(harness.scene.unique_name("NNAEOC_Curve"), mesh, rows - 1))
+    harness.core.addAttributes(curves[-1], harness.scene.row_edges(mesh, rows - 1))
+    harness.scene.meshes[mesh]["points"][:, 1] -= (rows - 1) * 0.5
+
+    return mesh, curves
+
+
+def test_mirror_targets(harness, monkeypatch):
+    core = harness.core
+    monkeypatch.setattr(core, "mirror_axis", 1)
+    mesh, _ = make_symmetric_curves(harness)
+    cols = harness.scene.meshes[mesh]["cols"]
+    row = lambda r: np.arange(r * cols, (r + 1) * cols)
+
+    # 反対側の行と対応する
+    targets, mask = core._mirrorTargets(mesh, row(0))
+    assert np.array_equal(targets, row(4)) and mask.all()
+
+    # 中心線上の行は自分自身に写るので書き込まない
+    targets, mask = core._mirrorTargets(mesh, row(2))
+    assert np.array_equal(targets, row(2)) and not mask.any()
+
+    # 中心線をまたぐ列は自分の頂点列に写るので書き込まない
+    column = np.arange(5) * cols + 3
+    targets, mask = core._mirrorTargets(mesh, column)
+    assert np.array_equal(targets, column[::-1]) and not mask.any()
+
+
+def test_mirror_targets_skip_unmatched_vertices(harness, monkeypatch):
+    core = harness.core
+    monkeypatch.setattr(core, "mirror_axis", 1)
+    mesh, _ = make_symmetric_curves(harness)
+    cols = harness.scene.meshes[mesh]["cols"]
+
+    # 反対側の頂点を許容誤差より大きく動かすと対応が無くなる
+    harness.scene.meshes[mesh]["points"][4 * cols + 5, 2] += 0.2
+    targets, mask = core._mirrorTargets(mesh, np.arange(cols))
+
+    assert targets[5] == -1 and not mask[5]
+    assert mask.sum() == cols - 1
+
+
+def test_fit_with_symmetry_mirrors_opposite_rows(harness, monkeypatch):
+    core = harness.core
+    monkeypatch.setattr(core, "mirror_axis", 1)
+    mesh, curves = make_symmetric_curves(harness)
+    cols = harness.scene.meshes[mesh]["cols"]
+
+    steps = dict(core.iterFitCurves(curves, True, force=True, symmetry=True))
+
+    # 先に処理した行の反対側の行は Fit せずに写す
+    assert [steps[curve] for curve in curves] == ["fitted", "fitted", "fitted", "mirrored", "mirrored"]
+
+    points = harness.scene.meshes[mesh]["points"].reshape(5, cols, 3)
+
+    for r in range(2):
+        expected = points[r] * [1.0, -1.0, 1.0]
+        assert np.allclose(points[4 - r], expected, atol=1e-6)
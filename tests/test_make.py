@@ -0,0 +1,70 @@
+#! python
+# coding:utf-8
+"""
+core のカーブ生成と作り直しのテスト (bench の FakeScene と FakeBackend を使う)
+"""
+
+import numpy as np
+import pytest
+
+import curvemath as cm
+
+
+def row_points(harness, mesh, row):
+    cols = harness.scene.meshes[mesh]["cols"]
+    return harness.scene.meshes[mesh]["points"][row * cols:(row + 1) * cols].astype(float)
+
+
+def test_make_curve_fits_vertex_chain(harness):
+    mesh = harness.scene.add_strip_mesh("pStrip", 2, 12)
+    edges = harness.scene.row_edges(mesh, 0)
+
+    curve, _ = harness.core.makeCurve(edges, n=3)
+    cvs, knots, degree = harness.backend.get_curve_data(curve)
+    points = row_points(harness, mesh, 0)
+
+    assert (len(cvs), degree) == (6, 3)
+    assert harness.scene.attrs[curve]["dst_edges"]
+    assert np.allclose(cvs[[0, -1]], points[[0, -1]])
+
+    # polyToCurve / rebuildCurve を使わない
+    assert harness.counts["polyToCurve"] == 0
+    assert harness.counts["rebuildCurve"] == 0
+
+
+def test_remake_curve_keeps_name_and_binding(harness):
+    mesh = harness.scene.add_strip_mesh("pStrip", 3, 12)
+    curve, _ = harness.core.makeCurve(harness.scene.row_edges(mesh, 0), n=4)
+    curve = harness.cmds.rename(curve, "NNAEOC_Curve1")
+    edges = harness.scene.row_edges(mesh, 1)
+    edges_str = harness.core.makeBinding(edges).encode()
+    harness.counts.clear()
+
+    remade, remade_edges = harness.core.remakeCurve(curve, edges_str, n=6)
+
+    assert remade == curve
+    assert remade_edges == edges
+    assert harness.scene.attrs[curve]["dst_edges"] == edges_str
+    assert curve in harness.scene.sets[harness.core.getRegistry()]
+    assert len([name for name in harness.scene.curves if name.startswith("NNAEOC_Curve")]) == 1
+    assert harness.counts["polyToCurve"] == 0
+
+    # 作り直したカーブは新しいエッジ列を n スパンで近似している
+    cvs, knots, degree = harness.backend.get_curve_data(curve)
+    points = row_points(harness, mesh, 1)
+    assert (len(cvs), degree) == (9, 3)
+    assert np.allclose(cvs[[0, -1]], points[[0, -1]])
+    assert np.allclose(harness.core.getRatios(curve), cm.chord_ratios(points))
+
+
+def test_remake_curve_keeps_curve_when_edges_are_invalid(harness):
+    mesh = harness.scene.add_strip_mesh("pStrip", 3, 12)
+    curve, edges = harness.core.makeCurve(harness.scene.row_edges(mesh, 0), n=4)
+    before = harness.backend.get_curve_data(curve)[0]
+
+    # 繋がらないエッジ列
+    with pytest.raises(ValueError):
+        harness.core.remakeCurve(curve, edges[:2] + edges[4:6])
+
+    assert np.array_equal(harness.backend.get_curve_data(curve)[0], before)
+    assert harness.scene.attrs[curve]["dst_edges"] == harness.core.makeBinding(edges).encode()
@@ -0,0 +1,106 @@
+#! python
+# coding:utf-8
+"""
+core の Rebuild All / Smooth All のテスト (bench の FakeScene と FakeBackend を使う)
+"""
+
+import numpy as np
+
+import curvemath as cm
+
+
+def make_curves(harness, count, cols=12):
+    """count 本のガイドカーブと, 閉じたカーブ 2 本を作る"""
+    scene = harness.scene
+    mesh = scene.add_strip_mesh("pStrip", count, cols)
+    curves = []
+
+    for row in range(count):
+        curve = scene.add_guide_curve(scene.unique_name("NNAEOC_Curve"), mesh, row)
+        harness.core.addAttributes(curve, scene.row_edges(mesh, row))
+        curves.append(curve)
+
+    for i, radius in enumerate([1.0, 2.5]):
+        angles = 2 * np.pi * np.arange(10) / 10
+        loop = np.stack([radius * np.cos(angles), radius * np.sin(angles), np.full(10, float(i))], axis=1)
+        cvs, knots = cm.fit_periodic_bspline(loop, 5)
+        curve = scene.add_curve(scene.unique_name("NNAEOC_Curve"), cvs, knots, 3)
+        harness.core.addAttributes(curve, scene.row_edges(mesh, i))
+        curves.append(curve)
+
+    return curves
+
+
+def curve_shapes(harness, curves):
+    return [(harness.scene.curves[curve]["cvs"].copy(), harness.scene.curves[curve]["knots"].copy(),
+             harness.scene.curves[curve]["degree"]) for curve in curves]
+
+
+def assert_same_shapes(shapes, expected):
+    assert len(shapes) == len(expected)
+
+    for (cvs, knots, degree), (expected_cvs, expected_knots, expected_degree) in zip(shapes, expected):
+        assert degree == expected_degree
+        assert np.allclose(knots, expected_knots)
+        assert np.allclose(cvs, expected_cvs, atol=1e-9)
+
+
+def test_rebuild_batch_matches_rebuilding_each_curve(harness):
+    curves = make_curves(harness, 4)
+    initial = curve_shapes(harness, curves)
+
+    for curve in curves:
+        harness.core.rebuildCurves([curve], 4)
+
+    expected = curve_shapes(harness, curves)
+
+    for curve, (cvs, knots, degree) in zip(curves, initial):
+        harness.scene.add_curve(curve, cvs, knots, degree)
+
+    harness.backend.calls.clear()
+    assert harness.core.rebuildCurves(curves, 4) == curves
+
+    # カーブのデータは一度にまとめて読む
+    assert harness.backend.calls["get_curves_data"] == 1
+    assert harness.backend.calls["get_curve_data"] == 0
+    assert_same_shapes(curve_shapes(harness, curves), expected)
+
+    # 開いたカーブは 4 スパンの 3 次, 閉じたカーブは周期カーブのまま
+    for curve in curves[:4]:
+        cvs, knots, degree = harness.backend.get_curve_data(curve)
+        assert len(cvs) == 7 and degree == 3 and not cm.is_periodic(cvs, knots, degree)
+
+    for curve in curves[4:]:
+        assert cm.is_periodic(*harness.backend.get_curve_data(curve))
+
+
+def test_rebuild_keeps_curve_ends(harness):
+    curves = make_curves(harness, 3)[:3]
+    ends = [cm.evaluate(cvs, knots, degree, list(cm.domain(knots, degree)))
+            for cvs, knots, degree in curve_shapes(harness, curves)]
+
+    harness.core.rebuildCurves(curves, 2)
+
+    for (cvs, knots, degree), expected in zip(curve_shapes(harness, curves), ends):
+        assert len(cvs) == 5
+        assert np.allclose(cm.evaluate(cvs, knots, degree, list(cm.domain(knots, degree))), expected, atol=1e-6)
+
+
+def test_smooth_batch_reads_curves_at_once(harness):
+    curves = make_curves(harness, 3)
+    initial = curve_shapes(harness, curves)
+
+    harness.backend.calls.clear()
+    assert harness.core.smoothCurves(curves, iterations=2) == curves
+
+    assert harness.backend.calls["get_curves_data"] == 1
+    assert harness.backend.calls["get_curve_data"] == 0
+
+    for (cvs, knots, degree), (before, _, _) in zip(curve_shapes(harness, curves), initial):
+        if cm.is_periodic(cvs, knots, degree):
+            # 重複した CV は重複したまま
+            assert np.allclose(cvs[:degree], cvs[-degree:])
+        else:
+            assert np.allclose(cvs[[0, -1]], before[[0, -1]])
+
+        assert cvs.shape == before.shape
@@ -0,0 +1,283 @@
+#! python
+# coding:utf-8
+"""
+spatial の空間インデックスとエッジ列の推定のテスト
+結果はすべて総当たりで求めた値と比べる
+"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def spatial(package):
+    return package.spatial
+
+
+def random_points(count, seed=0):
+    rng = np.random.RandomState(seed)
+    # 偏りのある点群 (平らな板と小さな塊)
+    plate = rng.uniform([-5.0, -5.0, -0.1], [5.0, 5.0, 0.1], (count // 2, 3))
+    blob = rng.normal([2.0, -1.0, 3.0], 0.3, (count - count // 2, 3))
+
+    return np.concatenate([plate, blob])
+
+
+def query_points(seed=1):
+    rng = np.random.RandomState(seed)
+    # 点群の外側の点も含める
+    return rng.uniform([-8.0, -8.0, -3.0], [8.0, 8.0, 6.0], (60, 3))
+
+
+def brute_distances(points, queries):
+    return np.linalg.norm(queries[:, None, :] - points[None, :, :], axis=2)
+
+
+@pytest.mark.parametrize("cell_size", [None, 0.05, 2.0])
+def test_point_grid_nearest_matches_brute_force(spatial, cell_size):
+    points = random_points(500)
+    queries = np.concatenate([query_points(), points[:10]])
+    grid = spatial.PointGrid(points, cell_size)
+    distances = brute_distances(points, queries)
+
+    for query, row in zip(queries, distances):
+        index, distance = grid.nearest(query)
+        assert np.isclose(distance, row.min())
+        assert np.isclose(row[index], row.min())
+
+
+@pytest.mark.parametrize("radius", [0.0, 0.3, 1.5])
+def test_point_grid_within_matches_brute_force(spatial, radius):
+    points = random_points(500)
+    centers = query_points()[:8]
+    grid = spatial.PointGrid(points)
+    expected = np.flatnonzero((brute_distances(points, centers) <= radius).any(axis=0))
+
+    assert np.array_equal(grid.within(centers, radius), expected)
+
+
+@pytest.mark.parametrize("radius", [0.1, 0.5, 3.0])
+def test_point_grid_nearest_within_matches_brute_force(spatial, radius):
+    points = random_points(500)
+    queries = query_points()
+    grid = spatial.PointGrid(points)
+    distances = brute_distances(points, queries)
+    nearest, nearest_distances = grid.nearest_within(queries, radius)
+
+    for row, index, distance in zip(distances, nearest, nearest_distances):
+        if row.min() > radius:
+            assert index == -1 and np.isinf(distance)
+        else:
+            assert np.isclose(distance, row.min())
+            assert np.isclose(row[index], row.min())
+
+
+def test_point_grid_rejects_empty_points(spatial):
+    with pytest.raises(ValueError):
+        spatial.PointGrid(np.zeros((0, 3)))
+
+
+def add_row_curve(harness, mesh, row, offset=(0.0, 0.2, 0.05)):
+    """row 行目の頂点列を少しずらした位置を通るカーブ"""
+    scene = harness.scene
+    cols = scene.meshes[mesh]["cols"]
+    points = scene.meshes[mesh]["points"][row * cols:(row + 1) * cols] + np.asarray(offset)
+    cvs, knots = harness.package.curvemath.fit_bspline(points, 6)
+
+    return scene.add_curve(scene.unique_name("NNAEOC_Curve"), cvs, knots, 3)
+
+
+def test_estimate_chain_follows_curve(harness):
+    scene = harness.scene
+    core = harness.core
+    mesh = scene.add_strip_mesh("pStrip", 6, 20)
+
+    for row in range(5):
+        curve = add_row_curve(harness, mesh, row)
+        edge_binding = core.estimateChain(curve, mesh)
+
+        assert sorted(edge_binding.edge_components()) == sorted(scene.row_edges(mesh, row))
+
+
+def test_estimate_chain_corridor_matches_whole_mesh_search(harness):
+    """カーブ近傍に絞った最短経路がメッシュ全体を探した最短経路と一致する"""
+    scene = harness.scene
+    core = harness.core
+    cm = harness.package.curvemath
+    mesh = scene.add_strip_mesh("pStrip", 8, 30)
+    curve = add_row_curve(harness, mesh, 3, (0.0, 0.45, 0.2))
+    cache = {}
+    edge_binding = core.estimateChain(curve, mesh, cache)
+
+    data = cache[mesh]
+    curve_data = core.getCurveData(curve)
+    table = cm.ArcLengthTable(*curve_data)
+    sample_count = int(np.clip(table.length / data["mean_edge_length"] * 2, 16, 4096))
+    samples = table.points_at(cm.even_ratios(sample_count))
+    start = int(np.argmin(np.linalg.norm(data["points"] - samples[0], axis=1)))
+    end = int(np.argmin(np.linalg.norm(data["points"] - samples[-1], axis=1)))
+    weights = core._edgeWeights(data, data["index"].edge_vertices, samples)
+    vertices, edges = data["index"].shortest_path(start, end, weights)
+
+    assert np.array_equal(edge_binding.vertices, vertices)
+    assert np.array_equal(edge_binding.edges, edges)
+
+
+def reference_closest_point(p, a, b, c):
+    """三角形の面への射影が内側ならそれ, 外側なら三辺上の最近点のうち一番近いもの"""
+    normal = np.cross(b - a, c - a)
+    projected = p - np.dot(p - a, normal) / np.dot(normal, normal) * normal
+    inside = [np.dot(np.cross(v1 - v0, projected - v0), normal) >= 0.0 for v0, v1 in ((a, b), (b, c), (c, a))]
+
+    if all(inside):
+        return projected
+
+    candidates = []
+
+    for v0, v1 in ((a, b), (b, c), (c, a)):
+        t = np.clip(np.dot(p - v0, v1 - v0) / np.dot(v1 - v0, v1 - v0), 0.0, 1.0)
+        candidates.append(v0 + t * (v1 - v0))
+
+    return min(candidates, key=lambda q: np.linalg.norm(q - p))
+
+
+# 三角形 (0,0,0) (2,0,0) (0,2,0) の各ボロノイ領域の点と最近点
+voronoi_cases = [
+    ("vertex a", [-1.0, -1.0, 0.5], [0.0, 0.0, 0.0]),
+    ("vertex b", [3.0, -0.5, 0.3], [2.0, 0.0, 0.0]),
+    ("vertex c", [-0.3, 3.0, -1.0], [0.0, 2.0, 0.0]),
+    ("edge ab", [0.5, -1.0, 0.2], [0.5, 0.0, 0.0]),
+    ("edge ac", [-1.0, 1.5, 0.0], [0.0, 1.5, 0.0]),
+    ("edge bc", [1.5, 1.5, 0.4], [1.0, 1.0, 0.0]),
+    ("face", [0.4, 0.7, 1.0], [0.4, 0.7, 0.0]),
+    ("face below", [0.4, 0.7, -2.0], [0.4, 0.7, 0.0]),
+]
+
+
+@pytest.mark.parametrize("name, point, expected", voronoi_cases, ids=[case[0] for case in voronoi_cases])
+def test_closest_points_on_triangles_voronoi_regions(spatial, name, point, expected):
+    a, b, c = np.array([[0.0, 0.0, 0.0], [2.0, 0.0, 0.0], [0.0, 2.0, 0.0]])
+    # 三角形の頂点の順を入れ替えても同じ点になる
+    for order in ((a, b, c), (b, c, a), (c, b, a)):
+        result = spatial.closest_points_on_triangles(np.array([point]), *[np.array([v]) for v in order])
+        assert np.allclose(result[0], expected), name
+
+
+def test_closest_points_on_triangles_matches_reference(spatial):
+    rng = np.random.RandomState(2)
+    corners = rng.uniform(-1.0, 1.0, (500, 3, 3))
+    points = rng.uniform(-2.0, 2.0, (500, 3))
+
+    result = spatial.closest_points_on_triangles(points, corners[:, 0], corners[:, 1], corners[:, 2])
+    expected = np.array([reference_closest_point(p, *corner) for p, corner in zip(points, corners)])
+
+    assert np.allclose(result, expected, atol=1e-9)
+
+
+def bumpy_mesh(rows=15, cols=20):
+    """起伏のある格子を三角形分割したメッシュ"""
+    r, c = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    points = np.stack([c * 0.3, r * 0.25, np.sin(c * 0.7) * np.cos(r * 0.5) * 0.4], axis=-1).reshape(-1, 3)
+    ids = np.arange(rows * cols).reshape(rows, cols)
+    a, b, c, d = ids[:-1, :-1].ravel(), ids[:-1, 1:].ravel(), ids[1:, 1:].ravel(), ids[1:, :-1].ravel()
+    triangles = np.concatenate([np.stack([a, b, c], axis=1), np.stack([a, c, d], axis=1)])
+
+    return points, triangles
+
+
+def brute_closest(spatial, points, triangles, queries):
+    """全三角形との最近点を総当たりで求める"""
+    corners = points[triangles]
+    best = []
+
+    for query in queries:
+        candidates = spatial.closest_points_on_triangles(np.repeat(query[None], len(triangles), axis=0),
+                                                         corners[:, 0], corners[:, 1], corners[:, 2])
+        distances = np.linalg.norm(candidates - query, axis=1)
+        best.append(distances.min())
+
+    return np.array(best)
+
+
+@pytest.mark.parametrize("cell_size", [None, 0.1, 1.5])
+def test_triangle_grid_closest_points_matches_brute_force(spatial, cell_size):
+    points, triangles = bumpy_mesh()
+    rng = np.random.RandomState(4)
+    queries = rng.uniform([-1.0, -1.0, -1.5], [6.5, 4.5, 1.5], (80, 3))
+    grid = spatial.TriangleGrid(points, triangles, cell_size)
+
+    closest, distances, triangle_ids = grid.closest_points(queries, chunk_size=32)
+    expected = brute_closest(spatial, points, triangles, queries)
+
+    assert np.allclose(distances, expected)
+    assert np.allclose(np.linalg.norm(closest - queries, axis=1), expected)
+
+    # 返した三角形上の最近点が返した点になっている
+    corners = points[triangles[triangle_ids]]
+    assert np.allclose(spatial.closest_points_on_triangles(queries, corners[:, 0], corners[:, 1], corners[:, 2]), closest)
+
+
+def test_triangle_grid_closest_points_with_max_distance(spatial):
+    points, triangles = bumpy_mesh()
+    rng = np.random.RandomState(5)
+    queries = rng.uniform([-2.0, -2.0, -2.0], [7.5, 5.5, 2.0], (80, 3))
+    grid = spatial.TriangleGrid(points, triangles)
+    expected = brute_closest(spatial, points, triangles, queries)
+
+    closest, distances, triangle_ids = grid.closest_points(queries, max_distance=0.5)
+    found = expected < 0.5
+
+    assert found.any() and not found.all()
+    assert np.allclose(distances[found], expected[found])
+    assert np.all(triangle_ids[found] >= 0)
+    assert np.all(np.isinf(distances[~found]))
+    assert np.all(triangle_ids[~found] == -1)
+    assert np.array_equal(closest[~found], queries[~found])
+
+
+def test_mirror_map_pairs_centre_line_and_unmatched(spatial):
+    rng = np.random.RandomState(6)
+    side = rng.uniform([0.5, -3.0, -3.0], [3.0, 3.0, 3.0], (40, 3))
+    mirrored = side * [-1.0, 1.0, 1.0]
+    centre = np.concatenate([np.zeros((5, 1)), rng.uniform(-3.0, 3.0, (5, 2))], axis=1)
+    lonely = np.array([[1.0, 10.0, 0.0]])
+    points = np.concatenate([side, mirrored, centre, lonely])
+
+    # 反対側の点が許容誤差以内だけずれていても対応させる
+    points[40:80] += rng.uniform(-1e-3, 1e-3, (40, 3))
+    mirror = spatial.mirror_map(points, axis=0, tolerance=0.01)
+
+    assert np.array_equal(mirror[:40], np.arange(40, 80))
+    assert np.array_equal(mirror[40:80], np.arange(40))
+    assert np.array_equal(mirror[80:85], np.arange(80, 85))
+    assert mirror[85] == -1
+
+    # 許容誤差を超えてずれた点は対応させない
+    shifted = points.copy()
+    shifted[40] += [0.0, 0.5, 0.0]
+    mirror = spatial.mirror_map(shifted, axis=0, tolerance=0.01)
+    assert mirror[0] == -1 and mirror[40] == -1
+    assert np.array_equal(mirror[1:40], np.arange(41, 80))
+
+
+@pytest.mark.parametrize("axis", [0, 1, 2])
+def test_mirror_map_axes(spatial, axis):
+    rng = np.random.RandomState(axis)
+    side = rng.uniform(0.5, 2.0, (20, 3))
+    other = side.copy()
+    other[:, axis] *= -1.0
+    mirror = spatial.mirror_map(np.concatenate([side, other]), axis=axis)
+
+    assert np.array_equal(mirror, np.r_[np.arange(20, 40), np.arange(20)])
+
+
+def test_mean_edge_length(spatial):
+    points = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 3.0, 0.0]])
+
+    assert np.isclose(spatial.mean_edge_length(points, [[0, 1], [1, 2]]), 2.0)
+    assert np.isclose(spatial.mean_edge_length(points, spatial.triangle_edges([[0, 1, 2]])), (1.0 + 3.0 + np.sqrt(10.0)) / 3.0)
+    assert spatial.mean_edge_length(points, np.zeros((0, 2), dtype=int)) == 1e-9
+
+    # 多いエッジは間引いても平均は変わらない
+    edges = np.repeat([[0, 1], [1, 2]], 100, axis=0)
+    assert np.isclose(spatial.mean_edge_length(points, edges, max_samples=10), 2.0)
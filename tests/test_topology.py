@@ -0,0 +1,203 @@
+#! python
+# coding:utf-8
+"""
+topology.TopologyIndex.order_chain と TopologyCache のテスト
+"""
+
+import collections
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def topology(package):
+    return package.topology
+
+
+# 0 - 1 - 2 - 3
+# |   |   |   |
+# 4 - 5 - 6 - 7
+grid_edges = np.array([
+    [0, 1], [1, 2], [2, 3],
+    [4, 5], [5, 6], [6, 7],
+    [0, 4], [1, 5], [2, 6], [3, 7],
+])
+
+
+class CountingBackend(object):
+    """TopologyCache が使う範囲だけのバックエンド. チェックサムとエッジの読み込みを数える"""
+
+    def __init__(self):
+        self.edges = {"pGrid": grid_edges.copy()}
+        self.versions = collections.Counter()
+        self.calls = collections.Counter()
+
+    def get_topology_checksum(self, mesh):
+        self.calls["get_topology_checksum"] += 1
+        return "%s/%d" % (mesh, self.versions[mesh])
+
+    def get_edge_vertices(self, mesh):
+        self.calls["get_edge_vertices"] += 1
+        return self.edges[mesh]
+
+
+def test_order_open_chain(topology):
+    index = topology.TopologyIndex(grid_edges)
+
+    # 入力の順や向きに関係なく小さい方の端点から並べる
+    for edges in ([0, 1, 2], [2, 0, 1], [1, 2, 0]):
+        vertices, ordered_edges = index.order_chain(edges, with_edges=True)
+        assert np.array_equal(vertices, [0, 1, 2, 3])
+        assert np.array_equal(ordered_edges, [0, 1, 2])
+
+    # 端点 3 と 4 のうち小さい 3 から
+    vertices, ordered_edges = index.order_chain([6, 0, 1, 2], with_edges=True)
+    assert np.array_equal(vertices, [3, 2, 1, 0, 4])
+    assert np.array_equal(ordered_edges, [2, 1, 0, 6])
+
+    assert np.array_equal(index.order_chain([7]), [1, 5])
+
+
+def test_order_closed_loop(topology):
+    index = topology.TopologyIndex(grid_edges)
+
+    # 外周のループ: 継ぎ目は最小の頂点 0, 隣接頂点 1 と 4 のうち小さい 1 へ向かう
+    vertices, ordered_edges = index.order_chain([9, 5, 2, 6, 1, 4, 3, 0], with_edges=True)
+
+    assert np.array_equal(vertices, [0, 1, 2, 3, 7, 6, 5, 4])
+    assert np.array_equal(ordered_edges, [0, 1, 2, 9, 5, 4, 3, 6])
+    assert len(ordered_edges) == len(vertices)
+
+    # 小さいループ
+    vertices, ordered_edges = index.order_chain([8, 4, 7, 1], with_edges=True)
+    assert np.array_equal(vertices, [1, 2, 6, 5])
+    assert np.array_equal(ordered_edges, [1, 8, 4, 7])
+
+
+@pytest.mark.parametrize("edges", [
+    [0, 1, 7],          # 頂点 1 で分岐
+    [0, 2],             # 間が抜けている
+    [0, 1, 2, 3, 4, 5], # 二本の別々のエッジ列
+    [0, 6, 7, 3, 8, 1], # ループと分岐
+    [],
+    [10],               # 範囲外
+    [-1],
+])
+def test_order_chain_rejects_non_chains(topology, edges):
+    index = topology.TopologyIndex(grid_edges)
+
+    with pytest.raises(ValueError):
+        index.order_chain(edges)
+
+
+def test_shortest_path(topology):
+    index = topology.TopologyIndex(grid_edges)
+    weights = np.ones(len(grid_edges))
+    weights[1] = 10.0
+
+    vertices, edges = index.shortest_path(0, 3, weights)
+    assert np.array_equal(vertices, [0, 1, 5, 6, 2, 3])
+    assert np.array_equal(edges, [0, 7, 4, 8, 2])
+
+    allowed = np.ones(8, dtype=bool)
+    allowed[[5, 6]] = False
+    assert np.array_equal(index.shortest_path(0, 3, weights, allowed)[0], [0, 1, 2, 3])
+
+
+def test_cache_verifies_once_per_batch(topology):
+    cache = topology.TopologyCache()
+    backend = CountingBackend()
+
+    # ブロック外では参照の度に確認する
+    cache.get("pGrid", backend)
+    cache.get("pGrid", backend)
+    assert backend.calls == {"get_topology_checksum": 2, "get_edge_vertices": 1}
+
+    backend.calls.clear()
+
+    with cache.batch():
+        for _ in range(3):
+            with cache.batch():
+                cache.get("pGrid", backend)
+
+    assert backend.calls == {"get_topology_checksum": 1}
+
+    # 次のブロックでは確認し直す
+    backend.calls.clear()
+
+    with cache.batch():
+        cache.get("pGrid", backend)
+
+    assert backend.calls == {"get_topology_checksum": 1}
+
+
+def test_cache_rebuilds_index_when_checksum_changes(topology):
+    cache = topology.TopologyCache()
+    backend = CountingBackend()
+    first = cache.get("pGrid", backend)
+
+    backend.versions["pGrid"] += 1
+    backend.edges["pGrid"] = grid_edges[::-1].copy()
+    second = cache.get("pGrid", backend)
+
+    assert second is not first
+    assert second.checksum == "pGrid/1"
+    assert np.array_equal(second.edge_vertices, grid_edges[::-1])
+
+
+def test_cache_pinned_mesh_stays_verified_until_invalidated(topology):
+    cache = topology.TopologyCache()
+    backend = CountingBackend()
+    cache.pin(["pGrid"])
+
+    with cache.batch():
+        cache.get("pGrid", backend)
+
+    # pin したメッシュは次のブロックでも確認しない
+    backend.calls.clear()
+
+    with cache.batch():
+        cache.get("pGrid", backend)
+
+    assert backend.calls["get_topology_checksum"] == 0
+
+    # invalidate すると確認し直し, 変わっていればインデックスを作り直す
+    backend.versions["pGrid"] += 1
+    cache.invalidate("pGrid")
+
+    with cache.batch():
+        index = cache.get("pGrid", backend)
+
+    assert backend.calls == {"get_topology_checksum": 1, "get_edge_vertices": 1}
+    assert index.checksum == "pGrid/1"
+
+    # unpin すると通常通りブロック毎に確認する
+    cache.unpin(["pGrid"])
+    backend.calls.clear()
+
+    with cache.batch():
+        cache.get("pGrid", backend)
+
+    assert backend.calls["get_topology_checksum"] == 1
+
+
+def test_cache_chain_reused_until_topology_or_edges_change(topology):
+    cache = topology.TopologyCache()
+    backend = CountingBackend()
+    first = cache.get_chain("curve1", "pGrid", [2, 0, 1], backend)
+
+    assert np.array_equal(first, [0, 1, 2, 3])
+    assert cache.get_chain("curve1", "pGrid", [2, 0, 1], backend) is first
+
+    # エッジ列が変われば並べ直す
+    other = cache.get_chain("curve1", "pGrid", [0, 1], backend)
+    assert np.array_equal(other, [0, 1, 2])
+
+    # トポロジーが変われば並べ直す
+    backend.versions["pGrid"] += 1
+    again = cache.get_chain("curve1", "pGrid", [0, 1], backend)
+    assert again is not other and np.array_equal(again, [0, 1, 2])
+
+    # key が None ならキャッシュしない
+    assert cache.get_chain(None, "pGrid", [0, 1], backend) is not again
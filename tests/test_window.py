@@ -0,0 +1,46 @@
+#! python
+# coding:utf-8
+"""
+NN_ToolWindow のアクティブカーブ/エッジ列のハンドラーのテスト (bench の FakeScene と偽の textField を使う)
+"""
+
+import pytest
+
+
+@pytest.fixture
+def window(harness, monkeypatch):
+    """ed_edges と ed_curve の値を fields で与えるウィンドウ (UI は作らない)"""
+    window = harness.core.NN_ToolWindow()
+    window.ed_edges = "ed_edges"
+    window.ed_curve = "ed_curve"
+    window.fields = {}
+    monkeypatch.setattr(harness.cmds._target, "textField", lambda field, **kwargs: window.fields[field],
+                        raising=False)
+
+    return window
+
+
+def test_select_edges_decodes_binding(harness, window):
+    mesh = harness.scene.add_strip_mesh("pStrip", 2, 12)
+    edges = harness.scene.row_edges(mesh, 0)
+    window.fields.update(ed_edges=harness.core.makeBinding(edges).encode(), ed_curve="")
+
+    window.onSelectEdges()
+
+    assert harness.scene.selection == edges
+
+    # 旧形式のカンマ区切りも読める
+    window.fields["ed_edges"] = ",".join(edges)
+    window.onSelectEdges()
+
+    assert harness.scene.selection == edges
+
+
+def test_select_curve_selects_only_curve(harness, window):
+    mesh = harness.scene.add_strip_mesh("pStrip", 2, 12)
+    curve = harness.scene.add_guide_curve("NNAEOC_Curve1", mesh, 0)
+    window.fields.update(ed_edges=harness.core.makeBinding(harness.scene.row_edges(mesh, 0)).encode(), ed_curve=curve)
+
+    window.onSelectCurve()
+
+    assert harness.scene.selection == [curve]
@@ -0,0 +1,291 @@
+#! python
+# coding:utf-8
+"""
+メッシュのエッジ-頂点隣接インデックス
+Maya に依存しない NumPy だけの実装. メッシュの読み込みは backend 経由で行う
+"""
+
+import contextlib
+import hashlib
+import heapq
+
+import numpy as np
+
+from . import spatial
+
+
+def make_checksum(counts, arrays):
+    """
+    頂点数/エッジ数/フェース数 とトポロジー配列のハッシュからチェックサム文字列を作る
+    """
+    h = hashlib.md5()
+
+    for array in arrays:
+        h.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+
+    return "/".join([str(count) for count in counts] + [h.hexdigest()[:16]])
+
+
+class TopologyIndex(object):
+    """
+    一括取得したエッジ-頂点配列から作るメッシュの隣接インデックス
+    """
+
+    def __init__(self, edge_vertices, checksum=None):
+        self.edge_vertices = np.asarray(edge_vertices, dtype=int).reshape(-1, 2)
+        self.checksum = checksum
+        self._adjacency = None
+
+    @property
+    def edge_count(self):
+        return len(self.edge_vertices)
+
+    @property
+    def adjacency(self):
+        """
+        頂点 -> 隣接頂点とエッジ の CSR 形式 (offsets, neighbors, edges)
+        頂点 v の隣接は neighbors[offsets[v]:offsets[v+1]] で, 最初に使う時に作る
+        """
+        if self._adjacency is None:
+            vertex_count = int(self.edge_vertices.max()) + 1 if self.edge_count else 0
+            sources = self.edge_vertices.ravel()
+            targets = self.edge_vertices[:, ::-1].ravel()
+            edges = np.repeat(np.arange(self.edge_count), 2)
+            order = np.argsort(sources)
+            offsets = np.zeros(vertex_count + 1, dtype=int)
+            np.cumsum(np.bincount(sources, minlength=vertex_count), out=offsets[1:])
+            self._adjacency = (offsets, targets[order], edges[order])
+
+        return self._adjacency
+
+    def shortest_path(self, start, end, edge_weights, allowed=None):
+        """
+        start から end までのエッジの重みの和が最小の経路 (Dijkstra)
+        edge_weights 全エッジの重みの配列
+        allowed 通ってよい頂点の bool 配列. None なら全頂点
+        戻り値は (頂点インデックス配列, エッジインデックス配列). 到達できなければ None
+        """
+        offsets, neighbors, edges = self.adjacency
+        distances = {start: 0.0}
+        previous = {}
+        heap = [(0.0, start)]
+        done = set()
+
+        while heap:
+            distance, vtx = heapq.heappop(heap)
+
+            if vtx in done:
+                continue
+
+            if vtx == end:
+                break
+
+            done.add(vtx)
+
+            for i in range(offsets[vtx], offsets[vtx + 1]):
+                following = int(neighbors[i])
+
+                if following in done or (allowed is not None and not allowed[following]):
+                    continue
+
+                edge = int(edges[i])
+                candidate = distance + edge_weights[edge]
+
+                if candidate < distances.get(following, np.inf):
+                    distances[following] = candidate
+                    previous[following] = (vtx, edge)
+                    heapq.heappush(heap, (candidate, following))
+
+        if end != start and end not in previous:
+            return None
+
+        vertices = [end]
+        path_edges = []
+
+        while vertices[-1] != start:
+            vtx, edge = previous[vertices[-1]]
+            vertices.append(vtx)
+            path_edges.append(edge)
+
+        return np.array(vertices[::-1], dtype=int), np.array(path_edges[::-1], dtype=int)
+
+    def order_chain(self, edge_indices, with_edges=False):
+        """
+        エッジインデックスの集合を連続した頂点列に並べる
+        開いた一本のエッジ列なら小さい方の端点から順に並べた頂点インデックス配列を返す
+        閉じたループなら最小の頂点を始点 (継ぎ目) にし, その隣接頂点のうち小さい方へ向かって並べる
+        with_edges が True なら (頂点インデックス配列, 同じ順に並べたエッジインデックス配列) を返す
+        ループのエッジ配列は最後の頂点から始点に戻るエッジを含むので頂点配列と同じ長さになる
+        分岐や複数のエッジ列が含まれる場合は ValueError
+        """
+        edge_indices = np.asarray(edge_indices, dtype=int)
+
+        if len(edge_indices) == 0:
+            raise ValueError("empty edge chain")
+
+        if edge_indices.min() < 0 or edge_indices.max() >= self.edge_count:
+            raise ValueError("edge index out of range")
+
+        # 頂点 -> [(隣接頂点, エッジ)] (エッジ列内のみ)
+        adjacency = {}
+
+        for edge, (a, b) in zip(edge_indices.tolist(), self.edge_vertices[edge_indices].tolist()):
+            adjacency.setdefault(a, []).append((b, edge))
+            adjacency.setdefault(b, []).append((a, edge))
+
+        if any(len(neighbors) > 2 for neighbors in adjacency.values()):
+            raise ValueError("edges are not a single chain")
+
+        ends = sorted(vtx for vtx, neighbors in adjacency.items() if len(neighbors) == 1)
+        closed = len(ends) == 0
+
+        if closed:
+            start = min(adjacency)
+            adjacency[start].sort()
+            last = adjacency[start][-1][0]
+
+        elif len(ends) == 2:
+            start = ends[0]
+            last = ends[1]
+
+        else:
+            raise ValueError("edges are not a single chain")
+
+        ordered = [start]
+        ordered_edges = []
+        previous = None
+        current = start
+
+        while current != last:
+            neighbors = adjacency[current]
+            following, edge = neighbors[0] if neighbors[0][0] != previous else neighbors[-1]
+            previous = current
+            current = following
+            ordered.append(current)
+            ordered_edges.append(edge)
+
+        if closed:
+            ordered_edges.append(adjacency[start][-1][1])
+
+        if len(ordered) != len(adjacency):
+            raise ValueError("edges are not a single chain")
+
+        if with_edges:
+            return np.array(ordered, dtype=int), np.array(ordered_edges, dtype=int)
+
+        return np.array(ordered, dtype=int)
+
+
+class TopologyCache(object):
+    """
+    メッシュ毎の TopologyIndex, 鏡映頂点マップとカーブ毎の並べ替え済み頂点列のキャッシュ
+    トポロジーチェックサムが変わったメッシュのインデックスとマップは作り直す
+
+    チェックサムの取得もメッシュ全体を読むので, batch() のブロック内では
+    一度確認したメッシュを再確認しない. ブロック外では参照の度に確認する
+    pin() したメッシュは invalidate() されるまでブロックをまたいで確認済みのままにする
+    (トポロジー変更のコールバックで invalidate() する同期モード用)
+    """
+
+    def __init__(self):
+        self.indices = {}
+        self.chains = {}
+        self.mirrors = {}
+        self.verified = set()
+        self.pinned = set()
+        self.batch_depth = 0
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        一連の処理をまとめるブロック. 入れ子にでき, 一番外側に入る時に pin() していない確認済みのメッシュを忘れる
+        """
+        if self.batch_depth == 0:
+            self.verified.intersection_update(self.pinned)
+
+        self.batch_depth += 1
+
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+
+    def pin(self, meshes):
+        """meshes を invalidate() か unpin() されるまで確認済みのままにする"""
+        self.pinned.update(meshes)
+
+    def unpin(self, meshes):
+        self.pinned.difference_update(meshes)
+        self.verified.difference_update(meshes)
+
+    def invalidate(self, mesh):
+        """メッシュを次の参照で再確認させる"""
+        self.verified.discard(mesh)
+
+    def clear(self):
+        self.indices.clear()
+        self.chains.clear()
+        self.mirrors.clear()
+        self.verified.clear()
+
+    def get(self, mesh, mesh_backend):
+        """
+        メッシュの TopologyIndex を返す
+        """
+        index = self.indices.get(mesh)
+
+        if index is not None and self.batch_depth > 0 and mesh in self.verified:
+            return index
+
+        checksum = mesh_backend.get_topology_checksum(mesh)
+
+        if index is None or index.checksum != checksum:
+            index = TopologyIndex(mesh_backend.get_edge_vertices(mesh), checksum)
+            self.indices[mesh] = index
+
+        self.verified.add(mesh)
+
+        return index
+
+    def get_mirror(self, mesh, mesh_backend, axis=0, tolerance=0.01):
+        """
+        メッシュの鏡映頂点マップ (spatial.mirror_map) を返す
+        tolerance は平均エッジ長に対する割合
+        トポロジーが同じ間は最初に作った時の形状のマップを使い回すので, 左右対称な形状の時に作っておく
+        """
+        index = self.get(mesh, mesh_backend)
+        key = (mesh, axis, tolerance)
+        cached = self.mirrors.get(key)
+
+        if cached is not None and cached[0] == index.checksum:
+            return cached[1]
+
+        points = mesh_backend.get_points(mesh)
+        mirror = spatial.mirror_map(points, axis, tolerance * spatial.mean_edge_length(points, index.edge_vertices))
+        self.mirrors[key] = (index.checksum, mirror)
+
+        return mirror
+
+    def get_chain(self, key, mesh, edge_indices, mesh_backend):
+        """
+        エッジ列を並べ替えた頂点インデックス配列を返す
+        key (カーブ名など) が None でなければ結果をキャッシュし, トポロジーとエッジ列が同じ間は再利用する
+        """
+        index = self.get(mesh, mesh_backend)
+        edge_indices = np.asarray(edge_indices, dtype=int)
+
+        if key is not None:
+            cached = self.chains.get(key)
+
+            if cached is not None:
+                checksum, cached_mesh, cached_edges, ordered = cached
+
+                if checksum == index.checksum and cached_mesh == mesh and np.array_equal(cached_edges, edge_indices):
+                    return ordered
+
+        ordered = index.order_chain(edge_indices)
+
+        if key is not None:
+            self.chains[key] = (index.checksum, mesh, edge_indices, ordered)
+
+        return ordered